@@ -1,17 +1,26 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file, stream_with_context
 from flask_cors import CORS
 from werkzeug.utils import secure_filename
 import os
 import sys
 import json
+import time
+import tempfile
 import threading
+import itertools
 import traceback
 import requests
 from dotenv import load_dotenv
 from pathlib import Path
 
 from rag_pipeline import RAGPipeline
-from vector_store import VectorStore
+from vector_store import VectorStore, SUPPORTED_BACKENDS, HNSW_PRESETS
+from rag.metadata_filter import normalize_filters
+from snapshot import export_snapshot, import_snapshot, peek_manifest, SNAPSHOT_EXTENSION
+from storage_manager import StorageManager, RepositoryBusy
+from llm_providers import get_provider_manager, ProviderUnavailable, LLM_HEDGE_ENABLED
+from rag.single_flight import normalize_query
+from rag.context_assembler import assemble_context, code_regions, token_budget_for, estimate_tokens, CHARS_PER_TOKEN
 
 load_dotenv()
 
@@ -19,70 +28,99 @@ app = Flask(__name__)
 app = Flask(__name__)
 CORS(app, 
      origins=["http://localhost:5173", "http://localhost:3000"],
-     methods=["GET", "POST", "OPTIONS"],
+     methods=["GET", "POST", "DELETE", "OPTIONS"],
      allow_headers=["Content-Type", "Authorization"]
 )
 
 UPLOAD_FOLDER = os.getenv('UPLOAD_FOLDER', 'uploads')
 MAX_UPLOAD_SIZE = int(os.getenv('MAX_UPLOAD_SIZE', 100000000))
 VECTOR_STORE_PATH = os.getenv('VECTOR_STORE_PATH', './chroma_data')
+# Index snapshots written by export and readable by name on import
+SNAPSHOT_DIR = os.getenv('SNAPSHOT_DIR', 'snapshots')
+# Most queries accepted by one /api/retrieve/batch request
+RETRIEVE_BATCH_MAX = int(os.getenv('RETRIEVE_BATCH_MAX', 1000))
+# Answers worth reusing; the context-only fallback is not cached
+CACHEABLE_MODELS = ("Groq", "Ollama")
 
 # FIXED: Set Flask's MAX_CONTENT_LENGTH so Werkzeug enforces the limit
 # before the entire body is buffered into RAM
 app.config['MAX_CONTENT_LENGTH'] = MAX_UPLOAD_SIZE
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
+os.makedirs(SNAPSHOT_DIR, exist_ok=True)
 
 vector_store = VectorStore(persist_directory=VECTOR_STORE_PATH)
 rag_pipeline = RAGPipeline(vector_store)
+# Shared Groq client / Ollama session, circuit breakers and cached health
+# (also used by HyDE); probed in the background every PROVIDER_PROBE_INTERVAL
+providers = get_provider_manager()
+providers.start_probing()
+# Disk quota / LRU eviction / GC (STORAGE_QUOTA_MB, STORAGE_EVICTION); evicted
+# repos are offloaded here and restored when a request names them again
+storage_manager = StorageManager(rag_pipeline, offload_dir=os.path.join(SNAPSHOT_DIR, 'offloaded'))
+# Default repo for clients that don't send `repo` (last upload or import wins);
+# only _set_default_repo() changes it
 current_repo_name = None
 
-# Global upload progress tracker + lock for thread safety
+# Upload progress per repo, so concurrent uploads don't overwrite each other
 _progress_lock = threading.Lock()
-upload_progress = {
+upload_progress = {}           # repo_name -> {status, message, progress}
+_latest_progress_repo = None   # repo of the most recent update (for clients that don't send `repo`)
+IDLE_PROGRESS = {
     'status': 'idle',      # idle | uploading | processing | done | error
     'message': '',
     'progress': 0          # 0-100
 }
 
 
-def _set_progress(status: str, message: str, progress: int):
-    """Thread-safe in-place update of upload_progress."""
+def _set_progress(repo_name: str, status: str, message: str, progress: int):
+    """Thread-safe update of one repo's upload progress."""
+    global _latest_progress_repo
     with _progress_lock:
-        upload_progress['status'] = status
-        upload_progress['message'] = message
-        upload_progress['progress'] = progress
+        upload_progress[repo_name] = {'status': status, 'message': message, 'progress': progress}
+        _latest_progress_repo = repo_name
 
 
-def get_groq_response(context: str, query: str) -> dict:
-    try:
-        from groq import Groq
-    except ImportError:
-        return {"error": "groq package not installed. Run: pip install groq"}
+def _set_default_repo(repo_name):
+    """Deliberately switch (or clear) the repo used by requests that don't name one."""
+    global current_repo_name
+    current_repo_name = repo_name
+    if repo_name:
+        vector_store.set_default(repo_name)
+    else:
+        vector_store.clear_default()
 
-    try:
-        api_key = os.getenv('GROQ_API_KEY')
-        if not api_key or api_key.strip() == "":
-            return {"error": "GROQ_API_KEY not configured"}
 
-        print("[LLM] Trying Groq API...")
+def _upload_repo_name() -> str:
+    """Repo an upload will be indexed as: the form's `repo_name`, else the ZIP's name (sanitized)."""
+    file = request.files.get('file')
+    stem = Path(secure_filename(file.filename)).stem if file and file.filename else ''
+    return secure_filename(request.form.get('repo_name') or '') or stem
 
-        client = Groq(api_key=api_key)
-        model = os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant')
 
-        system_prompt = "You are a code analysis expert. Answer questions about code concisely and clearly."
+def _groq_messages(context: str, query: str) -> list:
+    system_prompt = "You are a code analysis expert. Answer questions about code concisely and clearly."
+    return [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": f"Code Context:\n{context}\n\nQuestion: {query}"}
+    ]
 
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": f"Code Context:\n{context[:4000]}\n\nQuestion: {query}"}
-        ]
 
-        response = client.chat.completions.create(
-            model=model,
-            messages=messages,
-            max_tokens=1024,
-            temperature=0.5
-        )
+def _ollama_prompt(context: str, query: str) -> str:
+    return f"""Analyze this code and answer the question concisely.
+
+Code:
+{context}
+
+Question: {query}
+
+Answer:"""
+
+
+def get_groq_response(context: str, query: str) -> dict:
+    try:
+        print("[LLM] Trying Groq API...")
+        response = providers.groq_chat(_groq_messages(context, query), max_tokens=1024, temperature=0.5)
 
         answer = response.choices[0].message.content
         if not answer or not answer.strip():
@@ -92,48 +130,22 @@ def get_groq_response(context: str, query: str) -> dict:
         return {
             "answer": answer,
             "model": "Groq",
-            "model_name": model
+            "model_name": providers.groq_model
         }
 
+    except ProviderUnavailable as e:
+        return {"error": str(e)}
     except Exception as e:
         print(f"[LLM] Groq error: {str(e)}")
         return {"error": f"Groq error: {str(e)}"}
 
 
 def get_ollama_response(context: str, query: str) -> dict:
+    base_url = providers.ollama_base_url
+    model = providers.ollama_model
     try:
-        base_url = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
-        model = os.getenv('OLLAMA_MODEL', 'tinyllama')
-
         print(f"[LLM] Trying Ollama ({model})...")
-
-        try:
-            health = requests.get(f'{base_url}/api/tags', timeout=5)
-            if health.status_code != 200:
-                return {"error": f"Ollama returned status {health.status_code}"}
-        except requests.exceptions.ConnectionError:
-            return {"error": f"Ollama not running at {base_url}. Start it with: ollama serve"}
-        except requests.exceptions.Timeout:
-            return {"error": f"Ollama at {base_url} timed out"}
-
-        prompt = f"""Analyze this code and answer the question concisely.
-
-Code:
-{context[:3000]}
-
-Question: {query}
-
-Answer:"""
-
-        response = requests.post(
-            f'{base_url}/api/generate',
-            json={
-                "model": model,
-                "prompt": prompt,
-                "stream": False
-            },
-            timeout=120
-        )
+        response = providers.ollama_generate(_ollama_prompt(context, query), timeout=120)
 
         if response.status_code == 200:
             data = response.json()
@@ -152,11 +164,82 @@ Answer:"""
 
         return {"error": f"Ollama error: HTTP {response.status_code}"}
 
+    except ProviderUnavailable as e:
+        return {"error": str(e)}
+    except requests.exceptions.ConnectionError:
+        return {"error": f"Ollama not running at {base_url}. Start it with: ollama serve"}
+    except requests.exceptions.Timeout:
+        return {"error": f"Ollama at {base_url} timed out"}
     except Exception as e:
         print(f"[LLM] Ollama error: {str(e)}")
         return {"error": str(e)}
 
 
+def stream_groq_response(context: str, query: str) -> dict:
+    """
+    get_groq_response with stream=True: {"tokens": iterator of text pieces,
+    "close": aborts the completion, "model", "model_name"} or {"error"}.
+    """
+    try:
+        print("[LLM] Streaming from Groq API...")
+        stream = providers.groq_chat(_groq_messages(context, query), max_tokens=1024, temperature=0.5, stream=True)
+    except ProviderUnavailable as e:
+        return {"error": str(e)}
+    except Exception as e:
+        print(f"[LLM] Groq error: {str(e)}")
+        return {"error": f"Groq error: {str(e)}"}
+
+    def tokens():
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    return {"tokens": tokens(), "close": stream.close, "model": "Groq",
+            "model_name": providers.groq_model, "provider": "groq"}
+
+
+def stream_ollama_response(context: str, query: str) -> dict:
+    """get_ollama_response on Ollama's streaming API; same shape as stream_groq_response."""
+    base_url = providers.ollama_base_url
+    model = providers.ollama_model
+    print(f"[LLM] Streaming from Ollama ({model})...")
+
+    try:
+        response = providers.ollama_generate(_ollama_prompt(context, query), stream=True, timeout=(5, 120))
+    except ProviderUnavailable as e:
+        return {"error": str(e)}
+    except requests.exceptions.ConnectionError:
+        return {"error": f"Ollama not running at {base_url}. Start it with: ollama serve"}
+    except requests.exceptions.Timeout:
+        return {"error": f"Ollama at {base_url} timed out"}
+    except Exception as e:
+        print(f"[LLM] Ollama error: {str(e)}")
+        return {"error": str(e)}
+
+    if response.status_code != 200:
+        response.close()
+        if response.status_code == 404:
+            return {"error": f"Model '{model}' not found. Run: ollama pull {model}"}
+        return {"error": f"Ollama error: HTTP {response.status_code}"}
+
+    def tokens():
+        # One JSON object per line: {"response": "<piece>", "done": false}
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if data.get('error'):
+                raise RuntimeError(f"Ollama error: {data['error']}")
+            if data.get('response'):
+                yield data['response']
+            if data.get('done'):
+                break
+
+    # Closing the connection makes Ollama stop generating
+    return {"tokens": tokens(), "close": response.close, "model": "Ollama",
+            "model_name": model, "provider": "ollama"}
+
+
 def generate_context_answer(context: str, query: str) -> dict:
     if not context or not context.strip():
         return {
@@ -175,48 +258,139 @@ def generate_context_answer(context: str, query: str) -> dict:
     }
 
 
-def generate_answer(context: str, query: str) -> dict:
-    result = get_groq_response(context, query)
+def _fit_context(context: str, results, model_name: str):
+    """
+    Context within the model's token budget: windows around the matched code
+    when retrieval results are given, else the plain context cut to the budget.
+    """
+    budget = token_budget_for(model_name)
+    if results is not None:
+        return assemble_context(results, budget)
+    fitted = context[:budget * CHARS_PER_TOKEN]
+    return fitted, {"token_budget": budget, "tokens_used": estimate_tokens(fitted)}
+
+
+def generate_answer(context: str, query: str, results=None, hedge: bool = False) -> dict:
+    """
+    results: retrieval results to assemble a budgeted context from per model.
+    hedge: race Groq and Ollama on their first token (generate_answer_stream).
+    """
+    if hedge:
+        llm = generate_answer_stream(context, query, results=results, hedge=True)
+        try:
+            answer = "".join(llm["tokens"])
+        except Exception as e:
+            print(f"{llm['model']} failed mid-answer ({str(e)}), falling back to context-only...")
+            answer = None
+        finally:
+            llm["close"]()
+        if answer and answer.strip():
+            return {"answer": answer, "model": llm["model"], "model_name": llm["model_name"],
+                    "context": llm["context"], "hedge": llm.get("hedge")}
+        groq_context, groq_report = _fit_context(context, results, providers.groq_model)
+        result = generate_context_answer(groq_context, query)
+        result["context"] = groq_report
+        return result
+
+    groq_context, groq_report = _fit_context(context, results, providers.groq_model)
+    result = get_groq_response(groq_context, query)
     if "error" not in result:
+        result["context"] = groq_report
         return result
 
     print(f"Groq unavailable ({result['error']}), falling back to Ollama...")
 
-    result = get_ollama_response(context, query)
+    ollama_context, ollama_report = _fit_context(context, results, providers.ollama_model)
+    result = get_ollama_response(ollama_context, query)
     if "error" not in result:
+        result["context"] = ollama_report
         return result
 
     print(f"Ollama unavailable ({result['error']}), falling back to context-only...")
 
-    return generate_context_answer(context, query)
+    # Matched regions make a better snippet than the first lines of the first file
+    result = generate_context_answer(groq_context, query)
+    result["context"] = groq_report
+    return result
+
+
+def generate_answer_stream(context: str, query: str, results=None, hedge: bool = False) -> dict:
+    """
+    generate_answer, streamed: same provider order and budgeted contexts. A
+    provider counts as available once its first token arrives, so the
+    fallback is decided before anything is sent. With hedge, Ollama is also
+    started when Groq has no first token after the hedge delay, and the first
+    to answer wins (ProviderManager.hedge). Returns {"tokens", "close",
+    "model", "model_name", "context"}, plus "hedge" when hedged.
+    """
+    groq_context, groq_report = _fit_context(context, results, providers.groq_model)
+    ollama_context, ollama_report = _fit_context(context, results, providers.ollama_model)
+
+    if hedge:
+        result = providers.hedge(
+            ("groq", lambda: stream_groq_response(groq_context, query)),
+            ("ollama", lambda: stream_ollama_response(ollama_context, query)),
+        )
+        if "error" not in result:
+            result["context"] = groq_report if result["provider"] == "groq" else ollama_report
+            return result
+        print(f"Hedged providers unavailable ({result['error']}), falling back to context-only...")
+    else:
+        result = _first_available_stream(
+            ((stream_groq_response, groq_context, groq_report),
+             (stream_ollama_response, ollama_context, ollama_report)),
+            query
+        )
+        if result is not None:
+            return result
+
+    result = generate_context_answer(groq_context, query)
+    return {"tokens": iter([result["answer"]]), "close": lambda: None,
+            "model": result["model"], "model_name": result["model_name"], "context": groq_report}
+
+
+def _first_available_stream(attempts, query: str):
+    """Try (stream function, context, report) in order; the first stream with a token, or None."""
+    for provider, provider_context, report in attempts:
+        started = time.perf_counter()
+        result = provider(provider_context, query)
+        if "error" not in result:
+            try:
+                first = next(result["tokens"])
+            except Exception as e:
+                result["close"]()
+                if not isinstance(e, StopIteration):
+                    # The request was accepted but the stream broke before its first token
+                    providers.record_failure(result["provider"], e)
+                problem = "returned empty response" if isinstance(e, StopIteration) else f"error: {str(e)}"
+                result = {"error": f"{result['model']} {problem}"}
+            else:
+                # First-token times set the hedge delay (LLM_HEDGE_PERCENTILE)
+                providers.record_first_token(result["provider"], time.perf_counter() - started)
+                result["tokens"] = itertools.chain([first], result["tokens"])
+                result["context"] = report
+                return result
+        print(f"{provider.__name__} unavailable ({result['error']}), falling back...")
+    return None
 
 
 @app.route('/api/health', methods=['GET'])
 @app.route('/health', methods=['GET'])
 def health_check():
     try:
-        groq_available = False
-        api_key = os.getenv('GROQ_API_KEY')
-        if api_key and api_key.strip():
-            try:
-                from groq import Groq
-                groq_available = True
-            except ImportError:
-                groq_available = False
-
-        ollama_available = False
-        try:
-            ollama_url = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
-            resp = requests.get(f'{ollama_url}/api/tags', timeout=3)
-            ollama_available = resp.status_code == 200
-        except Exception:
-            ollama_available = False
-
+        # Cached by the background probe; no provider is called here
+        provider_stats = providers.stats()
         return jsonify({
             "status": "healthy",
-            "groq_available": groq_available,
-            "ollama_available": ollama_available,
-            "vector_store": vector_store.get_collection_info()
+            "groq_available": provider_stats["groq"]["available"],
+            "ollama_available": provider_stats["ollama"]["available"],
+            "providers": provider_stats,
+            "hedging": providers.hedge_stats(),
+            "single_flight": rag_pipeline.single_flight.stats(),
+            "vector_store": vector_store.get_collection_info(),
+            "parent_cache": rag_pipeline.parent_child_retriever.parent_cache.stats(),
+            "retrieval_paths": dict(rag_pipeline.retrieval_paths),
+            "answer_cache": rag_pipeline.answer_cache.stats()
         })
     except Exception as e:
         return jsonify({"status": "error", "error": str(e)}), 500
@@ -224,33 +398,49 @@ def health_check():
 
 @app.route('/api/progress', methods=['GET'])
 def get_progress():
-    """Polling endpoint for frontend to track real upload/processing progress."""
+    """
+    Polling endpoint for frontend to track real upload/processing progress.
+    ?repo=<name> selects one upload; without it, the most recently updated one.
+    """
+    repo_name = secure_filename(request.args.get('repo', '')) or _latest_progress_repo
     with _progress_lock:
-        return jsonify(dict(upload_progress))
+        progress = upload_progress.get(repo_name, IDLE_PROGRESS)
+        return jsonify({**progress, 'repo': repo_name})
 
 
 @app.route('/api/upload', methods=['POST'])
 def upload_repository():
-    global current_repo_name
+    repo_name = _upload_repo_name()
+    try:
+        # One ingest per repo at a time; a second upload is turned away, not queued
+        with storage_manager.in_use(repo_name):
+            return _ingest_upload(repo_name)
+    except RepositoryBusy as e:
+        print(f"[UPLOAD] ERROR: {e}", flush=True)
+        return jsonify({"error": str(e)}), 409
 
+
+def _ingest_upload(repo_name: str):
+    """Validate, save and index the uploaded ZIP as repo_name. The caller holds the repo's write slot."""
+    filepath = None
     try:
-        _set_progress('uploading', 'Receiving file...', 52)
+        _set_progress(repo_name, 'uploading', 'Receiving file...', 52)
         print(f"\n[UPLOAD] === Upload request received ===", flush=True)
 
         if 'file' not in request.files:
-            _set_progress('error', 'No file part in request', 0)
+            _set_progress(repo_name, 'error', 'No file part in request', 0)
             print(f"[UPLOAD] ERROR: No file part in request", flush=True)
             return jsonify({"error": "No file part in request"}), 400
 
         file = request.files['file']
 
         if file.filename == '':
-            _set_progress('error', 'No file selected', 0)
+            _set_progress(repo_name, 'error', 'No file selected', 0)
             print(f"[UPLOAD] ERROR: No file selected", flush=True)
             return jsonify({"error": "No file selected"}), 400
 
         if not file.filename.lower().endswith('.zip'):
-            _set_progress('error', 'Only ZIP files allowed', 0)
+            _set_progress(repo_name, 'error', 'Only ZIP files allowed', 0)
             print(f"[UPLOAD] ERROR: Not a ZIP file: {file.filename}", flush=True)
             return jsonify({"error": "Only ZIP files are allowed"}), 400
 
@@ -261,128 +451,312 @@ def upload_repository():
         print(f"[UPLOAD] File: {file.filename} ({file_size / 1024 / 1024:.1f} MB)", flush=True)
 
         if file_size > MAX_UPLOAD_SIZE:
-            _set_progress('error', 'File too large', 0)
+            _set_progress(repo_name, 'error', 'File too large', 0)
             print(f"[UPLOAD] ERROR: File too large ({file_size} bytes)", flush=True)
             return jsonify({"error": f"File too large ({file_size / 1024 / 1024:.1f} MB). Max: {MAX_UPLOAD_SIZE // 1000000} MB"}), 413
 
         if file_size == 0:
-            _set_progress('error', 'File is empty', 0)
+            _set_progress(repo_name, 'error', 'File is empty', 0)
             print(f"[UPLOAD] ERROR: File is empty", flush=True)
             return jsonify({"error": "Uploaded file is empty"}), 400
 
         filename = secure_filename(file.filename)
         if not filename:
-            _set_progress('error', 'Invalid filename', 0)
+            _set_progress(repo_name, 'error', 'Invalid filename', 0)
             print(f"[UPLOAD] ERROR: Invalid filename", flush=True)
             return jsonify({"error": "Invalid filename"}), 400
 
-        repo_name = request.form.get('repo_name', Path(filename).stem)
-        # Sanitize repo_name to avoid path injection
-        repo_name = secure_filename(repo_name) or Path(filename).stem
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
+        # Optional per-collection index backend ("chroma" | "numpy")
+        backend = (request.form.get('backend') or '').strip().lower() or None
+        if backend and backend not in SUPPORTED_BACKENDS:
+            _set_progress(repo_name, 'error', f'Unknown backend: {backend}', 0)
+            return jsonify({"error": f"Unknown backend '{backend}'. Use one of: {', '.join(SUPPORTED_BACKENDS)}"}), 400
+
+        # Optional HNSW preset for Chroma collections ("auto" picks by chunk count)
+        hnsw_preset = (request.form.get('hnsw_preset') or '').strip().lower() or None
+        if hnsw_preset and hnsw_preset != 'auto' and hnsw_preset not in HNSW_PRESETS:
+            _set_progress(repo_name, 'error', f'Unknown HNSW preset: {hnsw_preset}', 0)
+            return jsonify({"error": f"Unknown HNSW preset '{hnsw_preset}'. Use one of: auto, {', '.join(HNSW_PRESETS)}"}), 400
+
+        # A private path per request: concurrent uploads of the same ZIP name must not share a file
+        fd, filepath = tempfile.mkstemp(prefix=f"{Path(filename).stem}-", suffix=".zip", dir=UPLOAD_FOLDER)
+        os.close(fd)
 
-        _set_progress('processing', 'Saving file to disk...', 55)
+        _set_progress(repo_name, 'processing', 'Saving file to disk...', 55)
         print(f"[UPLOAD] Saving file to disk: {filepath}", flush=True)
         file.save(filepath)
 
         if not os.path.exists(filepath):
-            _set_progress('error', 'File failed to save', 0)
+            _set_progress(repo_name, 'error', 'File failed to save', 0)
             print(f"[UPLOAD] ERROR: File failed to save to disk", flush=True)
             return jsonify({"error": "File failed to save"}), 500
 
-        _set_progress('processing', 'Extracting ZIP & scanning files...', 60)
+        _set_progress(repo_name, 'processing', 'Extracting ZIP & scanning files...', 60)
         print(f"[UPLOAD] ✓ File saved. Starting processing for: {repo_name}", flush=True)
         print(f"[UPLOAD] Please wait... this can take 1-5 minutes on 8GB RAM systems", flush=True)
 
         # Hook into RAGPipeline to update progress during chunking/embedding
         def on_progress(stage: str, pct: int):
-            _set_progress('processing', stage, pct)
+            _set_progress(repo_name, 'processing', stage, pct)
             print(f"[UPLOAD] Progress {pct}%: {stage}", flush=True)
 
-        result = rag_pipeline.process_repository(filepath, repo_name, progress_callback=on_progress)
+        result = rag_pipeline.process_repository(
+            filepath, repo_name, progress_callback=on_progress, backend=backend, hnsw_preset=hnsw_preset
+        )
+        evicted = storage_manager.enforce_quota(protect=[repo_name])
+        if evicted:
+            result["evicted_repositories"] = evicted
 
-        _set_progress('done', 'Processing complete!', 100)
+        _set_progress(repo_name, 'done', 'Processing complete!', 100)
         print(f"[UPLOAD] ✓ Processing complete: {result.get('message', '')}", flush=True)
-        current_repo_name = repo_name
+        _set_default_repo(repo_name)
 
         # ── Auto-generation logic removed manually per user requirements ──────────
 
-        try:
-            os.remove(filepath)
-            print(f"[UPLOAD] Cleaned up uploaded ZIP file", flush=True)
-        except Exception:
-            pass
-
         print(f"[UPLOAD] ✓ Sending success response to frontend", flush=True)
         return jsonify(result), 200
 
     except Exception as e:
-        _set_progress('error', str(e), 0)
+        _set_progress(repo_name, 'error', str(e), 0)
         print(f"[UPLOAD] ✗ FATAL ERROR: {str(e)}", flush=True)
         traceback.print_exc()
         sys.stdout.flush()
         return jsonify({"error": str(e)}), 500
 
+    finally:
+        if filepath and os.path.exists(filepath):
+            os.remove(filepath)
+            print(f"[UPLOAD] Cleaned up uploaded ZIP file", flush=True)
+
+
+def _restore_offloaded(repo_name: str) -> bool:
+    """Bring back a repo evicted over quota (offloaded snapshot). False if there is none."""
+    try:
+        if not storage_manager.restore(repo_name):
+            return False
+    except Exception as e:
+        print(f"[STORAGE] Restore of '{repo_name}' failed: {str(e)}", flush=True)
+        return False
+    storage_manager.enforce_quota(protect=[repo_name, current_repo_name])
+    return True
+
+
+def _resolve_repo(requested: str):
+    """
+    Pick the repo for a request: the one the client named, else the default.
+    Returns (repo_name, None) or (None, (error_json, status)).
+    """
+    requested = secure_filename(requested or '')
+    if requested:
+        if not vector_store.has_repository(requested):
+            if not _restore_offloaded(requested):
+                return None, ({"error": f"Repository '{requested}' not found. Please upload it first."}, 404)
+        return requested, None
+
+    # FIXED: Return 400 (not 500) when no repository is loaded
+    if not current_repo_name:
+        return None, ({"error": "No repository loaded. Please upload a ZIP file first."}, 400)
+
+    # FIXED: Guard against vector_store having no collection (e.g. after server restart)
+    if not vector_store.has_repository(current_repo_name) and not _restore_offloaded(current_repo_name):
+        _set_default_repo(None)
+        return None, ({"error": "Repository data was lost (server may have restarted). Please re-upload your ZIP file."}, 400)
+
+    return current_repo_name, None
+
+
+def _chat_options(data: dict):
+    """
+    Validated options of a /api/chat or /api/chat/stream body.
+    Returns (options, None) or (None, (error_json, status)).
+    """
+    repo_name, repo_error = _resolve_repo(data.get('repo'))
+    if repo_error:
+        return None, repo_error
+
+    query = data.get('query', '').strip()
+
+    if not query:
+        return None, ({"error": "Empty query"}, 400)
+
+    # Optional pre-filters: {"path": "frontend/**", "extensions": [".sql"], "languages": ["python"]}
+    try:
+        filters = normalize_filters(data.get('filters'))
+    except ValueError as e:
+        return None, ({"error": str(e)}, 400)
+
+    # Optional cross-encoder re-ranking; omitted = server default (RERANK_ENABLED)
+    rerank = data.get('rerank')
+    if rerank is not None and not isinstance(rerank, bool):
+        return None, ({"error": "'rerank' must be true or false"}, 400)
+
+    # Optional MMR diversity: "mmr": true, "mmr_lambda": 0.0 (diverse) .. 1.0 (relevant)
+    mmr = data.get('mmr')
+    mmr_lambda = data.get('mmr_lambda')
+    if mmr is not None and not isinstance(mmr, bool):
+        return None, ({"error": "'mmr' must be true or false"}, 400)
+    if mmr_lambda is not None:
+        if isinstance(mmr_lambda, bool) or not isinstance(mmr_lambda, (int, float)) or not 0 <= mmr_lambda <= 1:
+            return None, ({"error": "'mmr_lambda' must be a number between 0 and 1"}, 400)
+        mmr = True if mmr is None else mmr
+
+    # "cache": false skips the semantic answer cache for this request
+    use_cache = data.get('cache', True)
+    if not isinstance(use_cache, bool):
+        return None, ({"error": "'cache' must be true or false"}, 400)
+
+    # Hedged generation (Groq and Ollama raced); omitted = server default (LLM_HEDGE_ENABLED)
+    hedge = data.get('hedge', LLM_HEDGE_ENABLED)
+    if not isinstance(hedge, bool):
+        return None, ({"error": "'hedge' must be true or false"}, 400)
+
+    return {
+        "repo_name": repo_name, "query": query, "filters": filters, "rerank": rerank,
+        "mmr": mmr, "mmr_lambda": mmr_lambda, "use_cache": use_cache, "hedge": hedge
+    }, None
+
+
+def _answer_without_llm(options: dict):
+    """
+    (response, cache_slot). response is a finished chat response when the
+    symbol table or the answer cache can answer, else None. cache_slot is
+    what _cache_answer needs to store the generated answer (None = don't).
+    """
+    query, repo_name = options['query'], options['repo_name']
+
+    # "Where is X defined": answered from the symbol table, no retrieval or LLM
+    if not options['filters']:
+        lookup = rag_pipeline.lookup_symbol(query, repo_name)
+        if lookup:
+            return {
+                "status": "success",
+                "query": query,
+                "answer": lookup['answer'],
+                "model": "Symbols",
+                "model_name": "symbol-index",
+                "sources": [
+                    {"filename": r['filename'], "filepath": r['source'], "relevance": r['relevance']}
+                    for r in lookup['results']
+                ],
+                "symbols": lookup['symbols'],
+                "repository": repo_name
+            }, None
+
+    # A rephrasing of an earlier question on this repo reuses its answer.
+    # The guard runs first so a blocked query cannot ride on a cached one.
+    answer_cache = rag_pipeline.answer_cache
+    if not (options['use_cache'] and answer_cache.enabled and rag_pipeline.jailbreak_guard.is_safe_query(query)):
+        return None, None
+    variant = json.dumps({key: options[key] for key in ("filters", "rerank", "mmr", "mmr_lambda")}, sort_keys=True)
+    cache_slot = {
+        "generation": answer_cache.generation(repo_name),
+        "vector": vector_store.embedding_engine.embed_text(query),
+        "variant": variant
+    }
+    cached = answer_cache.lookup(repo_name, cache_slot['vector'], variant)
+    if cached:
+        print(f"[CHAT] Answer cache hit ({cached['similarity']}) for: {query}")
+        return {
+            **cached['payload'],
+            "status": "success",
+            "query": query,
+            "repository": repo_name,
+            "cache": {"hit": True, "similarity": cached['similarity'],
+                      "cached_query": cached['query'], "age_s": cached['age_s']}
+        }, None
+    return None, cache_slot
+
+
+def _cache_answer(options: dict, cache_slot, answer: dict) -> None:
+    if cache_slot is not None and answer['model'] in CACHEABLE_MODELS:
+        rag_pipeline.answer_cache.put(options['repo_name'], cache_slot['vector'], options['query'], answer,
+                                      cache_slot['generation'], cache_slot['variant'])
+
+
+def _generation_key(options: dict) -> tuple:
+    """Single-flight key of a chat answer: concurrent duplicates share one generation."""
+    variant = json.dumps({key: options[key] for key in ("filters", "rerank", "mmr", "mmr_lambda", "hedge")},
+                         sort_keys=True)
+    return ("generate", rag_pipeline.repo_version(options['repo_name']), normalize_query(options['query']), variant)
+
+
+def _retrieve_for_chat(options: dict, cache_slot=None):
+    """
+    (retrieval_result, formatted_context, sources) for the chat endpoints.
+    The query vector embedded for the answer cache lookup (cache_slot) is reused.
+    """
+    query, repo_name = options['query'], options['repo_name']
+    print(f"[CHAT] Retrieving context for: {query} (repo={repo_name})")
+    retrieval_result = rag_pipeline.retrieve(query, n_results=5, repo_name=repo_name, filters=options['filters'],
+                                             rerank=options['rerank'], mmr=options['mmr'],
+                                             mmr_lambda=options['mmr_lambda'],
+                                             query_embedding=cache_slot['vector'] if cache_slot else None)
+    print(f"[CHAT] Retrieval status: {retrieval_result.get('status')}")
+    if retrieval_result.get('error'):
+        return retrieval_result, None, None
+
+    context_parts = []
+    sources = []
+
+    for result in retrieval_result['results']:
+        context_parts.append(f"[{result['filename']}]\n{result['chunk']}")
+        source_info = {
+            "filename": result['filename'],
+            "filepath": result['source'],
+            "relevance": result['relevance']
+        }
+        if source_info not in sources:
+            sources.append(source_info)
+
+    return retrieval_result, "\n\n".join(context_parts), sources
+
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
-    global current_repo_name
     try:
-        # FIXED: Return 400 (not 500) when no repository is loaded
-        if not current_repo_name:
-            return jsonify({"error": "No repository loaded. Please upload a ZIP file first."}), 400
-
-        # FIXED: Guard against vector_store having no collection (e.g. after server restart)
-        if vector_store.collection is None:
-            # Try to reconnect to the persisted collection
-            reconnected = vector_store.try_reconnect(current_repo_name)
-            if not reconnected:
-                current_repo_name = None
-                return jsonify({"error": "Repository data was lost (server may have restarted). Please re-upload your ZIP file."}), 400
-
         data = request.get_json()
         if not data:
             return jsonify({"error": "Invalid JSON body"}), 400
 
-        query = data.get('query', '').strip()
+        options, error = _chat_options(data)
+        if error:
+            return jsonify(error[0]), error[1]
+        query, repo_name = options['query'], options['repo_name']
 
-        if not query:
-            return jsonify({"error": "Empty query"}), 400
-
-        print(f"[CHAT] Retrieving context for: {query}")
-        retrieval_result = rag_pipeline.retrieve(query, n_results=5)
-        print(f"[CHAT] Retrieval status: {retrieval_result.get('status')}")
+        shortcut, cache_slot = _answer_without_llm(options)
+        if shortcut:
+            return jsonify(shortcut), 200
 
+        retrieval_result, formatted_context, sources = _retrieve_for_chat(options, cache_slot)
         if retrieval_result.get('error'):
             return jsonify(retrieval_result), 500
 
-        context_parts = []
-        sources = []
-
-        for result in retrieval_result['results']:
-            context_parts.append(f"[{result['filename']}]\n{result['chunk']}")
-            source_info = {
-                "filename": result['filename'],
-                "filepath": result['source'],
-                "relevance": result['relevance']
-            }
-            if source_info not in sources:
-                sources.append(source_info)
-
-        formatted_context = "\n\n".join(context_parts)
-
         print(f"[CHAT] Generating answer with {len(sources)} sources...")
-        llm_result = generate_answer(formatted_context, query)
-        print(f"[CHAT] Answer generated via {llm_result.get('model', 'unknown')}")
+        llm_result, coalesced = rag_pipeline.single_flight.do(
+            _generation_key(options),
+            lambda: generate_answer(formatted_context, query, results=retrieval_result['results'],
+                                    hedge=options['hedge'])
+        )
+        print(f"[CHAT] Answer {'shared' if coalesced else 'generated'} via {llm_result.get('model', 'unknown')}")
 
-        return jsonify({
-            "status": "success",
-            "query": query,
+        answer = {
             "answer": llm_result['answer'],
             "model": llm_result['model'],
             "model_name": llm_result['model_name'],
             "sources": sources,
-            "repository": current_repo_name
+            "context": llm_result.get('context')
+        }
+        if not coalesced:
+            _cache_answer(options, cache_slot, answer)
+
+        return jsonify({
+            "status": "success",
+            "query": query,
+            **answer,
+            "repository": repo_name,
+            "cache": {"hit": False},
+            "hedge": llm_result.get('hedge'),
+            "coalesced": coalesced
         }), 200
 
     except Exception as e:
@@ -391,16 +765,229 @@ def chat():
         return jsonify({"error": str(e)}), 500
 
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_stream():
+    """
+    /api/chat as server-sent events, same body. Events, in order:
+      sources  {"sources", "repository", "query"}   before generation starts
+      model    {"model", "model_name"}               provider that will answer
+      token    {"text"}                              answer pieces as generated
+      done     {"context", "cache", "coalesced"}     or error {"error"}
+    Concurrent duplicates share one upstream completion (single-flight); it
+    is closed once every client reading it has disconnected.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Invalid JSON body"}), 400
+
+    options, error = _chat_options(data)
+    if error:
+        return jsonify(error[0]), error[1]
+    query, repo_name = options['query'], options['repo_name']
+
+    def generate():
+        try:
+            shortcut, cache_slot = _answer_without_llm(options)
+            if shortcut:
+                yield _sse("sources", {"sources": shortcut['sources'], "repository": repo_name, "query": query})
+                yield _sse("model", {"model": shortcut['model'], "model_name": shortcut['model_name']})
+                yield _sse("token", {"text": shortcut['answer']})
+                yield _sse("done", {"context": shortcut.get('context'), "cache": shortcut.get('cache', {"hit": False})})
+                return
+
+            retrieval_result, formatted_context, sources = _retrieve_for_chat(options, cache_slot)
+            if retrieval_result.get('error'):
+                yield _sse("error", {"error": retrieval_result['error']})
+                return
+            yield _sse("sources", {"sources": sources, "repository": repo_name, "query": query})
+
+            # Concurrent duplicates subscribe to the same upstream stream
+            llm, coalesced = rag_pipeline.single_flight.stream(
+                _generation_key(options),
+                lambda: generate_answer_stream(formatted_context, query, results=retrieval_result['results'],
+                                               hedge=options['hedge'])
+            )
+        except Exception as e:
+            traceback.print_exc()
+            yield _sse("error", {"error": str(e)})
+            return
+
+        yield _sse("model", {"model": llm['model'], "model_name": llm['model_name'], "hedge": llm.get('hedge')})
+        started = time.perf_counter()
+        parts = []
+        try:
+            for text in llm['tokens']:
+                parts.append(text)
+                yield _sse("token", {"text": text})
+        except Exception as e:
+            print(f"[CHAT] Stream error after {len(parts)} tokens: {str(e)}")
+            yield _sse("error", {"error": str(e)})
+            return
+        finally:
+            # Also runs on GeneratorExit when the client went away mid-answer
+            llm['close']()
+            print(f"[CHAT] Streamed {len(parts)} pieces via {llm['model']} "
+                  f"in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+        answer = {
+            "answer": "".join(parts),
+            "model": llm['model'],
+            "model_name": llm['model_name'],
+            "sources": sources,
+            "context": llm.get('context')
+        }
+        if not coalesced:
+            _cache_answer(options, cache_slot, answer)
+        yield _sse("done", {"context": llm.get('context'), "cache": {"hit": False}, "coalesced": coalesced})
+
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+@app.route('/api/retrieve', methods=['POST'])
+def retrieve_stream():
+    """
+    Retrieval only, streamed as NDJSON for editors and bots:
+    {"query": ..., "repo": ..., "n_results": 10, "regions_per_file": 1,
+     "hyde": false, "rerank": null, "filters": {...}}.
+    Lines: {"type": "meta"} at once, then one {"type": "result"} per code
+    region (file path, line range, score, snippet) as each file is read, then
+    {"type": "done"} with the retrieval path and timings — or {"type": "error"}
+    if retrieval fails.
+    """
+    data = request.get_json(silent=True)
+    if not data:
+        return jsonify({"error": "Invalid JSON body"}), 400
+
+    repo_name, repo_error = _resolve_repo(data.get('repo'))
+    if repo_error:
+        return jsonify(repo_error[0]), repo_error[1]
+
+    query = (data.get('query') or '').strip()
+    if not query:
+        return jsonify({"error": "Empty query"}), 400
+
+    n_results = data.get('n_results', 10)
+    if isinstance(n_results, bool) or not isinstance(n_results, int) or not 1 <= n_results <= 50:
+        return jsonify({"error": "'n_results' must be an integer between 1 and 50"}), 400
+    regions_per_file = data.get('regions_per_file', 1)
+    if isinstance(regions_per_file, bool) or not isinstance(regions_per_file, int) or not 1 <= regions_per_file <= 10:
+        return jsonify({"error": "'regions_per_file' must be an integer between 1 and 10"}), 400
+
+    # HyDE costs an LLM call, so it is off unless asked for
+    hyde = data.get('hyde', False)
+    rerank = data.get('rerank')
+    if not isinstance(hyde, bool):
+        return jsonify({"error": "'hyde' must be true or false"}), 400
+    if rerank is not None and not isinstance(rerank, bool):
+        return jsonify({"error": "'rerank' must be true or false"}), 400
+
+    try:
+        filters = normalize_filters(data.get('filters'))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    def generate():
+        started = time.perf_counter()
+        yield json.dumps({"type": "meta", "query": query, "repository": repo_name}) + "\n"
+
+        # Each file is read and sent as soon as the ranking is done, not after all of them
+        stream = rag_pipeline.iter_retrieve(query, n_results=n_results, repo_name=repo_name, filters=filters,
+                                            rerank=rerank, hyde=hyde)
+        try:
+            head = next(stream)
+            if head.get('error'):
+                yield json.dumps({"type": "error", "error": head['error']}) + "\n"
+                return
+            retrieval_ms = round((time.perf_counter() - started) * 1000, 1)
+
+            count = 0
+            for result in stream:
+                for region in code_regions([result], regions_per_file=regions_per_file, first_rank=count + 1):
+                    count += 1
+                    yield json.dumps({"type": "result", **region}) + "\n"
+        finally:
+            stream.close()
+
+        yield json.dumps({
+            "type": "done",
+            "results": count,
+            "retrieval_path": head.get('retrieval_path'),
+            "children_inspected": head.get('children_inspected'),
+            "retrieval_ms": retrieval_ms,
+            "total_ms": round((time.perf_counter() - started) * 1000, 1)
+        }) + "\n"
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+
+@app.route('/api/retrieve/batch', methods=['POST'])
+def retrieve_batch():
+    """
+    Retrieval only (no LLM) for many queries in one pass:
+    {"queries": [...], "repo": ..., "n_results": 5, "filters": {...}, "include_text": true}.
+    include_text=false drops the file contents and keeps sources and spans.
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({"error": "Invalid JSON body"}), 400
+
+        repo_name, repo_error = _resolve_repo(data.get('repo'))
+        if repo_error:
+            return jsonify(repo_error[0]), repo_error[1]
+
+        queries = data.get('queries')
+        if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+            return jsonify({"error": "'queries' must be a non-empty list of non-empty strings"}), 400
+        if len(queries) > RETRIEVE_BATCH_MAX:
+            return jsonify({"error": f"At most {RETRIEVE_BATCH_MAX} queries per batch"}), 400
+        queries = [q.strip() for q in queries]
+
+        n_results = data.get('n_results', 5)
+        if isinstance(n_results, bool) or not isinstance(n_results, int) or not 1 <= n_results <= 50:
+            return jsonify({"error": "'n_results' must be an integer between 1 and 50"}), 400
+
+        include_text = data.get('include_text', True)
+        if not isinstance(include_text, bool):
+            return jsonify({"error": "'include_text' must be true or false"}), 400
+
+        try:
+            filters = normalize_filters(data.get('filters'))
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        batch = rag_pipeline.retrieve_many(queries, n_results=n_results, repo_name=repo_name, filters=filters)
+        if batch.get('error'):
+            return jsonify(batch), 500
+
+        if not include_text:
+            for result in batch['results']:
+                for item in result.get('results', []):
+                    item.pop('chunk', None)
+        return jsonify(batch), 200
+
+    except Exception as e:
+        print(f"[BATCH] Error: {str(e)}")
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/repository-info', methods=['GET'])
 def repository_info():
     try:
-        if not current_repo_name:
+        repo_name = secure_filename(request.args.get('repo', '')) or current_repo_name
+        if not repo_name:
             return jsonify({"loaded": False}), 200
 
-        info = rag_pipeline.get_repository_summary(current_repo_name)
+        info = rag_pipeline.get_repository_summary(repo_name)
         return jsonify({
             "loaded": True,
-            "repository": current_repo_name,
+            "repository": repo_name,
             "info": info
         }), 200
 
@@ -408,15 +995,131 @@ def repository_info():
         return jsonify({"error": str(e)}), 500
 
 
+@app.route('/api/repositories', methods=['GET'])
+def list_repositories():
+    """All indexed repositories; pass one as `repo` in /api/chat to select it."""
+    try:
+        return jsonify({
+            "repositories": vector_store.list_repositories(),
+            "offloaded": storage_manager.offloaded_repositories(),
+            "default": current_repo_name
+        }), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/repositories/<repo>/snapshot', methods=['GET'])
+def export_repository_snapshot(repo):
+    """Export a repo's index as one snapshot archive (saved in SNAPSHOT_DIR and downloaded)."""
+    repo_name, error = _resolve_repo(repo)
+    if error:
+        return jsonify(error[0]), error[1]
+
+    try:
+        archive_path = os.path.join(SNAPSHOT_DIR, f"{repo_name}{SNAPSHOT_EXTENSION}")
+        export_snapshot(rag_pipeline, repo_name, archive_path)
+        return send_file(os.path.abspath(archive_path), as_attachment=True,
+                         download_name=os.path.basename(archive_path))
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": f"Snapshot export failed: {str(e)}"}), 500
+
+
+@app.route('/api/repositories/import', methods=['POST'])
+def import_repository_snapshot():
+    """
+    Import a snapshot without re-embedding. Either upload it as `file`
+    (multipart), or name an archive already in SNAPSHOT_DIR as `snapshot`
+    (form or JSON) — the way to load archives larger than MAX_UPLOAD_SIZE.
+    Optional: `repo_name`, `backend`.
+    """
+    data = request.form if request.files or request.form else (request.get_json(silent=True) or {})
+    backend = (data.get('backend') or '').strip().lower() or None
+    if backend and backend not in SUPPORTED_BACKENDS:
+        return jsonify({"error": f"Unknown backend '{backend}'. Use one of: {', '.join(SUPPORTED_BACKENDS)}"}), 400
+    repo_name = secure_filename(data.get('repo_name') or '') or None
+
+    uploaded_path = None
+    if 'file' in request.files:
+        fd, uploaded_path = tempfile.mkstemp(prefix="snapshot-", suffix=SNAPSHOT_EXTENSION, dir=UPLOAD_FOLDER)
+        os.close(fd)
+        request.files['file'].save(uploaded_path)
+        archive_path = uploaded_path
+    else:
+        name = secure_filename(data.get('snapshot') or '')
+        archive_path = os.path.join(SNAPSHOT_DIR, name)
+        if not name or not os.path.isfile(archive_path):
+            return jsonify({"error": f"Snapshot '{name}' not found in {SNAPSHOT_DIR}"}), 404
+
+    try:
+        target = repo_name or peek_manifest(archive_path).get("repo_name") or ''
+        with storage_manager.in_use(target):
+            result = import_snapshot(rag_pipeline, archive_path, repo_name=repo_name, backend=backend)
+        _set_default_repo(result["repo_name"])
+        evicted = storage_manager.enforce_quota(protect=[result["repo_name"]])
+        if evicted:
+            result["evicted_repositories"] = evicted
+        return jsonify(result), 200
+    except RepositoryBusy as e:
+        return jsonify({"error": str(e)}), 409
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": f"Snapshot import failed: {str(e)}"}), 500
+    finally:
+        if uploaded_path and os.path.exists(uploaded_path):
+            os.remove(uploaded_path)
+
+
+@app.route('/api/repositories/<repo>', methods=['DELETE'])
+def delete_repository(repo):
+    """Delete one repo and all of its files."""
+    repo_name = secure_filename(repo)
+    if not vector_store.has_repository(repo_name) and repo_name not in storage_manager.offloaded_repositories():
+        return jsonify({"error": f"Repository '{repo_name}' not found"}), 404
+    try:
+        storage_manager.delete_repository(repo_name)
+        if current_repo_name == repo_name:
+            _set_default_repo(None)
+        with _progress_lock:
+            upload_progress.pop(repo_name, None)
+        return jsonify({"status": "success", "deleted": repo_name}), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/storage', methods=['GET'])
+def storage_report():
+    """Per-repo disk footprint and last access, against the quota."""
+    try:
+        return jsonify(storage_manager.footprint()), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route('/api/storage/gc', methods=['POST'])
+def storage_gc():
+    """Garbage-collect orphaned files, then enforce the quota."""
+    try:
+        report = storage_manager.collect_garbage()
+        report["evicted_repositories"] = storage_manager.enforce_quota()
+        return jsonify(report), 200
+    except Exception as e:
+        traceback.print_exc()
+        return jsonify({"error": str(e)}), 500
+
+
 @app.route('/api/reset', methods=['POST'])
 def reset_store():
-    global current_repo_name
-
     try:
         vector_store.reset()
-        current_repo_name = None
+        storage_manager.reset()
+        _set_default_repo(None)
         rag_pipeline.repository_metadata.clear()
-        _set_progress('idle', '', 0)
+        with _progress_lock:
+            upload_progress.clear()
 
         return jsonify({
             "status": "success",
@@ -505,19 +1208,9 @@ Rules:
 """
 
     # Try Groq first
-    groq_key = os.getenv('GROQ_API_KEY', '').strip()
-    groq_model = os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant')
-
-    if groq_key:
+    if providers.configured('groq'):
         try:
-            from groq import Groq
-            client = Groq(api_key=groq_key)
-            resp = client.chat.completions.create(
-                model=groq_model,
-                messages=[{'role': 'user', 'content': prompt}],
-                temperature=0.3,
-                max_tokens=1500,
-            )
+            resp = providers.groq_chat([{'role': 'user', 'content': prompt}], max_tokens=1500, temperature=0.3)
             raw = resp.choices[0].message.content.strip()
 
             # Strip any markdown code fences robustly
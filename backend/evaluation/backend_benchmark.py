@@ -0,0 +1,217 @@
+"""
+backend_benchmark.py — Chroma (HNSW) vs NumPy (exact) vector backend
+══════════════════════════════════════════════════════════════
+Builds both backends from the SAME embeddings and reports:
+  - build time and cold open time
+  - p50 / p95 / mean query latency
+  - recall@k of Chroma against exact search (NumPy = ground truth)
+
+Usage:
+  python evaluation/backend_benchmark.py CodeGenius            # chunks/<repo>.json
+  python evaluation/backend_benchmark.py --synthetic 50000     # random vectors
+  options: --k 10  --queries 200  --dim 384
+══════════════════════════════════════════════════════════════
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from numpy_index import NumpyCollection
+
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(__file__))
+
+
+# ══════════════════════════════════════════════════════════════
+# DATA
+# ══════════════════════════════════════════════════════════════
+
+def load_repo_vectors(repo_name: str, n_queries: int):
+    """Embed the repo's saved child chunks and pick query texts."""
+    from embeddings import EmbeddingEngine
+
+    chunks_path = os.path.join(BACKEND_DIR, "chunks", f"{repo_name}.json")
+    if not os.path.exists(chunks_path):
+        print(f"\n  ERROR: {chunks_path} not found. Upload the repo first.")
+        sys.exit(1)
+
+    with open(chunks_path, encoding="utf-8") as f:
+        chunks = json.load(f).get("chunks", [])
+
+    texts = [c.get("text", "") for c in chunks]
+    metadatas = [{"filepath": c.get("filepath") or "", "filename": c.get("filename") or ""} for c in chunks]
+
+    # Real questions from the evaluation dataset, topped up with chunk samples
+    queries = []
+    dataset_path = os.path.join(os.path.dirname(__file__), "datasets", f"{repo_name}.json")
+    if os.path.exists(dataset_path):
+        with open(dataset_path, encoding="utf-8") as f:
+            queries = [item["query"] for item in json.load(f) if item.get("query")]
+    rng = random.Random(0)
+    while len(queries) < n_queries and texts:
+        queries.append(rng.choice(texts)[:300])
+
+    engine = EmbeddingEngine()
+    vectors = np.asarray(engine.embed_texts(texts), dtype=np.float32)
+    query_vectors = np.asarray(engine.embed_texts(queries[:n_queries]), dtype=np.float32)
+    return texts, metadatas, vectors, query_vectors
+
+
+def synthetic_vectors(n: int, dim: int, n_queries: int):
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+
+    # Queries near real rows, like a question close to some chunk
+    picks = rng.integers(0, n, size=n_queries)
+    queries = vectors[picks] + 0.5 * rng.standard_normal((n_queries, dim)).astype(np.float32) / np.sqrt(dim)
+    texts = [f"doc {i}" for i in range(n)]
+    metadatas = [{"filepath": f"file_{i % 500}.py", "filename": f"file_{i % 500}.py"} for i in range(n)]
+    return texts, metadatas, vectors, queries
+
+
+# ══════════════════════════════════════════════════════════════
+# BENCHMARK
+# ══════════════════════════════════════════════════════════════
+
+def _add_in_batches(collection, ids, texts, metadatas, vectors, batch_size=1000):
+    for start in range(0, len(ids), batch_size):
+        end = start + batch_size
+        collection.add(
+            ids=ids[start:end],
+            documents=texts[start:end],
+            metadatas=metadatas[start:end],
+            embeddings=vectors[start:end].tolist()
+        )
+
+
+def _latencies(fn, query_vectors, k):
+    results, times = [], []
+    for q in query_vectors:
+        t0 = time.perf_counter()
+        res = fn(q, k)
+        times.append((time.perf_counter() - t0) * 1000)
+        results.append(res)
+    return results, np.asarray(times)
+
+
+def run_benchmark(texts, metadatas, vectors, query_vectors, k: int) -> dict:
+    import chromadb
+
+    ids = [f"doc_{i}" for i in range(len(texts))]
+    work_dir = tempfile.mkdtemp(prefix="codegenius_bench_")
+
+    # ── Chroma ────────────────────────────────────────────────
+    t0 = time.perf_counter()
+    client = chromadb.PersistentClient(path=os.path.join(work_dir, "chroma"))
+    chroma = client.create_collection(name="bench", metadata={"hnsw:space": "cosine"})
+    _add_in_batches(chroma, ids, texts, metadatas, vectors)
+    chroma_build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    chroma = chromadb.PersistentClient(path=os.path.join(work_dir, "chroma")).get_collection(name="bench")
+    chroma.count()
+    chroma_open = time.perf_counter() - t0
+
+    # ── NumPy ─────────────────────────────────────────────────
+    numpy_root = os.path.join(work_dir, "numpy")
+    t0 = time.perf_counter()
+    exact = NumpyCollection(numpy_root, "bench")
+    _add_in_batches(exact, ids, texts, metadatas, vectors)
+    exact.flush()
+    numpy_build = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    exact = NumpyCollection(numpy_root, "bench")
+    exact.count()
+    numpy_open = time.perf_counter() - t0
+
+    def chroma_query(q, n):
+        return chroma.query(query_embeddings=[q.tolist()], n_results=n, include=["distances"])["ids"][0]
+
+    def numpy_query(q, n):
+        return exact.query(query_embeddings=[q], n_results=n, include=["distances"])["ids"][0]
+
+    # Warm-up both so first-call overheads don't skew p95
+    chroma_query(query_vectors[0], k)
+    numpy_query(query_vectors[0], k)
+
+    chroma_ids, chroma_ms = _latencies(chroma_query, query_vectors, k)
+    numpy_ids, numpy_ms = _latencies(numpy_query, query_vectors, k)
+
+    recalls = [
+        len(set(approx) & set(truth)) / max(len(truth), 1)
+        for approx, truth in zip(chroma_ids, numpy_ids)
+    ]
+
+    def summary(build, opened, ms, recall):
+        return {
+            "build_seconds": round(build, 3),
+            "open_seconds": round(opened, 3),
+            "p50_ms": round(float(np.percentile(ms, 50)), 3),
+            "p95_ms": round(float(np.percentile(ms, 95)), 3),
+            "mean_ms": round(float(ms.mean()), 3),
+            f"recall@{k}": round(recall, 4),
+        }
+
+    return {
+        "chunks": len(texts),
+        "dimension": int(vectors.shape[1]),
+        "queries": len(query_vectors),
+        "k": k,
+        "chroma": summary(chroma_build, chroma_open, chroma_ms, float(np.mean(recalls))),
+        "numpy": summary(numpy_build, numpy_open, numpy_ms, 1.0),
+    }
+
+
+def print_report(report: dict) -> None:
+    k = report["k"]
+    print(f"\n{'═'*70}")
+    print(f"  Vector Backend Benchmark — {report['chunks']} chunks, dim={report['dimension']}, "
+          f"{report['queries']} queries, k={k}")
+    print(f"{'═'*70}")
+    print(f"{'Backend':<10} | {'Build s':>8} | {'Open s':>7} | {'p50 ms':>7} | {'p95 ms':>7} | {'Mean ms':>8} | {'Recall@' + str(k):>9}")
+    print(f"{'─'*70}")
+    for name in ("chroma", "numpy"):
+        r = report[name]
+        print(f"{name:<10} | {r['build_seconds']:>8.2f} | {r['open_seconds']:>7.3f} | {r['p50_ms']:>7.2f} | "
+              f"{r['p95_ms']:>7.2f} | {r['mean_ms']:>8.2f} | {r[f'recall@{k}']:>9.3f}")
+    print(f"{'─'*70}")
+
+
+# ══════════════════════════════════════════════════════════════
+# ENTRY POINT
+# ══════════════════════════════════════════════════════════════
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark Chroma vs NumPy vector backends")
+    parser.add_argument("repo", nargs="?", default="CodeGenius")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of a repo")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.synthetic:
+        data = synthetic_vectors(args.synthetic, args.dim, args.queries)
+        label = f"synthetic_{args.synthetic}"
+    else:
+        data = load_repo_vectors(args.repo, args.queries)
+        label = args.repo
+
+    report = run_benchmark(*data, k=args.k)
+    print_report(report)
+
+    output_path = os.path.join(os.path.dirname(__file__), f"backend_benchmark_{label}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n  💾 Benchmark saved → {output_path}\n")
@@ -27,6 +27,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 load_dotenv(os.path.join(os.path.dirname(os.path.dirname(__file__)), '.env'))
 
 from vector_store import VectorStore
+from llm_providers import get_provider_manager
 
 
 # ══════════════════════════════════════════════════════════════
@@ -42,9 +43,10 @@ class EvalRAGPipeline:
     def __init__(self, vector_store: VectorStore):
         from rag_pipeline import RAGPipeline
         self._pipeline = RAGPipeline(vector_store)
-        self._groq_key = os.getenv('GROQ_API_KEY', '').strip()
+        # Same client and breakers as HyDE: a down Groq fails fast for the whole run
+        self._providers = get_provider_manager()
 
-    def retrieve(self, query: str, n_results: int = 5):
+    def retrieve(self, query: str, n_results: int = 5, adaptive=None):
         """Retrieval only — jailbreak bypass."""
         try:
             repo_name = self._pipeline.vector_store.current_repo
@@ -59,7 +61,9 @@ class EvalRAGPipeline:
             result = self._pipeline.parent_child_retriever.retrieve_parent_context(
                 query=expanded,
                 repo_name=repo_name,
-                n_results=n_results
+                n_results=n_results,
+                lexical_query=query,
+                adaptive=adaptive
             )
             result["query"] = query
             return result
@@ -76,13 +80,10 @@ class EvalRAGPipeline:
             return {"answer": "", "model": "none"}
 
         # Try Groq
-        if self._groq_key:
+        if self._providers.configured("groq"):
             try:
-                from groq import Groq
-                client = Groq(api_key=self._groq_key)
-                response = client.chat.completions.create(
-                    model=os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant'),
-                    messages=[
+                response = self._providers.groq_chat(
+                    [
                         {"role": "system", "content": "You are a code analysis expert. Answer questions about code concisely and clearly based on the provided context only."},
                         {"role": "user", "content": f"Code Context:\n{context[:3000]}\n\nQuestion: {query}"}
                     ],
@@ -209,7 +210,9 @@ def evaluate_retrieval(repo_name: str, dataset_path: str, dataset_type: str):
             continue
 
         # ── 1. RETRIEVAL ──────────────────────────────────────
-        result = rag.retrieve(query, n_results=15)
+        # Adaptive retrieval returns distinct files; a few spare ones cover the
+        # evaluation/dataset files filtered out below
+        result = rag.retrieve(query, n_results=8, adaptive=True)
         retrieved_docs = []
         retrieved_contexts = []
 
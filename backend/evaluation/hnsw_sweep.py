@@ -0,0 +1,229 @@
+"""
+hnsw_sweep.py — Recall / latency sweep over Chroma HNSW parameters
+══════════════════════════════════════════════════════════════
+Builds Chroma collections from the SAME embeddings at several
+(M, construction_ef) settings, queries each at several search_ef values,
+and reports per setting:
+  - build time and memory (RSS growth during build, index size on disk)
+  - p50 / p95 query latency
+  - recall@k against exact search (NumpyCollection = ground truth)
+
+Usage:
+  python evaluation/hnsw_sweep.py CodeGenius                  # chunks/<repo>.json
+  python evaluation/hnsw_sweep.py --synthetic 500000          # random vectors
+  python evaluation/hnsw_sweep.py --synthetic 200000 --presets
+  options: --m 16,32  --construction-ef 100,200  --search-ef 32,64,128,256
+           --k 10  --queries 200  --dim 384  --target-recall 0.95
+
+Random vectors are a pessimistic case for HNSW — prefer real embeddings
+from a repo when choosing settings for production.
+══════════════════════════════════════════════════════════════
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from numpy_index import NumpyCollection
+from vector_store import HNSW_PRESETS, hnsw_metadata
+from backend_benchmark import load_repo_vectors, synthetic_vectors, _add_in_batches, _latencies
+
+
+# ══════════════════════════════════════════════════════════════
+# MEASUREMENT HELPERS
+# ══════════════════════════════════════════════════════════════
+
+def _rss_mb() -> float:
+    """Current resident set size in MB (Linux /proc; 0.0 elsewhere)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return 0.0
+
+
+def _dir_size_mb(path: str) -> float:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            total += os.path.getsize(os.path.join(root, name))
+    return total / (1024 * 1024)
+
+
+def exact_neighbours(texts, metadatas, vectors, query_vectors, k: int, work_dir: str):
+    """Ground-truth top-k ids from exact search over the same embeddings."""
+    ids = [f"doc_{i}" for i in range(len(texts))]
+    exact = NumpyCollection(os.path.join(work_dir, "exact"), "sweep")
+    _add_in_batches(exact, ids, texts, metadatas, vectors, batch_size=10000)
+    exact.flush()
+
+    truth = []
+    for start in range(0, len(query_vectors), 32):
+        res = exact.query(query_embeddings=query_vectors[start:start + 32], n_results=k, include=["distances"])
+        truth.extend(res["ids"])
+    return truth
+
+
+# ══════════════════════════════════════════════════════════════
+# SWEEP
+# ══════════════════════════════════════════════════════════════
+
+def _build(client, name, params, ids, texts, metadatas, vectors):
+    rss_before = _rss_mb()
+    t0 = time.perf_counter()
+    collection = client.create_collection(name=name, metadata=hnsw_metadata(params))
+    _add_in_batches(collection, ids, texts, metadatas, vectors)
+    build_seconds = time.perf_counter() - t0
+    return collection, build_seconds, max(0.0, _rss_mb() - rss_before)
+
+
+def run_sweep(texts, metadatas, vectors, query_vectors, k: int, grid: list) -> dict:
+    """
+    grid: list of {"M", "construction_ef", "search_efs": [...]} build settings.
+
+    Chroma reads search_ef when the index is loaded — a live modify() does not
+    reach an open index — so every (M, construction_ef, search_ef) is its own build.
+    """
+    import chromadb
+
+    ids = [f"doc_{i}" for i in range(len(texts))]
+    work_dir = tempfile.mkdtemp(prefix="codegenius_hnsw_")
+    rows = []
+    try:
+        print(f"  Exact ground truth over {len(texts)} vectors...", flush=True)
+        truth = exact_neighbours(texts, metadatas, vectors, query_vectors, k, work_dir)
+        shutil.rmtree(os.path.join(work_dir, "exact"), ignore_errors=True)
+
+        settings = [
+            {"M": g["M"], "construction_ef": g["construction_ef"], "search_ef": ef}
+            for g in grid for ef in g["search_efs"]
+        ]
+        for build_no, params in enumerate(settings):
+            chroma_dir = os.path.join(work_dir, f"chroma_{build_no}")
+            client = chromadb.PersistentClient(path=chroma_dir)
+
+            print(f"  Building M={params['M']} construction_ef={params['construction_ef']} "
+                  f"search_ef={params['search_ef']}...", flush=True)
+            collection, build_seconds, rss_mb = _build(client, "sweep", params, ids, texts, metadatas, vectors)
+            disk_mb = _dir_size_mb(chroma_dir)
+
+            def query(q, n):
+                return collection.query(query_embeddings=[q.tolist()], n_results=n, include=["distances"])["ids"][0]
+
+            query(query_vectors[0], k)  # warm-up
+            found, ms = _latencies(query, query_vectors, k)
+            recall = float(np.mean([
+                len(set(approx) & set(exact)) / max(len(exact), 1)
+                for approx, exact in zip(found, truth)
+            ]))
+            rows.append({
+                **params,
+                "build_seconds": round(build_seconds, 3),
+                "build_rss_mb": round(rss_mb, 1),
+                "index_disk_mb": round(disk_mb, 1),
+                "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                "p95_ms": round(float(np.percentile(ms, 95)), 3),
+                f"recall@{k}": round(recall, 4),
+            })
+
+            client.delete_collection(name="sweep")
+            del collection, client
+            shutil.rmtree(chroma_dir, ignore_errors=True)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    return {
+        "chunks": len(texts),
+        "dimension": int(vectors.shape[1]),
+        "queries": len(query_vectors),
+        "k": k,
+        "results": rows,
+    }
+
+
+def recommend(report: dict, target_recall: float):
+    """Lowest-p95 setting that reaches target_recall (None if none does)."""
+    key = f"recall@{report['k']}"
+    passing = [r for r in report["results"] if r[key] >= target_recall]
+    return min(passing, key=lambda r: (r["p95_ms"], r["build_seconds"])) if passing else None
+
+
+def print_report(report: dict, target_recall: float) -> None:
+    k = report["k"]
+    key = f"recall@{k}"
+    print(f"\n{'═'*92}")
+    print(f"  HNSW Sweep — {report['chunks']} chunks, dim={report['dimension']}, "
+          f"{report['queries']} queries, k={k}")
+    print(f"{'═'*92}")
+    print(f"{'M':>4} | {'ef_build':>8} | {'ef_search':>9} | {'Build s':>8} | {'RSS MB':>7} | "
+          f"{'Disk MB':>7} | {'p50 ms':>7} | {'p95 ms':>7} | {'Recall@' + str(k):>9}")
+    print(f"{'─'*92}")
+    for r in report["results"]:
+        print(f"{r['M']:>4} | {r['construction_ef']:>8} | {r['search_ef']:>9} | {r['build_seconds']:>8.2f} | "
+              f"{r['build_rss_mb']:>7.1f} | {r['index_disk_mb']:>7.1f} | {r['p50_ms']:>7.2f} | "
+              f"{r['p95_ms']:>7.2f} | {r[key]:>9.3f}")
+    print(f"{'─'*92}")
+
+    best = recommend(report, target_recall)
+    if best:
+        print(f"  ✅ Fastest setting with {key} ≥ {target_recall}: "
+              f"M={best['M']} construction_ef={best['construction_ef']} search_ef={best['search_ef']}")
+    else:
+        print(f"  ⚠️  No setting reached {key} ≥ {target_recall} — widen the grid")
+
+
+def _int_list(value: str):
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+# ══════════════════════════════════════════════════════════════
+# ENTRY POINT
+# ══════════════════════════════════════════════════════════════
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sweep Chroma HNSW parameters for recall vs latency")
+    parser.add_argument("repo", nargs="?", default="CodeGenius")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N random vectors instead of a repo")
+    parser.add_argument("--dim", type=int, default=384)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--m", type=_int_list, default=[16, 32])
+    parser.add_argument("--construction-ef", type=_int_list, default=[100, 200])
+    parser.add_argument("--search-ef", type=_int_list, default=[32, 64, 128, 256])
+    parser.add_argument("--presets", action="store_true", help="sweep the HNSW_PRESETS instead of the grid")
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    args = parser.parse_args()
+
+    if args.presets:
+        grid = [
+            {"M": p["M"], "construction_ef": p["construction_ef"], "search_efs": [p["search_ef"]]}
+            for p in HNSW_PRESETS.values()
+        ]
+    else:
+        grid = [
+            {"M": m, "construction_ef": ef, "search_efs": args.search_ef}
+            for m in args.m for ef in args.construction_ef
+        ]
+
+    if args.synthetic:
+        data = synthetic_vectors(args.synthetic, args.dim, args.queries)
+        label = f"synthetic_{args.synthetic}"
+    else:
+        data = load_repo_vectors(args.repo, args.queries)
+        label = args.repo
+
+    report = run_sweep(*data, k=args.k, grid=grid)
+    print_report(report, args.target_recall)
+
+    output_path = os.path.join(os.path.dirname(__file__), f"hnsw_sweep_{label}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n  💾 Sweep saved → {output_path}\n")
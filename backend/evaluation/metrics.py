@@ -227,9 +227,6 @@ def llm_evaluate(answer: str, context: str, query: str, groq_api_key: str = None
         return None
 
     try:
-        from groq import Groq
-        client = Groq(api_key=groq_api_key)
-
         prompt = f"""You are an evaluation expert. Rate the following answer on a scale of 1-5 for each metric.
 
 QUERY: {query}
@@ -255,12 +252,21 @@ Scoring guide:
 - completeness: Does it cover all important aspects? (5=complete, 1=very incomplete)
 - overall: Overall quality (5=excellent, 1=poor)"""
 
-        response = client.chat.completions.create(
-            model=os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant'),
-            messages=[{"role": "user", "content": prompt}],
-            max_tokens=256,
-            temperature=0.1
-        )
+        # Shared client and breaker (backend/llm_providers.py); a separate
+        # client only when a different key is passed in
+        from llm_providers import get_provider_manager
+        providers = get_provider_manager()
+        messages = [{"role": "user", "content": prompt}]
+        if groq_api_key == providers.groq_api_key:
+            response = providers.groq_chat(messages, max_tokens=256, temperature=0.1)
+        else:
+            from groq import Groq
+            response = Groq(api_key=groq_api_key).chat.completions.create(
+                model=os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant'),
+                messages=messages,
+                max_tokens=256,
+                temperature=0.1
+            )
 
         raw = response.choices[0].message.content.strip()
 
@@ -0,0 +1,143 @@
+"""
+rerank_benchmark.py — Bi-encoder ranking vs cross-encoder re-ranking
+══════════════════════════════════════════════════════════════
+Runs every query of datasets/<repo>.json through parent retrieval twice —
+without and with the cross-encoder stage — against the already indexed
+repo, and reports per mode:
+  - MRR and hit@k of the first relevant file (evaluator's keyword match)
+  - p50 / p95 retrieval latency, and re-rank time / candidates scored
+
+HyDE is skipped so both modes see the same query text.
+
+Usage:
+  python evaluation/rerank_benchmark.py CodeGenius
+  options: --k 5  --candidates 30  --budget-ms 150  --model <dir or id>
+══════════════════════════════════════════════════════════════
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
+
+from evaluator import is_relevant, mrr_from_retrieved
+from vector_store import VectorStore
+from rag.parent_child_retriever import ParentChildRetriever
+from rag.reranker import CrossEncoderReranker, RERANK_CANDIDATES, RERANK_MODEL
+
+
+SKIP_DIRS = ("evaluation/", "datasets/", "chunks/")
+
+
+def _ranked_files(result: dict) -> list:
+    files = []
+    for res in result.get("results", []):
+        name = (res.get("filename") or "").replace("\\", "/")
+        if name and not any(d in name for d in SKIP_DIRS) and name not in files:
+            files.append(name)
+    return files
+
+
+def run_comparison(repo_name: str, dataset: list, k: int, budget_ms: float,
+                   candidates: int = RERANK_CANDIDATES, model: str = RERANK_MODEL) -> dict:
+    vector_store = VectorStore()
+    if vector_store.get_collection(repo_name) is None:
+        print(f"\n  ERROR: repository '{repo_name}' is not indexed. Upload it first.")
+        sys.exit(1)
+    retriever = ParentChildRetriever(vector_store)
+    retriever.reranker = CrossEncoderReranker(model_name=model, max_candidates=candidates)
+    if not retriever.reranker.load():
+        print(f"\n  ERROR: re-rank model '{retriever.reranker.model_name}' could not be loaded.")
+        sys.exit(1)
+
+    items = [item for item in dataset if item.get("query") and item.get("relevant_docs_keywords")]
+    modes = {"bi_encoder": False, "cross_encoder": True}
+    report = {"repo": repo_name, "queries": len(items), "k": k, "budget_ms": budget_ms,
+              "candidates": candidates, "model": model}
+
+    # One warm-up per mode: model load, first HNSW touch, parent reads
+    for rerank in modes.values():
+        retriever.retrieve_parent_context(items[0]["query"], repo_name, n_results=k, rerank=rerank)
+
+    for mode, rerank in modes.items():
+        mrrs, hits, times, rerank_ms, scored = [], [], [], [], []
+        for item in items:
+            t0 = time.perf_counter()
+            result = retriever.retrieve_parent_context(
+                item["query"], repo_name, n_results=k, rerank=rerank, rerank_budget_ms=budget_ms
+            )
+            times.append((time.perf_counter() - t0) * 1000)
+
+            files = _ranked_files(result)[:k]
+            keywords = item["relevant_docs_keywords"]
+            mrrs.append(mrr_from_retrieved(files, keywords))
+            hits.append(1.0 if any(is_relevant(f, keywords) for f in files) else 0.0)
+            if "rerank" in result:
+                rerank_ms.append(result["rerank"]["ms"])
+                scored.append(result["rerank"]["scored"])
+
+        times = np.asarray(times)
+        report[mode] = {
+            "mrr": round(float(np.mean(mrrs)), 4),
+            f"hit@{k}": round(float(np.mean(hits)), 4),
+            "p50_ms": round(float(np.percentile(times, 50)), 2),
+            "p95_ms": round(float(np.percentile(times, 95)), 2),
+            "rerank_mean_ms": round(float(np.mean(rerank_ms)), 2) if rerank_ms else 0.0,
+            "mean_scored": round(float(np.mean(scored)), 1) if scored else 0.0,
+        }
+    return report
+
+
+def print_report(report: dict) -> None:
+    k = report["k"]
+    print(f"\n{'═'*78}")
+    print(f"  Re-rank Comparison — {report['repo']}, {report['queries']} queries, k={k}, "
+          f"budget={report['budget_ms']:.0f} ms")
+    print(f"{'═'*78}")
+    print(f"{'Mode':<14} | {'MRR':>6} | {'Hit@' + str(k):>6} | {'p50 ms':>7} | {'p95 ms':>7} | "
+          f"{'Rerank ms':>9} | {'Scored':>6}")
+    print(f"{'─'*78}")
+    for mode in ("bi_encoder", "cross_encoder"):
+        r = report[mode]
+        print(f"{mode:<14} | {r['mrr']:>6.3f} | {r[f'hit@{k}']:>6.3f} | {r['p50_ms']:>7.1f} | "
+              f"{r['p95_ms']:>7.1f} | {r['rerank_mean_ms']:>9.1f} | {r['mean_scored']:>6.1f}")
+    print(f"{'─'*78}")
+    delta = report["cross_encoder"]["mrr"] - report["bi_encoder"]["mrr"]
+    cost = report["cross_encoder"]["p50_ms"] - report["bi_encoder"]["p50_ms"]
+    print(f"  MRR {delta:+.3f} for {cost:+.1f} ms p50")
+
+
+# ══════════════════════════════════════════════════════════════
+# ENTRY POINT
+# ══════════════════════════════════════════════════════════════
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare retrieval with and without cross-encoder re-ranking")
+    parser.add_argument("repo", nargs="?", default="CodeGenius")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--candidates", type=int, default=RERANK_CANDIDATES)
+    parser.add_argument("--budget-ms", type=float, default=1000.0,
+                        help="generous by default so quality is measured on the full candidate list")
+    parser.add_argument("--model", default=RERANK_MODEL, help="cross-encoder directory or cached model id")
+    args = parser.parse_args()
+
+    dataset_path = os.path.join(os.path.dirname(__file__), "datasets", f"{args.repo}.json")
+    if not os.path.exists(dataset_path):
+        print(f"\n  ERROR: Dataset not found: '{dataset_path}'")
+        sys.exit(1)
+    with open(dataset_path, encoding="utf-8") as f:
+        dataset = json.load(f)
+
+    report = run_comparison(args.repo, dataset, k=args.k, budget_ms=args.budget_ms,
+                            candidates=args.candidates, model=args.model)
+    print_report(report)
+
+    output_path = os.path.join(os.path.dirname(__file__), f"rerank_benchmark_{args.repo}.json")
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print(f"\n  💾 Comparison saved → {output_path}\n")
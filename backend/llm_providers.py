@@ -0,0 +1,435 @@
+import os
+import time
+import queue
+import itertools
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+# ── Shared LLM clients, cached health and circuit breakers ───────────────────
+# One Groq client and one pooled Ollama session per process, used by chat,
+# HyDE and the evaluator. A provider that keeps failing is skipped at once
+# (its breaker is open) instead of costing every request a timeout; after
+# BREAKER_COOLDOWN one trial call, or a successful health probe, closes it.
+PROVIDER_PROBE_INTERVAL = float(os.getenv("PROVIDER_PROBE_INTERVAL", 30))   # seconds; 0 = no background probe
+PROVIDER_PROBE_TIMEOUT = float(os.getenv("PROVIDER_PROBE_TIMEOUT", 3))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 3))  # consecutive failures that open it
+BREAKER_COOLDOWN = float(os.getenv("BREAKER_COOLDOWN", 30))                 # seconds open before a trial call
+OLLAMA_POOL_SIZE = int(os.getenv("OLLAMA_POOL_SIZE", 8))
+GROQ_TIMEOUT = float(os.getenv("GROQ_TIMEOUT", 60))
+GROQ_MAX_RETRIES = int(os.getenv("GROQ_MAX_RETRIES", 1))
+
+# Hedged requests: when the primary provider has no first token after the
+# HEDGE_PERCENTILE of its recent first-token times, the secondary is started
+# too and the first to produce a token answers.
+LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 90))
+LLM_HEDGE_DELAY_MS = float(os.getenv("LLM_HEDGE_DELAY_MS", 1500))   # until HEDGE_MIN_SAMPLES are known
+LLM_HEDGE_MIN_MS = float(os.getenv("LLM_HEDGE_MIN_MS", 200))
+LLM_HEDGE_MAX_MS = float(os.getenv("LLM_HEDGE_MAX_MS", 5000))
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 200    # first-token times kept per provider
+
+PROVIDERS = ("groq", "ollama")
+
+
+class ProviderUnavailable(Exception):
+    """The provider is not configured, or its circuit breaker is open."""
+
+
+class CircuitBreaker:
+    """
+    closed → open after `threshold` consecutive failures; open → half-open
+    once `cooldown` seconds have passed, letting a single trial call through;
+    the trial's outcome closes or re-opens it.
+    """
+
+    def __init__(self, threshold: int = BREAKER_FAILURE_THRESHOLD, cooldown: float = BREAKER_COOLDOWN):
+        self.threshold = max(1, threshold)
+        self.cooldown = cooldown
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.last_error: Optional[str] = None
+        self.times_opened = 0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self.state == "closed":
+                return True
+            if self.state == "open" and time.time() - self.opened_at >= self.cooldown:
+                self.state = "half_open"
+                self._trial_in_flight = False
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.state = "closed"
+            self.failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self, error: str) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = error
+            self._trial_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.threshold):
+                if self.state != "open":
+                    self.times_opened += 1
+                self.state = "open"
+                self.opened_at = time.time()
+
+    def retry_in(self) -> float:
+        """Seconds until an open breaker lets a trial call through."""
+        with self._lock:
+            if self.state != "open":
+                return 0.0
+            return max(0.0, self.cooldown - (time.time() - self.opened_at))
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "state":        self.state,
+                "failures":     self.failures,
+                "times_opened": self.times_opened,
+                "rejected":     self.rejected,
+                "last_error":   self.last_error,
+            }
+
+
+class ProviderManager:
+    """
+    Long-lived Groq client and Ollama `requests.Session`, a circuit breaker
+    per provider, and health from a background probe (start_probing) so
+    callers read a cached status instead of probing per request.
+    """
+
+    def __init__(self,
+                 threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 cooldown: float = BREAKER_COOLDOWN,
+                 probe_interval: float = PROVIDER_PROBE_INTERVAL):
+        self.groq_api_key = os.getenv("GROQ_API_KEY", "").strip()
+        self.groq_model = os.getenv("GROQ_MODEL", "llama-3.1-8b-instant")
+        self.ollama_base_url = os.getenv("OLLAMA_BASE_URL", "http://localhost:11434")
+        self.ollama_model = os.getenv("OLLAMA_MODEL", "tinyllama")
+        self.probe_interval = probe_interval
+        self.breakers = {name: CircuitBreaker(threshold, cooldown) for name in PROVIDERS}
+        self.health: Dict[str, Dict[str, Any]] = {name: {"healthy": None, "checked_at": None} for name in PROVIDERS}
+
+        self._groq_client = None
+        self._groq_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+        self.ollama_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=OLLAMA_POOL_SIZE)
+        self.ollama_session.mount("http://", adapter)
+        self.ollama_session.mount("https://", adapter)
+
+        self._prober: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        self._first_token_times = {name: deque(maxlen=HEDGE_WINDOW) for name in PROVIDERS}
+        self._hedge_lock = threading.Lock()
+        self.hedge_requests = 0
+        self.hedged = 0
+        self.hedge_cancelled = 0
+        self.hedge_wins = {name: 0 for name in PROVIDERS}
+
+    # ── clients ──────────────────────────────────────────────────────────────
+
+    def groq_client(self):
+        """The shared Groq client; ProviderUnavailable when it cannot be built."""
+        with self._lock:
+            if self._groq_client is None and self._groq_error is None:
+                if not self.groq_api_key:
+                    self._groq_error = "GROQ_API_KEY not configured"
+                else:
+                    try:
+                        from groq import Groq
+                        self._groq_client = Groq(api_key=self.groq_api_key,
+                                                 timeout=GROQ_TIMEOUT,
+                                                 max_retries=GROQ_MAX_RETRIES)
+                    except ImportError:
+                        self._groq_error = "groq package not installed. Run: pip install groq"
+            if self._groq_client is None:
+                raise ProviderUnavailable(self._groq_error)
+            return self._groq_client
+
+    def configured(self, name: str) -> bool:
+        if name == "groq":
+            try:
+                self.groq_client()
+            except ProviderUnavailable:
+                return False
+        return True
+
+    # ── breaker bookkeeping ──────────────────────────────────────────────────
+
+    def check(self, name: str) -> None:
+        """Raise ProviderUnavailable when the provider's breaker rejects the call."""
+        breaker = self.breakers[name]
+        if not breaker.allow():
+            raise ProviderUnavailable(
+                f"{name} circuit open after {breaker.failures} failures; retry in {breaker.retry_in():.0f}s"
+            )
+
+    def record_success(self, name: str) -> None:
+        self.breakers[name].record_success()
+
+    def record_failure(self, name: str, error: Any) -> None:
+        self.breakers[name].record_failure(str(error))
+
+    def call(self, name: str, fn: Callable[[], Any]) -> Any:
+        """Run fn() under the provider's breaker; its exceptions count as failures and propagate."""
+        self.check(name)
+        try:
+            result = fn()
+        except Exception as e:
+            self.record_failure(name, e)
+            raise
+        self.record_success(name)
+        return result
+
+    # ── calls ────────────────────────────────────────────────────────────────
+
+    def groq_chat(self, messages: List[Dict[str, str]], max_tokens: int, temperature: float,
+                  model: Optional[str] = None, stream: bool = False):
+        """chat.completions.create on the shared client (a chunk stream with stream=True)."""
+        client = self.groq_client()
+        return self.call("groq", lambda: client.chat.completions.create(
+            model=model or self.groq_model,
+            messages=messages,
+            max_tokens=max_tokens,
+            temperature=temperature,
+            stream=stream
+        ))
+
+    def ollama_generate(self, prompt: str, model: Optional[str] = None, stream: bool = False,
+                        timeout=120) -> requests.Response:
+        """
+        POST /api/generate on the pooled session. A 5xx counts as a failure;
+        other statuses (404 for a missing model) are returned to the caller.
+        """
+        def post():
+            response = self.ollama_session.post(
+                f"{self.ollama_base_url}/api/generate",
+                json={"model": model or self.ollama_model, "prompt": prompt, "stream": stream},
+                stream=stream,
+                timeout=timeout
+            )
+            if response.status_code >= 500:
+                response.close()
+                raise requests.exceptions.HTTPError(f"Ollama error: HTTP {response.status_code}", response=response)
+            return response
+
+        return self.call("ollama", post)
+
+    # ── hedging ──────────────────────────────────────────────────────────────
+
+    def record_first_token(self, name: str, seconds: float) -> None:
+        with self._hedge_lock:
+            self._first_token_times[name].append(seconds)
+
+    def hedge_delay(self, name: str) -> float:
+        """Seconds to wait for the provider's first token before hedging."""
+        with self._hedge_lock:
+            times = sorted(self._first_token_times[name])
+        if len(times) < HEDGE_MIN_SAMPLES:
+            delay_ms = LLM_HEDGE_DELAY_MS
+        else:
+            rank = min(len(times) - 1, int(len(times) * LLM_HEDGE_PERCENTILE / 100))
+            delay_ms = times[rank] * 1000
+        return min(max(delay_ms, LLM_HEDGE_MIN_MS), LLM_HEDGE_MAX_MS) / 1000
+
+    def hedge(self, primary, secondary) -> Dict[str, Any]:
+        """
+        Race two streaming attempts, each (provider name, fn returning a
+        stream dict: {"tokens", "close", "model", ...} or {"error"}). The
+        secondary starts when the primary has no first token after
+        hedge_delay(primary), or at once when the primary fails. The first
+        attempt with a token wins and the other is closed. Returns the
+        winner's dict (its tokens still include the first one) with a
+        "hedge" report, or {"error"} when both fail.
+        """
+        delay = self.hedge_delay(primary[0])
+        outcomes: "queue.Queue" = queue.Queue()
+        streams: Dict[str, Dict[str, Any]] = {}   # started streams, to close the loser
+        settled = threading.Event()
+        lock = threading.Lock()
+
+        def attempt(name, start):
+            started = time.perf_counter()
+            result = start()
+            if "error" in result:
+                outcomes.put((name, result, None))
+                return
+            with lock:
+                if settled.is_set():
+                    result["close"]()
+                    return
+                streams[name] = result
+            try:
+                first = next(result["tokens"])
+            except Exception as e:
+                result["close"]()
+                if settled.is_set():
+                    return      # closed as the loser
+                if not isinstance(e, StopIteration):
+                    self.record_failure(name, e)
+                problem = "returned empty response" if isinstance(e, StopIteration) else f"error: {str(e)}"
+                outcomes.put((name, {"error": f"{result['model']} {problem}"}, None))
+                return
+            self.record_first_token(name, time.perf_counter() - started)
+            with lock:
+                if settled.is_set():
+                    result["close"]()
+                    return
+                outcomes.put((name, result, first))
+
+        def launch(name, start):
+            threading.Thread(target=attempt, args=(name, start), name=f"llm-hedge-{name}", daemon=True).start()
+
+        launch(*primary)
+        running, hedged, secondary_started = 1, False, False
+        errors = []
+        while running:
+            try:
+                name, result, first = outcomes.get(timeout=None if secondary_started else delay)
+            except queue.Empty:
+                hedged = secondary_started = True
+                running += 1
+                launch(*secondary)
+                continue
+            running -= 1
+            if first is None:
+                errors.append(result["error"])
+                if not secondary_started:
+                    secondary_started = True
+                    running += 1
+                    launch(*secondary)
+                continue
+
+            with lock:
+                settled.set()
+                losers = [stream for other, stream in streams.items() if other != name]
+            for stream in losers:
+                stream["close"]()
+            with self._hedge_lock:
+                self.hedge_requests += 1
+                self.hedged += hedged
+                self.hedge_cancelled += running
+                self.hedge_wins[name] += 1
+            result["tokens"] = itertools.chain([first], result["tokens"])
+            result["hedge"] = {"hedged": hedged, "delay_ms": round(delay * 1000), "winner": name}
+            return result
+
+        with self._hedge_lock:
+            self.hedge_requests += 1
+            self.hedged += hedged
+        return {"error": "; ".join(errors)}
+
+    def hedge_stats(self) -> Dict[str, Any]:
+        with self._hedge_lock:
+            samples = {name: len(times) for name, times in self._first_token_times.items()}
+            stats = {
+                "enabled":     LLM_HEDGE_ENABLED,
+                "percentile":  LLM_HEDGE_PERCENTILE,
+                "requests":    self.hedge_requests,
+                "hedged":      self.hedged,
+                "hedge_rate":  round(self.hedged / self.hedge_requests, 4) if self.hedge_requests else 0.0,
+                "cancelled":   self.hedge_cancelled,
+                "wins":        dict(self.hedge_wins),
+                "samples":     samples,
+            }
+        stats["delay_ms"] = {name: round(self.hedge_delay(name) * 1000) for name in PROVIDERS}
+        return stats
+
+    # ── health ───────────────────────────────────────────────────────────────
+
+    def probe(self) -> Dict[str, Dict[str, Any]]:
+        """Check each configured provider now and update the cached health and breakers."""
+        checks = {
+            "ollama": lambda: self.ollama_session.get(f"{self.ollama_base_url}/api/tags",
+                                                      timeout=PROVIDER_PROBE_TIMEOUT).raise_for_status(),
+        }
+        if self.configured("groq"):
+            checks["groq"] = lambda: self.groq_client().models.list(timeout=PROVIDER_PROBE_TIMEOUT)
+
+        for name in PROVIDERS:
+            if name not in checks:
+                self.health[name] = {"healthy": False, "checked_at": time.time(), "error": self._groq_error}
+                continue
+            started = time.perf_counter()
+            try:
+                checks[name]()
+            except Exception as e:
+                self.record_failure(name, e)
+                self.health[name] = {"healthy": False, "checked_at": time.time(), "error": str(e)}
+            else:
+                self.record_success(name)
+                self.health[name] = {
+                    "healthy": True,
+                    "checked_at": time.time(),
+                    "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+                }
+        return self.health
+
+    def start_probing(self) -> None:
+        """Probe in a daemon thread every probe_interval seconds (no-op when 0 or already running)."""
+        if self.probe_interval <= 0 or (self._prober and self._prober.is_alive()):
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.is_set():
+                try:
+                    self.probe()
+                except Exception as e:
+                    print(f"[Providers] Health probe failed: {e}")
+                self._stop.wait(self.probe_interval)
+
+        self._prober = threading.Thread(target=loop, name="llm-provider-probe", daemon=True)
+        self._prober.start()
+
+    def stop_probing(self) -> None:
+        self._stop.set()
+
+    def available(self, name: str) -> bool:
+        """Cached view: configured, last probe not failed, breaker not open."""
+        if not self.configured(name) or self.breakers[name].state == "open":
+            return False
+        return self.health[name]["healthy"] is not False
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            name: {
+                "available": self.available(name),
+                "health":    dict(self.health[name]),
+                "breaker":   self.breakers[name].stats(),
+            }
+            for name in PROVIDERS
+        }
+
+
+_manager: Optional[ProviderManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_provider_manager() -> ProviderManager:
+    """The process-wide ProviderManager, created on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = ProviderManager()
+        return _manager
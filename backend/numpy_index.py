@@ -0,0 +1,398 @@
+import os
+import json
+import shutil
+import threading
+from typing import List, Dict, Any, Optional
+
+import numpy as np
+
+
+# On-disk layout of one collection:
+#   <root>/<name>/vectors.npy    float32 matrix (N x dim), rows L2-normalised
+#   <root>/<name>/vectors.K.npy  later segments: each flush writes its rows to
+#                                a new file instead of rewriting vectors.npy
+#   <root>/<name>/sidecar.json   ids, documents and metadatas in row order,
+#                                plus the segment files in order
+VECTORS_FILE = "vectors.npy"
+SIDECAR_FILE = "sidecar.json"
+INDEX_VERSION = 1
+
+# Segments are merged back into vectors.npy once there are more than this
+MAX_SEGMENTS = int(os.getenv("NUMPY_MAX_SEGMENTS", "8"))
+
+
+class NumpyCollection:
+    """
+    Exact in-process vector index — a drop-in for the subset of the Chroma
+    collection API that VectorStore uses (add / count / query / get).
+
+    Vectors live in memory-mapped float32 .npy segments; a query is one
+    matrix-vector product per segment plus argpartition, so there is no HNSW
+    build or SQLite round trip. Meant for repos up to ~100k chunks.
+    """
+
+    backend = "numpy"
+
+    def __init__(self, root_dir: str, name: str):
+        self.name = name
+        self.index_dir = os.path.join(root_dir, name)
+        self._lock = threading.Lock()
+
+        self._segments: List[np.ndarray] = []     # memory-mapped, in row order
+        self._segment_files: List[str] = []
+        self._ids: List[str] = []
+        self._documents: List[str] = []
+        self._metadatas: List[Dict[str, Any]] = []
+        self._row_of: Dict[str, int] = {}
+        self._columns: Dict[str, np.ndarray] = {}
+
+        # Rows added since the last flush (kept in RAM, searched from there)
+        self._pending_vectors: List[np.ndarray] = []
+
+        self._load()
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Lifecycle
+    # ──────────────────────────────────────────────────────────────────────────
+
+    @staticmethod
+    def exists(root_dir: str, name: str) -> bool:
+        return os.path.exists(os.path.join(root_dir, name, SIDECAR_FILE))
+
+    @staticmethod
+    def list_names(root_dir: str) -> List[str]:
+        if not os.path.isdir(root_dir):
+            return []
+        return sorted(
+            name for name in os.listdir(root_dir)
+            if NumpyCollection.exists(root_dir, name)
+        )
+
+    @staticmethod
+    def delete(root_dir: str, name: str) -> bool:
+        index_dir = os.path.join(root_dir, name)
+        if not os.path.isdir(index_dir):
+            return False
+        shutil.rmtree(index_dir, ignore_errors=True)
+        return True
+
+    def file_paths(self) -> Dict[str, str]:
+        """On-disk files of this index (compact() first for vectors.npy to hold every row)."""
+        return {
+            "vectors": os.path.join(self.index_dir, VECTORS_FILE),
+            "sidecar": os.path.join(self.index_dir, SIDECAR_FILE),
+        }
+
+    def _load(self) -> None:
+        sidecar_path = os.path.join(self.index_dir, SIDECAR_FILE)
+        if not os.path.exists(sidecar_path):
+            os.makedirs(self.index_dir, exist_ok=True)
+            return
+
+        with open(sidecar_path, encoding="utf-8") as f:
+            sidecar = json.load(f)
+
+        self._ids = sidecar.get("ids", [])
+        self._documents = sidecar.get("documents", [])
+        self._metadatas = sidecar.get("metadatas", [])
+        self._row_of = {doc_id: row for row, doc_id in enumerate(self._ids)}
+
+        # Sidecars written before segments existed have just vectors.npy.
+        # Segments past the row count are leftovers of an interrupted
+        # compaction whose rows vectors.npy already holds.
+        rows = 0
+        for name in sidecar.get("segments", [VECTORS_FILE]):
+            path = os.path.join(self.index_dir, name)
+            if rows >= len(self._ids) or not os.path.exists(path):
+                break
+            segment = np.load(path, mmap_mode="r")
+            self._segments.append(segment)
+            self._segment_files.append(name)
+            rows += len(segment)
+
+    def flush(self) -> None:
+        """Write pending rows to disk as a new memory-mapped segment."""
+        with self._lock:
+            self._flush_locked()
+
+    def compact(self) -> None:
+        """Flush, then merge every segment into vectors.npy (e.g. before copying the files)."""
+        with self._lock:
+            self._flush_locked()
+            if len(self._segment_files) > 1:
+                self._compact_locked()
+                self._write_sidecar_locked()
+
+    def _flush_locked(self) -> None:
+        if not self._pending_vectors:
+            return
+
+        matrix = np.ascontiguousarray(np.vstack(self._pending_vectors), dtype=np.float32)
+        name = self._new_segment_name_locked() if self._segment_files else VECTORS_FILE
+        path = os.path.join(self.index_dir, name)
+        np.save(path + ".tmp.npy", matrix)
+        os.replace(path + ".tmp.npy", path)
+
+        self._segments.append(np.load(path, mmap_mode="r"))
+        self._segment_files.append(name)
+        self._pending_vectors = []
+        if len(self._segment_files) > MAX_SEGMENTS:
+            self._compact_locked()
+        self._write_sidecar_locked()
+
+    def _new_segment_name_locked(self) -> str:
+        """
+        vectors.K.npy with K above every segment on disk, so a file that may
+        still be memory-mapped (e.g. one a deferred compaction left) is never
+        overwritten.
+        """
+        taken = [int(name.split(".")[1]) for name in os.listdir(self.index_dir)
+                 if name.startswith("vectors.") and name.endswith(".npy") and name.split(".")[1].isdigit()]
+        return f"vectors.{max(taken, default=0) + 1}.npy"
+
+    def _compact_locked(self) -> None:
+        """Merge the segments into vectors.npy. Left as they are if the merge can't be swapped in."""
+        vectors_path = os.path.join(self.index_dir, VECTORS_FILE)
+        np.save(vectors_path + ".tmp.npy", np.ascontiguousarray(np.vstack(self._segments), dtype=np.float32))
+
+        # Drop our maps first: Windows refuses to replace or delete a mapped file
+        old_files = self._segment_files
+        self._segments = []
+        try:
+            os.replace(vectors_path + ".tmp.npy", vectors_path)
+        except OSError as e:
+            # A reader still holds the old map — keep the segments, retry on a later flush
+            print(f"  [NUMPY] Compaction of '{self.name}' deferred: {str(e)}", flush=True)
+            os.remove(vectors_path + ".tmp.npy")
+            self._segments = [np.load(os.path.join(self.index_dir, f), mmap_mode="r") for f in old_files]
+            return
+
+        self._segments = [np.load(vectors_path, mmap_mode="r")]
+        self._segment_files = [VECTORS_FILE]
+        for name in old_files[1:]:
+            try:
+                os.remove(os.path.join(self.index_dir, name))
+            except OSError:
+                pass
+
+    def _write_sidecar_locked(self) -> None:
+        # Write to a temp file then rename, so readers never see a half-written index
+        sidecar_path = os.path.join(self.index_dir, SIDECAR_FILE)
+        with open(sidecar_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "version":   INDEX_VERSION,
+                "count":     len(self._ids),
+                "dimension": self._dimension_locked(),
+                "segments":  self._segment_files,
+                "ids":       self._ids,
+                "documents": self._documents,
+                "metadatas": self._metadatas,
+            }, f, ensure_ascii=False)
+        os.replace(sidecar_path + ".tmp", sidecar_path)
+
+    def _snapshot_locked(self) -> List[np.ndarray]:
+        """Segments covering every row added so far, unflushed rows included."""
+        if len(self._pending_vectors) > 1:
+            self._pending_vectors = [np.vstack(self._pending_vectors)]
+        return self._segments + self._pending_vectors
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Chroma-compatible API
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def add(self,
+            ids: List[str],
+            documents: List[str],
+            metadatas: List[Dict[str, Any]],
+            embeddings: List[List[float]]) -> None:
+        if not (len(ids) == len(documents) == len(metadatas) == len(embeddings)):
+            raise ValueError("ids, documents, metadatas and embeddings must have the same length")
+
+        batch = np.asarray(embeddings, dtype=np.float32)
+        if batch.ndim != 2:
+            raise ValueError("embeddings must be a 2-D list")
+        norms = np.linalg.norm(batch, axis=1, keepdims=True)
+        batch = batch / np.where(norms == 0, 1.0, norms)
+
+        with self._lock:
+            dim = self._dimension_locked()
+            if dim is not None and batch.shape[1] != dim:
+                raise ValueError(f"Embedding dimension {batch.shape[1]} does not match index dimension {dim}")
+            for doc_id in ids:
+                if doc_id in self._row_of:
+                    raise ValueError(f"Duplicate id: {doc_id}")
+
+            start = len(self._ids)
+            for offset, doc_id in enumerate(ids):
+                self._row_of[doc_id] = start + offset
+            self._ids.extend(ids)
+            self._documents.extend(documents)
+            self._metadatas.extend(dict(m or {}) for m in metadatas)
+            self._pending_vectors.append(batch)
+            self._columns.clear()
+
+    def count(self) -> int:
+        return len(self._ids)
+
+    def query(self,
+              query_embeddings: List[List[float]],
+              n_results: int = 10,
+              where: Optional[Dict[str, Any]] = None,
+              include: Optional[List[str]] = None) -> Dict[str, Any]:
+        include = include or ["documents", "metadatas", "distances"]
+        with self._lock:
+            segments = self._snapshot_locked()
+        n_rows = sum(len(segment) for segment in segments)
+
+        out = {key: [] for key in ["ids"] + list(include)}
+        if not n_rows:
+            for _ in query_embeddings:
+                for key in out:
+                    out[key].append([])
+            return out
+
+        candidates = self._filter_rows(where, n_rows)
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        norms = np.linalg.norm(queries, axis=1, keepdims=True)
+        queries = queries / np.where(norms == 0, 1.0, norms)
+
+        # One (filtered) matrix product for all queries: (n_queries x n_rows)
+        if candidates is None:
+            scores = np.hstack([queries @ segment.T for segment in segments])
+        else:
+            scores = queries @ self._take(segments, candidates).T
+
+        k = min(n_results, scores.shape[1])
+        for q_scores in scores:
+            if k <= 0:
+                top = np.empty(0, dtype=np.int64)
+            elif k < len(q_scores):
+                top = np.argpartition(-q_scores, k - 1)[:k]
+                top = top[np.argsort(-q_scores[top])]
+            else:
+                top = np.argsort(-q_scores)
+            rows = top if candidates is None else candidates[top]
+
+            out["ids"].append([self._ids[r] for r in rows])
+            if "documents" in out:
+                out["documents"].append([self._documents[r] for r in rows])
+            if "metadatas" in out:
+                out["metadatas"].append([self._metadatas[r] for r in rows])
+            if "distances" in out:
+                # Cosine distance, same convention as Chroma's "hnsw:space": "cosine"
+                out["distances"].append([float(1.0 - s) for s in q_scores[top]])
+            if "embeddings" in out:
+                out["embeddings"].append(self._take(segments, rows))
+        return out
+
+    def get(self,
+            ids: Optional[List[str]] = None,
+            where: Optional[Dict[str, Any]] = None,
+            include: Optional[List[str]] = None,
+            limit: Optional[int] = None,
+            offset: Optional[int] = None) -> Dict[str, Any]:
+        include = include or ["documents", "metadatas"]
+        with self._lock:
+            segments = self._snapshot_locked()
+        n_rows = sum(len(segment) for segment in segments)
+        if ids is not None:
+            rows = np.asarray([self._row_of[i] for i in ids if self._row_of.get(i, n_rows) < n_rows], dtype=np.int64)
+        else:
+            rows = np.arange(n_rows, dtype=np.int64)
+        if where:
+            rows = rows[np.isin(rows, self._filter_rows(where, n_rows))]
+        if offset or limit is not None:
+            start = offset or 0
+            rows = rows[start:None if limit is None else start + limit]
+
+        out: Dict[str, Any] = {"ids": [self._ids[r] for r in rows]}
+        if "documents" in include:
+            out["documents"] = [self._documents[r] for r in rows]
+        if "metadatas" in include:
+            out["metadatas"] = [self._metadatas[r] for r in rows]
+        if "embeddings" in include:
+            out["embeddings"] = self._take(segments, rows) if segments else np.empty((0, 0), dtype=np.float32)
+        return out
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Metadata filtering (Chroma `where` subset)
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def _column(self, key: str, n_rows: int) -> np.ndarray:
+        """Metadata values for one key as an array, cached until the next add."""
+        with self._lock:
+            column = self._columns.get(key)
+            if column is None or len(column) < n_rows:
+                column = np.empty(len(self._metadatas), dtype=object)
+                column[:] = [m.get(key) for m in self._metadatas]
+                self._columns[key] = column
+        return column[:n_rows]
+
+    def _filter_rows(self, where: Optional[Dict[str, Any]], n_rows: int) -> Optional[np.ndarray]:
+        """Row indices (< n_rows) matching `where`, or None for "all rows"."""
+        if not where:
+            return None
+        return np.flatnonzero(self._mask(where, n_rows))
+
+    def _mask(self, where: Dict[str, Any], n_rows: int) -> np.ndarray:
+        mask = np.ones(n_rows, dtype=bool)
+        for key, cond in where.items():
+            if key == "$and":
+                for sub in cond:
+                    mask &= self._mask(sub, n_rows)
+            elif key == "$or":
+                any_mask = np.zeros(n_rows, dtype=bool)
+                for sub in cond:
+                    any_mask |= self._mask(sub, n_rows)
+                mask &= any_mask
+            else:
+                mask &= self._match(self._column(key, n_rows), cond)
+        return mask
+
+    @staticmethod
+    def _match(column: np.ndarray, cond: Any) -> np.ndarray:
+        if not isinstance(cond, dict):
+            cond = {"$eq": cond}
+
+        mask = np.ones(len(column), dtype=bool)
+        for op, value in cond.items():
+            if op == "$eq":
+                mask &= column == value
+            elif op == "$ne":
+                mask &= column != value
+            elif op in ("$in", "$nin"):
+                # Equality per value — np.isin would sort mixed str/None objects
+                any_mask = np.zeros(len(column), dtype=bool)
+                for v in value:
+                    any_mask |= column == v
+                mask &= any_mask if op == "$in" else ~any_mask
+            else:
+                raise ValueError(f"Unsupported filter operator: {op}")
+        return mask
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Helpers
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def _dimension_locked(self) -> Optional[int]:
+        if self._segments:
+            return int(self._segments[0].shape[1])
+        if self._pending_vectors:
+            return int(self._pending_vectors[0].shape[1])
+        return None
+
+    @staticmethod
+    def _take(segments: List[np.ndarray], rows: np.ndarray) -> np.ndarray:
+        """The given rows (indices over all segments, any order) as one float32 matrix."""
+        rows = np.asarray(rows, dtype=np.int64)
+        out = np.empty((len(rows), segments[0].shape[1]), dtype=np.float32)
+        start = 0
+        for segment in segments:
+            end = start + len(segment)
+            selected = (rows >= start) & (rows < end)
+            if selected.any():
+                out[selected] = segment[rows[selected] - start]
+            start = end
+        return out
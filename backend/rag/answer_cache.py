@@ -0,0 +1,175 @@
+import os
+import time
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+
+# ── Semantic answer cache: reuse an LLM answer for a rephrased question ──────
+# A question whose embedding is within THRESHOLD cosine similarity of an
+# earlier question on the same repo (and with the same retrieval options)
+# gets the earlier answer instead of a new generation.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+ANSWER_CACHE_THRESHOLD = float(os.getenv("ANSWER_CACHE_THRESHOLD", 0.95))
+ANSWER_CACHE_TTL = float(os.getenv("ANSWER_CACHE_TTL", 3600))            # seconds; 0 = no expiry
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", 256))  # per repo and variant
+
+
+def _unit(vector: Sequence[float]) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32)
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector
+
+
+class _RepoAnswers:
+    """One repo's entries (LRU order) and the stacked unit vectors searched on lookup."""
+
+    def __init__(self):
+        self.entries: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self.matrix: Optional[np.ndarray] = None
+        self.row_ids: List[int] = []
+
+    def index(self) -> Tuple[Optional[np.ndarray], List[int]]:
+        if self.matrix is None and self.entries:
+            self.row_ids = list(self.entries)
+            self.matrix = np.stack([self.entries[i]["vector"] for i in self.row_ids])
+        return self.matrix, self.row_ids
+
+    def drop(self, entry_id: int) -> None:
+        del self.entries[entry_id]
+        self.matrix = None
+
+
+class SemanticAnswerCache:
+    """
+    Per-repo cache of chat answers, looked up by query-embedding similarity.
+
+    Each repo holds at most max_entries answers per variant, in LRU order;
+    entries older than ttl seconds are dropped when met. Answers carry the
+    sources they were generated from. A repo's entries are invalidated when it is
+    re-indexed, imported or deleted; as in ParentTextCache, a per-repo
+    generation number taken at lookup time stops an answer generated from
+    the old index from being stored after the invalidation.
+    """
+
+    def __init__(self,
+                 threshold: float = ANSWER_CACHE_THRESHOLD,
+                 ttl: float = ANSWER_CACHE_TTL,
+                 max_entries: int = ANSWER_CACHE_MAX_ENTRIES,
+                 enabled: bool = ANSWER_CACHE_ENABLED):
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self._repos: Dict[Tuple[str, str], _RepoAnswers] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0     # bumped by clear()
+        self._next_id = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def generation(self, repo_name: str) -> Tuple[int, int]:
+        """Token to pass to put() for an answer built from the repo's current index."""
+        with self._lock:
+            return self._epoch, self._generations.get(repo_name, 0)
+
+    def lookup(self, repo_name: str, query_vector: Sequence[float], variant: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Best cached entry for the repo and variant (the retrieval options)
+        with similarity >= threshold, as {"query", "payload", "similarity",
+        "age_s"}; None on a miss.
+        """
+        if not self.enabled:
+            return None
+        query = _unit(query_vector)
+        now = time.time()
+        with self._lock:
+            answers = self._repos.get((repo_name, variant))
+            if answers is not None and self.ttl > 0:
+                expired = [i for i, e in answers.entries.items() if now - e["created"] > self.ttl]
+                for entry_id in expired:
+                    answers.drop(entry_id)
+                self.expirations += len(expired)
+
+            matrix, row_ids = answers.index() if answers is not None else (None, [])
+            if matrix is None:
+                self.misses += 1
+                return None
+
+            similarities = matrix @ query
+            best = int(np.argmax(similarities))
+            if similarities[best] < self.threshold:
+                self.misses += 1
+                return None
+
+            entry_id = row_ids[best]
+            entry = answers.entries[entry_id]
+            answers.entries.move_to_end(entry_id)
+            self.hits += 1
+            return {
+                "query":      entry["query"],
+                "payload":    entry["payload"],
+                "similarity": round(float(similarities[best]), 4),
+                "age_s":      round(now - entry["created"], 1),
+            }
+
+    def put(self,
+            repo_name: str,
+            query_vector: Sequence[float],
+            query: str,
+            payload: Dict[str, Any],
+            generation: Tuple[int, int],
+            variant: str = "") -> None:
+        """Store an answer payload (answer, model, sources, ...) unless the repo was invalidated since `generation`."""
+        if not self.enabled or self.max_entries <= 0:
+            return
+        with self._lock:
+            if (self._epoch, self._generations.get(repo_name, 0)) != generation:
+                return
+            answers = self._repos.setdefault((repo_name, variant), _RepoAnswers())
+            self._next_id += 1
+            answers.entries[self._next_id] = {
+                "vector":  _unit(query_vector),
+                "query":   query,
+                "payload": payload,
+                "created": time.time(),
+            }
+            answers.matrix = None
+            while len(answers.entries) > self.max_entries:
+                answers.drop(next(iter(answers.entries)))
+                self.evictions += 1
+
+    def invalidate(self, repo_name: str) -> None:
+        """Drop every answer for the repo (all variants)."""
+        with self._lock:
+            self._generations[repo_name] = self._generations.get(repo_name, 0) + 1
+            for key in [k for k in self._repos if k[0] == repo_name]:
+                del self._repos[key]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._repos.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled":     self.enabled,
+                "entries":     sum(len(a.entries) for a in self._repos.values()),
+                "repos":       len({repo for repo, _ in self._repos}),
+                "threshold":   self.threshold,
+                "ttl_s":       self.ttl,
+                "max_entries": self.max_entries,
+                "hits":        self.hits,
+                "misses":      self.misses,
+                "hit_rate":    round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions":   self.evictions,
+                "expirations": self.expirations,
+            }
@@ -0,0 +1,216 @@
+import os
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+# ── Token-budgeted LLM context ────────────────────────────────────────────────
+# Instead of concatenating whole files and cutting the string at a fixed
+# length, each file contributes windows around its matched chunks, and the
+# token budget is shared between files by relevance.
+CHARS_PER_TOKEN = 4          # rough for code with English identifiers; no tokenizer needed
+MODEL_TOKEN_BUDGETS = {
+    "llama-3.1-8b-instant":    1500,
+    "llama-3.3-70b-versatile": 2500,
+    "tinyllama":               750,
+}
+DEFAULT_TOKEN_BUDGET = 1000  # ≈ the old 4000-character cut
+WINDOW_PADDING_CHARS = int(os.getenv("CONTEXT_WINDOW_PADDING", 300))
+MIN_WINDOW_TOKENS = 32       # a clipped window smaller than this is dropped
+MIN_RELEVANCE_WEIGHT = 0.05
+GAP_MARKER = "\n...\n"
+REGION_SNIPPET_CHARS = 1200  # longest snippet per region in code_regions()
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def token_budget_for(model_name: Optional[str]) -> int:
+    """CONTEXT_TOKEN_BUDGET if set, else the model's entry, else DEFAULT_TOKEN_BUDGET."""
+    override = os.getenv("CONTEXT_TOKEN_BUDGET")
+    if override:
+        return int(override)
+    return MODEL_TOKEN_BUDGETS.get(model_name or "", DEFAULT_TOKEN_BUDGET)
+
+
+def _line_start(text: str, pos: int) -> int:
+    return text.rfind("\n", 0, pos) + 1
+
+
+def _line_end(text: str, pos: int) -> int:
+    end = text.find("\n", pos)
+    return len(text) if end == -1 else end
+
+
+def _windows(text: str, spans: List[List[int]], padding: int) -> List[Dict[str, int]]:
+    """
+    Each matched span widened by `padding` to whole lines; overlapping or
+    touching windows are merged. Returns windows in file order, each with the
+    rank of its best match and that match as the focus for clipping.
+    """
+    if not spans:
+        spans = [[0, min(len(text), 2 * padding)]]
+
+    raw = []
+    for rank, (start, end) in enumerate(spans):
+        start, end = max(0, min(start, len(text))), max(0, min(end, len(text)))
+        raw.append({
+            "start": _line_start(text, max(0, start - padding)),
+            "end": _line_end(text, min(len(text), end + padding)),
+            "rank": rank,
+            "focus_start": start,
+            "focus_end": end,
+        })
+
+    merged: List[Dict[str, int]] = []
+    for window in sorted(raw, key=lambda w: w["start"]):
+        last = merged[-1] if merged else None
+        if last is not None and window["start"] <= last["end"] + 1:
+            last["end"] = max(last["end"], window["end"])
+            if window["rank"] < last["rank"]:
+                last.update(rank=window["rank"], focus_start=window["focus_start"], focus_end=window["focus_end"])
+        else:
+            merged.append(dict(window))
+    return merged
+
+
+def _clip(text: str, window: Dict[str, int], max_chars: int) -> Tuple[int, int]:
+    """Shrink a window to max_chars around its focus, trimmed inward to whole lines where possible."""
+    center = (window["focus_start"] + window["focus_end"]) // 2
+    start = max(window["start"], min(center - max_chars // 2, window["end"] - max_chars))
+    end = min(window["end"], start + max_chars)
+
+    if start > 0 and text[start - 1] != "\n":
+        next_line = text.find("\n", start, end)
+        if next_line != -1:
+            start = next_line + 1
+    if end < len(text) and text[end] != "\n":
+        last_line = text.rfind("\n", start, end)
+        if last_line > start:
+            end = last_line
+    return start, end
+
+
+def _allocate(needs: List[int], weights: List[float], budget: int) -> List[int]:
+    """
+    Split budget in proportion to weights. A file that needs less than its
+    share keeps only what it needs, and the rest is shared again among the others.
+    """
+    allocation = [0] * len(needs)
+    open_files = set(range(len(needs)))
+    remaining = budget
+    while open_files and remaining > 0:
+        total_weight = sum(weights[i] for i in open_files)
+        shares = {i: remaining * weights[i] / total_weight for i in open_files}
+        satisfied = [i for i in open_files if needs[i] <= shares[i]]
+        if not satisfied:
+            for i in open_files:
+                allocation[i] = int(shares[i])
+            break
+        for i in satisfied:
+            allocation[i] = needs[i]
+            remaining -= needs[i]
+            open_files.discard(i)
+    return allocation
+
+
+def assemble_context(results: List[Dict[str, Any]], token_budget: int,
+                     padding: int = WINDOW_PADDING_CHARS) -> Tuple[str, Dict[str, Any]]:
+    """
+    Build the LLM context from retrieval results (best first; each has
+    "chunk" = full file, "filename", "relevance" and "spans" = matched
+    [start, end] offsets, best first). Returns (context, report).
+    """
+    files = []
+    for result in results:
+        text = result.get("chunk") or ""
+        if not text.strip():
+            continue
+        header = f"[{result.get('filename', 'unknown')}]\n"
+        windows = _windows(text, result.get("spans") or [], padding)
+        need = estimate_tokens(header) + sum(
+            estimate_tokens(text[w["start"]:w["end"]]) + estimate_tokens(GAP_MARKER) for w in windows
+        )
+        files.append({
+            "text": text,
+            "header": header,
+            "windows": windows,
+            "need": need,
+            "weight": max(float(result.get("relevance") or 0.0), MIN_RELEVANCE_WEIGHT),
+        })
+
+    allocation = _allocate([f["need"] for f in files], [f["weight"] for f in files], token_budget)
+
+    blocks = []
+    used_windows = 0
+    for file, tokens in zip(files, allocation):
+        text = file["text"]
+        left = tokens - estimate_tokens(file["header"])
+        picked = []
+        for window in sorted(file["windows"], key=lambda w: w["rank"]):
+            cost = estimate_tokens(text[window["start"]:window["end"]]) + estimate_tokens(GAP_MARKER)
+            if cost <= left:
+                picked.append((window["start"], window["end"]))
+                left -= cost
+            elif left - estimate_tokens(GAP_MARKER) >= MIN_WINDOW_TOKENS:
+                max_chars = (left - estimate_tokens(GAP_MARKER)) * CHARS_PER_TOKEN
+                picked.append(_clip(text, window, max_chars))
+                left = 0
+            if left < MIN_WINDOW_TOKENS:
+                break
+        if not picked:
+            continue
+
+        picked.sort()
+        body = GAP_MARKER.join(text[start:end].strip("\n") for start, end in picked)
+        if picked[0][0] > 0:
+            body = "...\n" + body
+        blocks.append(file["header"] + body)
+        used_windows += len(picked)
+
+    context = "\n\n".join(blocks)
+    report = {
+        "token_budget": token_budget,
+        "tokens_used": estimate_tokens(context),
+        "source_tokens": sum(estimate_tokens(f["text"]) for f in files),
+        "files": len(blocks),
+        "windows": used_windows,
+    }
+    return context, report
+
+
+def code_regions(results: List[Dict[str, Any]], regions_per_file: int = 1,
+                 max_chars: int = REGION_SNIPPET_CHARS, first_rank: int = 1) -> Iterator[Dict[str, Any]]:
+    """
+    Ranked code regions for tools that want locations, not an LLM context:
+    each file's best `regions_per_file` matched spans, best file first, as
+    {"rank", "filepath", "filename", "line_start", "line_end", "score",
+    "match", "snippet"} (+ "rerank_score" when re-ranked; lines 1-based,
+    inclusive). Files without stored
+    spans yield their first lines. Ranks start at `first_rank`, for callers
+    that pass the files in one at a time.
+    """
+    rank = first_rank - 1
+    for result in results:
+        text = result.get("chunk") or ""
+        spans = result.get("spans") or [[0, min(len(text), max_chars)]]
+        for start, end in spans[:regions_per_file]:
+            start, end = _line_start(text, max(0, min(start, len(text)))), max(0, min(end, len(text)))
+            snippet = text[start:end]
+            if len(snippet) > max_chars:
+                cut = snippet.rfind("\n", 0, max_chars)
+                snippet = snippet[:cut if cut > 0 else max_chars]
+            rank += 1
+            line_start = text.count("\n", 0, start) + 1
+            region = {
+                "rank":       rank,
+                "filepath":   result.get("source", "unknown"),
+                "filename":   result.get("filename", "unknown"),
+                "line_start": line_start,
+                "line_end":   line_start + snippet.rstrip("\n").count("\n"),
+                "score":      result.get("relevance"),
+                "match":      result.get("match"),
+                "snippet":    snippet.rstrip("\n"),
+            }
+            if "rerank_score" in result:
+                region["rerank_score"] = result["rerank_score"]
+            yield region
@@ -1,13 +1,12 @@
-import os
-import requests
 from typing import Optional
 
+from llm_providers import ProviderManager, get_provider_manager
+
+
 class HyDE:
-    def __init__(self):
-        self.groq_api_key = os.getenv('GROQ_API_KEY')
-        self.groq_model = os.getenv('GROQ_MODEL', 'llama-3.1-8b-instant')
-        self.ollama_base_url = os.getenv('OLLAMA_BASE_URL', 'http://localhost:11434')
-        self.ollama_model = os.getenv('OLLAMA_MODEL', 'tinyllama')
+    def __init__(self, providers: Optional[ProviderManager] = None):
+        # Shared clients and breakers: a down provider is skipped, not waited on
+        self.providers = providers or get_provider_manager()
 
     def generate_hypothetical_answer(self, query: str) -> str:
         """
@@ -18,13 +17,10 @@ class HyDE:
         prompt = f"Please write a short, hypothetical code snippet or explanation that answers the following question. The answer doesn't need to be perfectly accurate, but should contain relevant technical keywords.\nQuestion: {query}\nHypothetical Answer:"
         
         # Try Groq
-        if self.groq_api_key:
+        if self.providers.configured("groq"):
             try:
-                from groq import Groq
-                client = Groq(api_key=self.groq_api_key)
-                response = client.chat.completions.create(
-                    model=self.groq_model,
-                    messages=[
+                response = self.providers.groq_chat(
+                    [
                         {"role": "system", "content": "You are a coding assistant. Generate short hypothetical technical answers with relevant keywords to improve search retrieval."},
                         {"role": "user", "content": prompt}
                     ],
@@ -39,11 +35,7 @@ class HyDE:
 
         # Try Ollama (fallback)
         try:
-            response = requests.post(
-                f'{self.ollama_base_url}/api/generate',
-                json={"model": self.ollama_model, "prompt": prompt, "stream": False},
-                timeout=10
-            )
+            response = self.providers.ollama_generate(prompt, timeout=10)
             if response.status_code == 200:
                 answer = response.json().get('response', '').strip()
                 if answer:
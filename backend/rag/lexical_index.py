@@ -0,0 +1,209 @@
+import os
+import re
+import json
+import math
+from collections import Counter
+from typing import List, Dict, Tuple, Any, Optional
+
+import numpy as np
+
+from rag.metadata_filter import matches
+
+
+# ── Identifier-aware tokenizer ────────────────────────────────────────────────
+# Dense vectors blur exact names like `get_groq_response` or `MAX_UPLOAD_SIZE`.
+# We index the whole identifier AND its pieces, so both the exact name and
+# "groq response" style questions hit the same chunk.
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*")
+_CAMEL_RE = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+MIN_TOKEN_LENGTH = 2
+
+# BM25 parameters (standard defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+INDEX_VERSION = 1
+
+# Metadata kept per child: enough to map to a parent and to apply filters
+SEARCH_METADATA_KEYS = ("parent_id", "filename", "filepath", "extension", "language", "top_dir")
+
+
+def tokenize_code(text: str) -> List[str]:
+    """
+    Split text into lowercase search tokens.
+      vector_store.query   -> vector_store.query, vector_store, query, vector, store
+      ParentChildRetriever -> parentchildretriever, parent, child, retriever
+      MAX_UPLOAD_SIZE      -> max_upload_size, max, upload, size
+    """
+    tokens: List[str] = []
+    for match in _IDENT_RE.finditer(text or ""):
+        ident = match.group(0)
+        _add_token(tokens, ident)
+
+        segments = ident.split(".")
+        for segment in segments:
+            if len(segments) > 1:
+                _add_token(tokens, segment)
+            words = [w for w in segment.split("_") if w]
+            for word in words:
+                if len(words) > 1:
+                    _add_token(tokens, word)
+                parts = _CAMEL_RE.findall(word)
+                if len(parts) > 1:
+                    for part in parts:
+                        _add_token(tokens, part)
+    return tokens
+
+
+def _add_token(tokens: List[str], token: str) -> None:
+    if len(token) >= MIN_TOKEN_LENGTH:
+        tokens.append(token.lower())
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over child chunks of one repository.
+
+    Posting lists are stored CSR-style in flat numpy arrays:
+      offsets[t] : offsets[t+1]  -> slice of doc_rows / term_freqs for term t
+    so the whole index is a handful of arrays plus the vocabulary.
+    """
+
+    def __init__(self,
+                 vocabulary: Dict[str, int],
+                 offsets: np.ndarray,
+                 doc_rows: np.ndarray,
+                 term_freqs: np.ndarray,
+                 doc_lengths: np.ndarray,
+                 doc_ids: List[str],
+                 metadatas: List[Dict[str, Any]]):
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.doc_rows = doc_rows
+        self.term_freqs = term_freqs
+        self.doc_lengths = doc_lengths
+        self.doc_ids = doc_ids
+        self.metadatas = metadatas
+
+        self.num_docs = len(doc_ids)
+        self.avg_doc_length = float(doc_lengths.mean()) if self.num_docs else 0.0
+        # Precomputed BM25 length normalisation per doc: k1 * (1 - b + b * dl / avgdl)
+        self._length_norm = (
+            BM25_K1 * (1 - BM25_B + BM25_B * doc_lengths / max(self.avg_doc_length, 1e-9))
+        ).astype(np.float32)
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Build / persist
+    # ──────────────────────────────────────────────────────────────────────────
+
+    @classmethod
+    def build(cls,
+              doc_ids: List[str],
+              texts: List[str],
+              metadatas: List[Dict[str, Any]]) -> "LexicalIndex":
+        vocabulary: Dict[str, int] = {}
+        term_ids: List[int] = []
+        rows: List[int] = []
+        freqs: List[int] = []
+        doc_lengths = np.zeros(len(texts), dtype=np.uint32)
+
+        for row, text in enumerate(texts):
+            counts = Counter(tokenize_code(text))
+            doc_lengths[row] = sum(counts.values())
+            for term, tf in counts.items():
+                term_id = vocabulary.setdefault(term, len(vocabulary))
+                term_ids.append(term_id)
+                rows.append(row)
+                freqs.append(tf)
+
+        # Group postings by term (stable sort keeps rows ascending per term)
+        term_arr = np.asarray(term_ids, dtype=np.uint32)
+        order = np.argsort(term_arr, kind="stable")
+        doc_rows = np.asarray(rows, dtype=np.uint32)[order]
+        term_freqs = np.minimum(np.asarray(freqs, dtype=np.uint32), np.iinfo(np.uint16).max).astype(np.uint16)[order]
+        offsets = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(term_arr, minlength=len(vocabulary)), out=offsets[1:])
+
+        slim_metadatas = [
+            {k: m.get(k) for k in SEARCH_METADATA_KEYS if k in m}
+            for m in metadatas
+        ]
+        return cls(vocabulary, offsets, doc_rows, term_freqs, doc_lengths, list(doc_ids), slim_metadatas)
+
+    def save(self, path_prefix: str) -> None:
+        """Writes <prefix>.npz (posting arrays) and <prefix>.json (vocab, ids)."""
+        os.makedirs(os.path.dirname(path_prefix), exist_ok=True)
+        np.savez(
+            path_prefix + ".tmp.npz",
+            offsets=self.offsets,
+            doc_rows=self.doc_rows,
+            term_freqs=self.term_freqs,
+            doc_lengths=self.doc_lengths,
+        )
+        with open(path_prefix + ".json.tmp", "w", encoding="utf-8") as f:
+            json.dump({
+                "version":    INDEX_VERSION,
+                "vocabulary": self.vocabulary,
+                "doc_ids":    self.doc_ids,
+                "metadatas":  self.metadatas,
+            }, f, ensure_ascii=False)
+        os.replace(path_prefix + ".tmp.npz", path_prefix + ".npz")
+        os.replace(path_prefix + ".json.tmp", path_prefix + ".json")
+
+    @classmethod
+    def load(cls, path_prefix: str) -> Optional["LexicalIndex"]:
+        if not (os.path.exists(path_prefix + ".npz") and os.path.exists(path_prefix + ".json")):
+            return None
+        with open(path_prefix + ".json", encoding="utf-8") as f:
+            sidecar = json.load(f)
+        with np.load(path_prefix + ".npz") as arrays:
+            return cls(
+                sidecar["vocabulary"],
+                arrays["offsets"],
+                arrays["doc_rows"],
+                arrays["term_freqs"],
+                arrays["doc_lengths"],
+                sidecar["doc_ids"],
+                sidecar["metadatas"],
+            )
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Search
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def search(self,
+               query: str,
+               n_results: int = 10,
+               where: Optional[Dict[str, Any]] = None) -> List[Tuple[str, Dict[str, Any], float]]:
+        """Top BM25 matches as (doc_id, metadata, score), best first, restricted to `where`."""
+        if not self.num_docs:
+            return []
+
+        term_ids = {self.vocabulary[t] for t in tokenize_code(query) if t in self.vocabulary}
+        if not term_ids:
+            return []
+
+        scores = np.zeros(self.num_docs, dtype=np.float32)
+        for term_id in term_ids:
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            rows = self.doc_rows[start:end]
+            tf = self.term_freqs[start:end].astype(np.float32)
+            df = end - start
+            idf = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+            scores[rows] += idf * tf * (BM25_K1 + 1) / (tf + self._length_norm[rows])
+
+        hits = np.flatnonzero(scores)
+        if where:
+            # Index-side filter: walk hits best-first, stop after n_results matches
+            ranked = hits[np.argsort(-scores[hits])]
+            kept = []
+            for r in ranked:
+                if matches(self.metadatas[r], where):
+                    kept.append(r)
+                    if len(kept) == n_results:
+                        break
+            hits = np.asarray(kept, dtype=np.int64)
+        if len(hits) > n_results:
+            hits = hits[np.argpartition(-scores[hits], n_results - 1)[:n_results]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(self.doc_ids[r], self.metadatas[r], float(scores[r])) for r in hits]
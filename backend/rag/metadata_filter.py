@@ -0,0 +1,162 @@
+import fnmatch
+from typing import List, Dict, Any, Optional, Callable, Iterable
+
+
+# ── Search filters → Chroma `where` clauses ───────────────────────────────────
+# Request shape (all optional):
+#   {"path": "frontend/**", "extensions": [".jsx", "tsx"], "languages": ["python"]}
+# `extension`, `language` and `top_dir` are stored on every child chunk at
+# ingest, so these become indexed equality/$in lookups instead of a full scan.
+
+_WILDCARDS = set("*?[")
+
+
+def normalize_filters(raw: Any) -> Dict[str, Any]:
+    """
+    Validate request filters. Accepts strings or lists for extensions/languages.
+    Raises ValueError on malformed input.
+    """
+    if not raw:
+        return {}
+    if not isinstance(raw, dict):
+        raise ValueError("filters must be an object")
+
+    filters: Dict[str, Any] = {}
+
+    path = raw.get("path")
+    if path:
+        if not isinstance(path, str):
+            raise ValueError("filters.path must be a string glob")
+        path = path.strip().replace("\\", "/")
+        if path.startswith("./"):
+            path = path[2:]
+        if path and path != ".":
+            filters["path"] = path
+
+    extensions = _as_list(raw.get("extensions", raw.get("extension")), "extensions")
+    if extensions:
+        filters["extensions"] = sorted({e.lower() if e.startswith(".") else "." + e.lower() for e in extensions})
+
+    languages = _as_list(raw.get("languages", raw.get("language")), "languages")
+    if languages:
+        filters["languages"] = sorted({lang.lower() for lang in languages})
+
+    return filters
+
+
+def _as_list(value: Any, name: str) -> List[str]:
+    if value is None or value == "":
+        return []
+    if isinstance(value, str):
+        value = [value]
+    if not isinstance(value, list) or not all(isinstance(v, str) and v.strip() for v in value):
+        raise ValueError(f"filters.{name} must be a string or a list of strings")
+    return [v.strip() for v in value]
+
+
+def build_where(filters: Dict[str, Any],
+                known_paths: Optional[Callable[[], Iterable[str]]] = None) -> Optional[Dict[str, Any]]:
+    """
+    Translate normalized filters into a Chroma `where` clause (None = no filter).
+
+    A path glob naming just a top-level directory ("frontend", "frontend/**")
+    maps to the indexed `top_dir` field. Any other glob is resolved against
+    the repo's file list (known_paths) into `filepath $in [...]`; a glob that
+    matches nothing yields {"filepath": {"$in": []}}.
+    """
+    clauses: List[Dict[str, Any]] = []
+
+    path = filters.get("path")
+    if path:
+        top_dir = _top_dir_only(path)
+        if top_dir is not None:
+            clauses.append({"top_dir": top_dir})
+        else:
+            paths = sorted({p for p in (known_paths() if known_paths else []) if path_matches(p, path)})
+            clauses.append({"filepath": {"$in": paths}})
+
+    if filters.get("extensions"):
+        clauses.append(_in_clause("extension", filters["extensions"]))
+    if filters.get("languages"):
+        clauses.append(_in_clause("language", filters["languages"]))
+
+    if not clauses:
+        return None
+    return clauses[0] if len(clauses) == 1 else {"$and": clauses}
+
+
+def is_empty_where(where: Optional[Dict[str, Any]]) -> bool:
+    """True when the filter can match nothing (glob resolved to no files)."""
+    if not where:
+        return False
+    if "$and" in where:
+        return any(is_empty_where(c) for c in where["$and"])
+    cond = where.get("filepath")
+    return isinstance(cond, dict) and cond.get("$in") == []
+
+
+def _in_clause(key: str, values: List[str]) -> Dict[str, Any]:
+    return {key: values[0]} if len(values) == 1 else {key: {"$in": values}}
+
+
+def _top_dir_only(glob: str) -> Optional[str]:
+    """'frontend', 'frontend/', 'frontend/*', 'frontend/**' -> 'frontend'; else None."""
+    stripped = glob.rstrip("/")
+    explicit_dir = stripped != glob
+    for suffix in ("/**", "/*"):
+        if stripped.endswith(suffix):
+            stripped = stripped[:-len(suffix)]
+            explicit_dir = True
+            break
+    if not stripped or "/" in stripped or _WILDCARDS & set(stripped):
+        return None
+    # A bare "app.py" is more likely a file than a directory
+    if "." in stripped and not explicit_dir:
+        return None
+    return stripped
+
+
+def path_matches(filepath: str, glob: str) -> bool:
+    """
+    Glob match on a repo-relative path. `*` also crosses '/', and a glob
+    without wildcards matches that file or directory prefix. Paths are also
+    tried without their first folder (ZIP wrapper like "repo-main/").
+    """
+    filepath = filepath.replace("\\", "/")
+    candidates = [filepath]
+    if "/" in filepath:
+        candidates.append(filepath.split("/", 1)[1])
+
+    if not (_WILDCARDS & set(glob)):
+        prefix = glob.rstrip("/")
+        return any(c == prefix or c.startswith(prefix + "/") for c in candidates)
+
+    pattern = glob.replace("**/", "*").replace("**", "*")
+    return any(fnmatch.fnmatchcase(c, pattern) for c in candidates)
+
+
+def matches(metadata: Dict[str, Any], where: Optional[Dict[str, Any]]) -> bool:
+    """Evaluate a `where` clause (the subset build_where emits) on one metadata dict."""
+    if not where:
+        return True
+    for key, cond in where.items():
+        if key == "$and":
+            if not all(matches(metadata, sub) for sub in cond):
+                return False
+        elif key == "$or":
+            if not any(matches(metadata, sub) for sub in cond):
+                return False
+        elif isinstance(cond, dict):
+            value = metadata.get(key)
+            for op, expected in cond.items():
+                if op == "$eq" and value != expected:
+                    return False
+                if op == "$ne" and value == expected:
+                    return False
+                if op == "$in" and value not in expected:
+                    return False
+                if op == "$nin" and value in expected:
+                    return False
+        elif metadata.get(key) != cond:
+            return False
+    return True
@@ -0,0 +1,48 @@
+import os
+from typing import List, Sequence
+
+import numpy as np
+
+
+# ── Maximal marginal relevance: trade relevance for diversity ─────────────────
+# score = λ · sim(query, doc) − (1 − λ) · max sim(doc, already selected)
+# λ = 1 is plain relevance order; lower λ favours files unlike those picked.
+# The candidate pool is POOL_FACTOR × k, so there is something to choose from.
+MMR_ENABLED = os.getenv("MMR_ENABLED", "false").lower() in ("1", "true", "yes")
+MMR_LAMBDA = float(os.getenv("MMR_LAMBDA", 0.7))
+MMR_POOL_FACTOR = int(os.getenv("MMR_POOL_FACTOR", 3))
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1.0, norms)
+
+
+def mmr_select(query_vector: Sequence[float],
+               candidate_vectors: Sequence[Sequence[float]],
+               k: int,
+               lambda_mult: float = MMR_LAMBDA) -> List[int]:
+    """Indices of k candidates in MMR order (cosine similarity throughout)."""
+    candidates = _unit_rows(np.asarray(candidate_vectors, dtype=np.float32))
+    query = _unit_rows(np.asarray(query_vector, dtype=np.float32))
+    n = len(candidates)
+    if n == 0 or k <= 0:
+        return []
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+    redundancy = np.full(n, -np.inf, dtype=np.float32)
+    available = np.ones(n, dtype=bool)
+
+    selected: List[int] = []
+    for _ in range(min(k, n)):
+        if selected:
+            scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, similarity[best])
+    return selected
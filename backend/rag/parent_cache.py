@@ -0,0 +1,110 @@
+import os
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+
+# Byte budget for cached parent texts, shared by all repos. 0 disables caching.
+PARENT_CACHE_MB = float(os.getenv("PARENT_CACHE_MB", 64))
+
+
+class ParentTextCache:
+    """
+    Byte-bounded LRU of parent texts, keyed by (repo_name, parent_id).
+
+    One instance is shared by every request thread. A repo's entries are
+    invalidated whenever its parents are rewritten (re-index, snapshot import,
+    GC, delete); a per-repo generation number stops a read that started before
+    the invalidation from putting the old text back afterwards.
+    """
+
+    def __init__(self, max_bytes: int = int(PARENT_CACHE_MB * 1024 * 1024)):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[Tuple[str, str], str]" = OrderedDict()
+        self._sizes: Dict[Tuple[str, str], int] = {}
+        self._generations: Dict[str, int] = {}
+        self._epoch = 0     # bumped by clear()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.bytes_served = 0   # from cache
+        self.bytes_loaded = 0   # from the parent store, on misses
+
+    def get_or_load(self, repo_name: str, parent_id: str, loader: Callable[[], Optional[str]]) -> Optional[str]:
+        """Cached text, else loader() (cached unless None or over budget)."""
+        key = (repo_name, parent_id)
+        with self._lock:
+            text = self._entries.get(key)
+            if text is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.bytes_served += self._sizes[key]
+                return text
+            self.misses += 1
+            generation = (self._epoch, self._generations.get(repo_name, 0))
+
+        text = loader()
+        if text is None:
+            return None
+
+        size = len(text.encode("utf-8"))
+        with self._lock:
+            self.bytes_loaded += size
+            if size > self.max_bytes or (self._epoch, self._generations.get(repo_name, 0)) != generation:
+                return text
+            if key in self._entries:
+                self._bytes -= self._sizes[key]
+            self._entries[key] = text
+            self._entries.move_to_end(key)
+            self._sizes[key] = size
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                old_key, _ = self._entries.popitem(last=False)
+                self._bytes -= self._sizes.pop(old_key)
+                self.evictions += 1
+        return text
+
+    def invalidate(self, repo_name: str, parent_id: Optional[str] = None) -> None:
+        """Drop one parent, or every parent of the repo."""
+        with self._lock:
+            self._generations[repo_name] = self._generations.get(repo_name, 0) + 1
+            keys = [(repo_name, parent_id)] if parent_id is not None else [k for k in self._entries if k[0] == repo_name]
+            for key in keys:
+                if key in self._entries:
+                    del self._entries[key]
+                    self._bytes -= self._sizes.pop(key)
+
+    def invalidate_many(self, repo_name: str, parent_ids: Iterable[str]) -> None:
+        """Drop several parents of a repo at once (one generation bump)."""
+        with self._lock:
+            self._generations[repo_name] = self._generations.get(repo_name, 0) + 1
+            for parent_id in parent_ids:
+                key = (repo_name, parent_id)
+                if key in self._entries:
+                    del self._entries[key]
+                    self._bytes -= self._sizes.pop(key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._sizes.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries":      len(self._entries),
+                "bytes":        self._bytes,
+                "max_bytes":    self.max_bytes,
+                "hits":         self.hits,
+                "misses":       self.misses,
+                "hit_rate":     round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions":    self.evictions,
+                "bytes_served": self.bytes_served,
+                "bytes_loaded": self.bytes_loaded,
+            }
@@ -138,16 +138,49 @@
 #             return {"error": f"Parent retrieval failed: {str(e)}", "results": []}
 import os
 import json
+import uuid
+import shutil
+import threading
 import traceback
-from typing import List, Dict, Tuple, Any
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import List, Dict, Tuple, Any, Optional, Iterator
 
-from utils import read_file_safely
+from utils import read_file_safely, detect_language
+from rag.parent_store import ParentStore
+from rag.parent_cache import ParentTextCache
+from rag.reranker import CrossEncoderReranker, RERANK_ENABLED
+from rag.mmr import mmr_select, MMR_ENABLED, MMR_LAMBDA, MMR_POOL_FACTOR
+from rag.lexical_index import LexicalIndex
+from rag.symbol_index import SymbolIndex
+from vector_store import staging_name
 
 
 # ── FIX 2 & 3: File-type aware minimum content length ─────────────────────────
 # Agar file mein itna bhi content nahi hai toh embed karne layak nahi
 MIN_CONTENT_LENGTH = 50  # characters
 
+# ── Hybrid retrieval: BM25 over child chunks fused with vector ranks (RRF) ────
+# Exact identifiers (`get_groq_response`) are found lexically even when the
+# dense vector misses them. RRF_K dampens the weight of lower ranks.
+HYBRID_RETRIEVAL = os.getenv('HYBRID_RETRIEVAL', 'true').lower() in ('1', 'true', 'yes')
+RRF_K = int(os.getenv('RRF_K', 60))
+
+# ── Adaptive over-fetch: keep widening the child search until k parents ──────
+# Several hits in one big file collapse to one parent. Instead of always
+# fetching the worst case, start at k * INITIAL_FACTOR children and grow the
+# page by GROWTH until k distinct parents, the score floor (cosine relevance
+# of the last vector hit), the collection end or MAX_CHILDREN is reached.
+ADAPTIVE_RETRIEVAL = os.getenv('ADAPTIVE_RETRIEVAL', 'true').lower() in ('1', 'true', 'yes')
+ADAPTIVE_INITIAL_FACTOR = int(os.getenv('ADAPTIVE_INITIAL_FACTOR', 2))
+ADAPTIVE_GROWTH = int(os.getenv('ADAPTIVE_GROWTH', 2))
+ADAPTIVE_MAX_CHILDREN = int(os.getenv('ADAPTIVE_MAX_CHILDREN', 200))
+ADAPTIVE_SCORE_FLOOR = float(os.getenv('ADAPTIVE_SCORE_FLOOR', 0.25))
+
+# A rebuild writes parents to parent_docs/.staging/<token>/<repo>/ and swaps
+# them in only after the new collection is written
+PARENT_STAGING_DIR = ".staging"
+
 
 class ParentChildRetriever:
     def __init__(self, vector_store):
@@ -166,10 +199,262 @@ class ParentChildRetriever:
         )
         os.makedirs(self.parent_store_dir, exist_ok=True)
 
-    def _get_parent_path(self, repo_name: str, file_id: str) -> str:
-        repo_dir = os.path.join(self.parent_store_dir, repo_name)
-        os.makedirs(repo_dir, exist_ok=True)
-        return os.path.join(repo_dir, f"{file_id}.txt")
+        self.parent_staging_dir = os.path.join(self.parent_store_dir, PARENT_STAGING_DIR)
+
+        # One parent store per repo, bounded like the vector store's handle
+        # cache and dropped together with the repo's collection handle. Users
+        # hold it through open_parent_store(); a store is only closed once its
+        # last user is done.
+        self._parent_stores: "OrderedDict[str, ParentStore]" = OrderedDict()
+        self._store_users: Dict[ParentStore, int] = {}
+        self._close_when_idle: set = set()                   # evicted repos still in use
+        self._retired: Dict[ParentStore, Optional[str]] = {}  # replaced stores -> dir to remove once unused
+        self._staged: Dict[str, Tuple[ParentStore, SymbolIndex]] = {}
+        self._lexical_indexes: Dict[str, LexicalIndex] = {}
+        self._symbol_indexes: Dict[str, SymbolIndex] = {}
+        self._stores_lock = threading.Lock()
+        self.vector_store.add_evict_listener(self._drop_parent_store)
+
+        # Hot parent texts, shared by all repos and request threads
+        self.parent_cache = ParentTextCache()
+
+        # Optional cross-encoder stage between the child search and parent assembly
+        self.reranker = CrossEncoderReranker()
+
+        # Persisted BM25 index per repo: lexical_index/<repo>.npz + .json
+        self.lexical_index_dir = os.path.join(
+            os.path.dirname(os.path.dirname(__file__)), "lexical_index"
+        )
+
+        # Persisted symbol definitions per repo: symbol_index/<repo>.json
+        self.symbol_index_dir = os.path.join(
+            os.path.dirname(os.path.dirname(__file__)), "symbol_index"
+        )
+
+    @contextmanager
+    def open_parent_store(self, repo_name: str):
+        """The repo's parent store, kept open for the duration of the block."""
+        store = self._acquire_parent_store(repo_name)
+        try:
+            yield store
+        finally:
+            self._release_parent_store(store)
+
+    def lexical_index_prefix(self, repo_name: str) -> str:
+        """Path prefix of the repo's persisted BM25 index (<prefix>.npz / .json)."""
+        return os.path.join(self.lexical_index_dir, repo_name)
+
+    @staticmethod
+    def staged_lexical_prefix(staged: ParentStore) -> str:
+        """Where a rebuild writes its BM25 index, beside its staged parents."""
+        return os.path.join(os.path.dirname(staged.repo_dir), "lexical")
+
+    def symbol_index_path(self, repo_name: str) -> str:
+        """Path of the repo's persisted symbol table."""
+        return os.path.join(self.symbol_index_dir, f"{repo_name}.json")
+
+    def repository_paths(self, repo_name: str) -> List[str]:
+        """Files / dirs holding this repo's parents, BM25 index and symbol table (may not exist)."""
+        prefix = self.lexical_index_prefix(repo_name)
+        return [os.path.join(self.parent_store_dir, repo_name), prefix + ".npz", prefix + ".json",
+                self.symbol_index_path(repo_name)]
+
+    def delete_repository(self, repo_name: str) -> None:
+        """Drop cached state and delete the repo's parents, BM25 index and symbol table."""
+        self.discard_staged(repo_name)
+        with self._stores_lock:
+            idle = self._retire_locked(repo_name, None)
+            self._lexical_indexes.pop(repo_name, None)
+            self._symbol_indexes.pop(repo_name, None)
+        if idle is not None:
+            idle.close()
+        self.parent_cache.invalidate(repo_name)
+        for path in self.repository_paths(repo_name):
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            elif os.path.exists(path):
+                os.remove(path)
+
+    def _acquire_parent_store(self, repo_name: str) -> ParentStore:
+        with self._stores_lock:
+            store = self._parent_stores.get(repo_name)
+            if store is None:
+                store = ParentStore(self.parent_store_dir, repo_name, cache=self.parent_cache)
+                self._parent_stores[repo_name] = store
+            self._parent_stores.move_to_end(repo_name)
+            self._close_when_idle.discard(repo_name)
+            self._store_users[store] = self._store_users.get(store, 0) + 1
+
+            over = len(self._parent_stores) - self.vector_store.max_open_collections
+            idle = [self._evict_locked(name) for name in list(self._parent_stores)[:max(over, 0)]]
+
+        for old in idle:
+            if old is not None:
+                old.close()
+        return store
+
+    def _release_parent_store(self, store: ParentStore) -> None:
+        with self._stores_lock:
+            users = self._store_users[store] - 1
+            if users:
+                self._store_users[store] = users
+                return
+            del self._store_users[store]
+            if store in self._retired:
+                remove_dir = self._retired.pop(store)
+            elif store.repo_name in self._close_when_idle and self._parent_stores.get(store.repo_name) is store:
+                self._close_when_idle.discard(store.repo_name)
+                del self._parent_stores[store.repo_name]
+                remove_dir = None
+            else:
+                return
+        store.close()
+        if remove_dir:
+            shutil.rmtree(remove_dir, ignore_errors=True)
+
+    def _evict_locked(self, repo_name: str) -> Optional[ParentStore]:
+        """Unregister the repo's store if unused (returned, to close) or mark it to close when idle."""
+        store = self._parent_stores.get(repo_name)
+        if store is None:
+            return None
+        if self._store_users.get(store):
+            self._close_when_idle.add(repo_name)
+            return None
+        del self._parent_stores[repo_name]
+        return store
+
+    def _retire_locked(self, repo_name: str, remove_dir: Optional[str]) -> Optional[ParentStore]:
+        """
+        Unregister the repo's store for good (its files are being replaced or
+        deleted). Returns it if unused, to close now; otherwise it is closed
+        (and remove_dir deleted) when its last user is done.
+        """
+        store = self._parent_stores.pop(repo_name, None)
+        self._close_when_idle.discard(repo_name)
+        if store is None:
+            return None
+        store.cache = None    # its texts are stale from now on
+        if self._store_users.get(store):
+            self._retired[store] = remove_dir
+            return None
+        return store
+
+    def _drop_parent_store(self, repo_name: str) -> None:
+        with self._stores_lock:
+            idle = self._evict_locked(repo_name)
+            self._lexical_indexes.pop(repo_name, None)
+            self._symbol_indexes.pop(repo_name, None)
+        if idle is not None:
+            idle.close()
+
+    # ── Staged rebuilds ──────────────────────────────────────────────────────
+
+    def stage_parent_store(self, repo_name: str) -> ParentStore:
+        """An empty parent store beside the live one, for a rebuild that publish_staged() swaps in."""
+        staging_root = os.path.join(self.parent_staging_dir, uuid.uuid4().hex)
+        return ParentStore(staging_root, repo_name)
+
+    def staged_parent_store(self, repo_name: str) -> Optional[ParentStore]:
+        """The parent store staged by split_parent_child_documents(), if any."""
+        with self._stores_lock:
+            staged = self._staged.get(repo_name)
+        return staged[0] if staged is not None else None
+
+    def publish_staged(self, repo_name: str, collection_name: Optional[str] = None) -> None:
+        """Swap the rebuild staged by split_parent_child_documents() (and collection_name) in."""
+        with self._stores_lock:
+            staged = self._staged.pop(repo_name, None)
+        if staged is not None:
+            self.publish_parent_store(repo_name, *staged, collection_name=collection_name)
+
+    def discard_staged(self, repo_name: str) -> None:
+        """Throw away a staged rebuild that never got its collection (no-op after publish)."""
+        with self._stores_lock:
+            staged = self._staged.pop(repo_name, None)
+        if staged is not None:
+            staged[0].close()
+            shutil.rmtree(os.path.dirname(staged[0].repo_dir), ignore_errors=True)
+
+    def publish_parent_store(self, repo_name: str, staged: ParentStore,
+                             symbol_index: Optional[SymbolIndex] = None,
+                             collection_name: Optional[str] = None) -> None:
+        """
+        Make a staged rebuild the repo's live one: its parents, the BM25
+        index at staged_lexical_prefix(staged), the symbol table and, if
+        given, the staged collection_name. A rebuild without a BM25 index or
+        symbol table removes the old one. Everything is swapped under the
+        stores lock, so a request sees either the old build or the new one;
+        requests still holding the old store keep reading it until they finish.
+        """
+        staged.close()
+        staging_root = os.path.dirname(staged.repo_dir)
+        live_dir = os.path.join(self.parent_store_dir, repo_name)
+        old_dir = staging_root + ".old"
+        staged_lexical = self.staged_lexical_prefix(staged)
+        live_lexical = self.lexical_index_prefix(repo_name)
+        symbols_path = self.symbol_index_path(repo_name)
+        retired = None
+
+        with self._stores_lock:
+            if collection_name is not None:
+                retired = self.vector_store.publish_staged_collection(repo_name, collection_name)
+            for ext in (".npz", ".json"):
+                if os.path.exists(staged_lexical + ext):
+                    os.makedirs(self.lexical_index_dir, exist_ok=True)
+                    os.replace(staged_lexical + ext, live_lexical + ext)
+                elif os.path.exists(live_lexical + ext):
+                    os.remove(live_lexical + ext)
+            old = self._parent_stores.get(repo_name)
+            if old is not None:
+                old.move_to(old_dir)
+            elif os.path.isdir(live_dir):
+                os.replace(live_dir, old_dir)
+            os.replace(staged.repo_dir, live_dir)
+            idle = self._retire_locked(repo_name, old_dir)
+            if symbol_index is not None:
+                symbol_index.save(symbols_path)
+            elif os.path.exists(symbols_path):
+                os.remove(symbols_path)
+            self._lexical_indexes.pop(repo_name, None)
+            self._symbol_indexes.pop(repo_name, None)
+
+        self.parent_cache.invalidate(repo_name)
+        os.rmdir(staging_root)
+        if retired is not None:
+            self.vector_store.drop_collection(retired)
+        if idle is not None:
+            idle.close()
+        if old is None or idle is not None:
+            shutil.rmtree(old_dir, ignore_errors=True)
+
+    def _get_lexical_index(self, repo_name: str) -> Optional[LexicalIndex]:
+        """Loaded BM25 index for the repo, or None if it was indexed without one."""
+        with self._stores_lock:
+            index = self._lexical_indexes.get(repo_name)
+        if index is not None:
+            return index
+
+        index = LexicalIndex.load(self.lexical_index_prefix(repo_name))
+        if index is not None:
+            with self._stores_lock:
+                # Only cache while the repo's parent store is live, so eviction drops both
+                if repo_name in self._parent_stores:
+                    self._lexical_indexes[repo_name] = index
+        return index
+
+    def get_symbol_index(self, repo_name: str) -> Optional[SymbolIndex]:
+        """Loaded symbol table for the repo, or None if it was indexed without one."""
+        with self._stores_lock:
+            index = self._symbol_indexes.get(repo_name)
+        if index is not None:
+            return index
+
+        index = SymbolIndex.load(self.symbol_index_path(repo_name))
+        if index is not None:
+            with self._stores_lock:
+                if repo_name in self._parent_stores:
+                    self._symbol_indexes[repo_name] = index
+        return index
 
     def split_parent_child_documents(
         self,
@@ -181,6 +466,10 @@ class ParentChildRetriever:
         1. Read each file as parent document (full file content).
         2. Split each parent into smaller child chunks.
 
+        Parents and the symbol table are staged; store_child_embeddings()
+        swaps them in once the new collection is written, so the live repo
+        keeps its old parents meanwhile (discard_staged() drops a failed build).
+
         FIX 2: chunk_size=800 (was 400) — better context per chunk
         FIX 3: Skip files with too little meaningful content
         """
@@ -189,6 +478,9 @@ class ParentChildRetriever:
         total_files         = len(files)
         skipped             = 0
         skipped_too_small   = 0
+        parent_store        = self.stage_parent_store(repo_name)
+        common_root         = _common_root([rel for _, rel in files])
+        symbol_files        = []
 
         for idx, (abs_path, rel_path) in enumerate(files):
             file_num = idx + 1
@@ -208,16 +500,21 @@ class ParentChildRetriever:
                 # File ID — unique identifier within the repo
                 file_id = f"parent_{idx}"
 
-                # Store parent document (full file) in offline folder
-                parent_path = self._get_parent_path(repo_name, file_id)
-                with open(parent_path, "w", encoding="utf-8") as f:
-                    f.write(parent_content)
+                # Append parent document (full file) to the repo's packed store
+                parent_store.write(file_id, parent_content)
+                symbol_files.append({"text": parent_content, "filename": filename,
+                                     "filepath": rel_path, "parent_id": file_id})
 
                 # ── FIX 2: Chunk with larger size (800 chars, overlap 100) ────
-                child_chunks    = self.text_splitter.split_text(parent_content)
+                child_chunks    = self.text_splitter.split_text_with_offsets(parent_content)
                 file_chunk_count = 0
 
-                for c_idx, child in enumerate(child_chunks):
+                # Indexed metadata for pre-filtered search (path / extension / language)
+                posix_path = rel_path.replace("\\", "/")
+                repo_path  = posix_path[len(common_root):] if common_root else posix_path
+                top_dir    = repo_path.split("/", 1)[0] if "/" in repo_path else ""
+
+                for c_idx, (child, start_char, end_char) in enumerate(child_chunks):
                     if child and child.strip():
                         all_child_chunks.append(child)
                         all_child_metadatas.append({
@@ -225,7 +522,12 @@ class ParentChildRetriever:
                             "filename":    filename,
                             "filepath":    rel_path,
                             "chunk_index": str(c_idx),
-                            "is_child":    "true"
+                            "is_child":    "true",
+                            "extension":   os.path.splitext(filename)[1].lower(),
+                            "language":    detect_language(filename),
+                            "top_dir":     top_dir,
+                            "start_char":  start_char,
+                            "end_char":    end_char
                         })
                         file_chunk_count += 1
 
@@ -240,11 +542,19 @@ class ParentChildRetriever:
                 print(f"  [ERROR] splitting {rel_path}: {e}", flush=True)
                 skipped += 1
 
+        parent_store.flush()
+
+        symbol_index = SymbolIndex.build(symbol_files)
+        self.discard_staged(repo_name)
+        with self._stores_lock:
+            self._staged[repo_name] = (parent_store, symbol_index)
+
         print(
             f"\n  [ParentChild] Done:"
             f"\n    ✓ Children chunks  : {len(all_child_chunks)}"
             f"\n    ✗ Skipped (empty)  : {skipped}"
-            f"\n    ✗ Skipped (small)  : {skipped_too_small}",
+            f"\n    ✗ Skipped (small)  : {skipped_too_small}"
+            f"\n    ✓ Symbols          : {len(symbol_index)}",
             flush=True
         )
         return all_child_chunks, all_child_metadatas
@@ -254,77 +564,522 @@ class ParentChildRetriever:
         chunks: List[str],
         metadatas: List[Dict[str, str]],
         repo_name: str,
-        progress_callback=None
-    ):
-        """Store embeddings only for child chunks."""
+        progress_callback=None,
+        backend: Optional[str] = None,
+        hnsw_preset: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Embed the child chunks into a staged collection and build their BM25
+        index beside the parents staged by split_parent_child_documents(),
+        then publish all of it at once. The live repo answers from its old
+        build until then. Returns the ingestion summary.
+        """
         if not chunks:
             print("  [ParentChild] No chunks to embed!", flush=True)
-            return
+            return {}
+        staged = self.staged_parent_store(repo_name)
+        if staged is None:
+            raise ValueError(f"Nothing staged for '{repo_name}': run split_parent_child_documents() first")
 
-        self.vector_store.create_or_get_collection(repo_name)
-        self.vector_store.add_documents(chunks, metadatas, progress_callback=progress_callback)
+        # Explicit ids so vector hits and lexical hits refer to the same child
+        ids = [f"doc_{i}" for i in range(len(chunks))]
+
+        collection_name = staging_name(repo_name)
+        try:
+            self.vector_store.create_or_get_collection(
+                collection_name, backend=backend, expected_count=len(chunks), hnsw_preset=hnsw_preset
+            )
+            ingestion = self.vector_store.add_documents(
+                chunks, metadatas,
+                ids=ids,
+                progress_callback=progress_callback,
+                repo_name=collection_name
+            )
+
+            lexical_index = LexicalIndex.build(ids, chunks, metadatas)
+            lexical_index.save(self.staged_lexical_prefix(staged))
+            self.publish_staged(repo_name, collection_name)
+        except BaseException:
+            self.vector_store.drop_collection(collection_name)
+            raise
+        print(f"  [ParentChild] BM25 index: {len(lexical_index.vocabulary)} terms, "
+              f"{len(lexical_index.doc_rows)} postings", flush=True)
+        return ingestion
 
     def retrieve_parent_context(
         self,
         query: str,
         repo_name: str,
-        n_results: int = 5
+        n_results: int = 5,
+        lexical_query: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+        adaptive: Optional[bool] = None,
+        rerank: Optional[bool] = None,
+        rerank_budget_ms: Optional[float] = None,
+        mmr: Optional[bool] = None,
+        mmr_lambda: Optional[float] = None,
+        query_embedding: Optional[List[float]] = None
     ) -> Dict[str, Any]:
         """
         Retrieval flow:
-        1. Search child chunks via vector similarity
-        2. Return corresponding parent (full file) content
+        1. Search child chunks via vector similarity (+ BM25 when available)
+        2. Fuse both rankings with reciprocal-rank fusion
+        3. Return corresponding parent (full file) content
+
+        lexical_query: text for the BM25 side (e.g. the user's original
+        question, when `query` is a HyDE expansion). Defaults to `query`.
+        where: metadata pre-filter applied to both the vector and BM25 search.
+        adaptive: over-fetch children until n_results distinct parents are
+        found (default ADAPTIVE_RETRIEVAL); otherwise fetch n_results children once.
+        rerank: re-score the top reranker.max_candidates children with the
+        cross-encoder before collapsing to parents (default RERANK_ENABLED),
+        within rerank_budget_ms (default RERANK_BUDGET_MS).
+        mmr: pick n_results of MMR_POOL_FACTOR × n_results candidate parents by
+        maximal marginal relevance (default MMR_ENABLED), weighting relevance
+        by mmr_lambda (default MMR_LAMBDA).
+        query_embedding: the vector of `query`, when the caller already has it.
         """
+        parent_store = self._acquire_parent_store(repo_name)
         try:
-            results = self.vector_store.query(query, n_results=n_results)
-
-            # Map children → parents, keep best similarity score per parent
-            unique_parents: Dict[str, Any] = {}
-            for doc, metadata, distance in zip(
-                results['documents'],
-                results['metadatas'],
-                results['distances']
-            ):
-                parent_id = metadata.get("parent_id")
-                if not parent_id:
-                    continue
-
-                relevance = round(max(0, 1 - distance), 4)
+            response, unique_parents = self._rank(
+                query, repo_name, n_results, lexical_query, where, adaptive, rerank, rerank_budget_ms, mmr, mmr_lambda,
+                query_embedding
+            )
+            # Build response with full parent content
+            response["results"] = self._format_results(parent_store, unique_parents)
+            return response
 
-                # Keep the parent with highest relevance if seen multiple times
-                if parent_id not in unique_parents or relevance > unique_parents[parent_id]["relevance"]:
-                    unique_parents[parent_id] = {
-                        "metadata":  metadata,
-                        "relevance": relevance
-                    }
+        except Exception as e:
+            traceback.print_exc()
+            return {
+                "error":   f"Parent retrieval failed: {str(e)}",
+                "results": []
+            }
+        finally:
+            self._release_parent_store(parent_store)
 
-            # Build response with full parent content
-            formatted_results = []
+    def iter_parent_context(
+        self,
+        query: str,
+        repo_name: str,
+        n_results: int = 5,
+        lexical_query: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+        adaptive: Optional[bool] = None,
+        rerank: Optional[bool] = None,
+        rerank_budget_ms: Optional[float] = None,
+        mmr: Optional[bool] = None,
+        mmr_lambda: Optional[float] = None
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        retrieve_parent_context as a stream: first the response without
+        "results" (or {"error"}) once the parents are ranked, then one result
+        per parent as its file is read. The parent store stays open until the
+        generator is exhausted or closed.
+        """
+        with self.open_parent_store(repo_name) as parent_store:
+            try:
+                response, unique_parents = self._rank(
+                    query, repo_name, n_results, lexical_query, where, adaptive, rerank, rerank_budget_ms, mmr, mmr_lambda
+                )
+            except Exception as e:
+                traceback.print_exc()
+                yield {"error": f"Parent retrieval failed: {str(e)}"}
+                return
+            yield response
+            texts: Dict[str, Optional[str]] = {}
             for parent_id, data in unique_parents.items():
-                metadata    = data["metadata"]
-                parent_path = self._get_parent_path(repo_name, parent_id)
-                parent_text = "Content not found."
-
-                if os.path.exists(parent_path):
-                    with open(parent_path, "r", encoding="utf-8") as f:
-                        parent_text = f.read()
-
-                formatted_results.append({
-                    "chunk":     parent_text,
-                    "source":    metadata.get("filepath", "unknown"),
-                    "filename":  metadata.get("filename", "unknown"),
-                    "relevance": data["relevance"]
-                })
+                yield self._format_result(parent_store, parent_id, data, texts)
 
-            return {
-                "status":  "success",
-                "query":   query,
-                "results": formatted_results
+    def _rank(
+        self,
+        query: str,
+        repo_name: str,
+        n_results: int,
+        lexical_query: Optional[str],
+        where: Optional[Dict[str, Any]],
+        adaptive: Optional[bool],
+        rerank: Optional[bool],
+        rerank_budget_ms: Optional[float],
+        mmr: Optional[bool],
+        mmr_lambda: Optional[float],
+        query_embedding: Optional[List[float]] = None
+    ) -> Tuple[Dict[str, Any], Dict[str, Any]]:
+        """Steps 1-2 of retrieve_parent_context: (response without "results", top n_results parents)."""
+        if adaptive is None:
+            adaptive = ADAPTIVE_RETRIEVAL
+        if mmr is None:
+            mmr = MMR_ENABLED
+        pool_size = n_results * MMR_POOL_FACTOR if mmr else n_results
+        if query_embedding is None and (adaptive or mmr):
+            query_embedding = self.vector_store.embedding_engine.embed_text(query)
+
+        if adaptive:
+            vector_hits, lexical_hits, rounds = self._fetch_distinct_parents(
+                query, repo_name, pool_size, lexical_query, where, query_embedding
+            )
+        else:
+            vector_hits, lexical_hits = self._fetch_children(
+                query, repo_name, pool_size, lexical_query, where, query_embedding
+            )
+            rounds = 1
+
+        rerank_scores, rerank_info = None, None
+        if rerank is None:
+            rerank = RERANK_ENABLED
+        if rerank:
+            rerank_scores, rerank_info = self._rerank(
+                lexical_query or query, repo_name, vector_hits, lexical_hits, rerank_budget_ms
+            )
+
+        unique_parents = self._rank_parents(vector_hits, lexical_hits, rerank_scores)
+        candidate_count = len(unique_parents)
+        if mmr and candidate_count > n_results:
+            lambda_mult = MMR_LAMBDA if mmr_lambda is None else mmr_lambda
+            unique_parents = self._diversify(repo_name, unique_parents, query_embedding, n_results, lambda_mult)
+        unique_parents = dict(list(unique_parents.items())[:n_results])
+
+        response = {
+            "status":             "success",
+            "query":              query,
+            "children_inspected": _distinct_children(vector_hits, lexical_hits),
+            "fetch_rounds":       rounds
+        }
+        if rerank_info is not None:
+            response["rerank"] = rerank_info
+        if mmr:
+            response["mmr"] = {
+                "lambda":     MMR_LAMBDA if mmr_lambda is None else mmr_lambda,
+                "candidates": candidate_count
             }
+        return response, unique_parents
+
+    def retrieve_many(
+        self,
+        queries: List[str],
+        repo_name: str,
+        n_results: int = 5,
+        where: Optional[Dict[str, Any]] = None,
+        adaptive: Optional[bool] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        retrieve_parent_context for many queries at once: one encoder batch
+        for all query embeddings and one multi-query vector search per fetch
+        round (adaptive rounds only re-query the queries still short of
+        n_results files). Parent texts are read once per batch. No HyDE,
+        re-ranking or MMR. Returns one response per query, in order.
+        """
+        if not queries:
+            return []
+        parent_store = self._acquire_parent_store(repo_name)
+        try:
+            if adaptive is None:
+                adaptive = ADAPTIVE_RETRIEVAL
+            embeddings = self.vector_store.embedding_engine.embed_texts(list(queries))
+
+            hits: List[Optional[Tuple[List[Tuple], List[Tuple]]]] = [None] * len(queries)
+            rounds = [0] * len(queries)
+            pending = list(range(len(queries)))
+            n_children = max(n_results, n_results * ADAPTIVE_INITIAL_FACTOR) if adaptive else n_results
+            while pending:
+                batch = self.vector_store.query_many(
+                    [embeddings[i] for i in pending], n_results=n_children, repo_name=repo_name, where=where
+                )
+                still_short = []
+                for i, results in zip(pending, batch):
+                    vector_hits = list(zip(results['ids'], results['metadatas'], results['distances']))
+                    lexical_hits = self._lexical_hits(queries[i], repo_name, n_children, where)
+                    hits[i] = (vector_hits, lexical_hits)
+                    rounds[i] += 1
+
+                    exhausted = len(vector_hits) < n_children and len(lexical_hits) < n_children
+                    below_floor = bool(vector_hits) and 1 - vector_hits[-1][2] < ADAPTIVE_SCORE_FLOOR
+                    if (adaptive and not (exhausted or below_floor)
+                            and len(self._rank_parents(vector_hits, lexical_hits)) < n_results):
+                        still_short.append(i)
+                if n_children >= ADAPTIVE_MAX_CHILDREN:
+                    break
+                pending = still_short
+                n_children = min(n_children * ADAPTIVE_GROWTH, ADAPTIVE_MAX_CHILDREN)
+
+            texts: Dict[str, Optional[str]] = {}
+            responses = []
+            for query, (vector_hits, lexical_hits), n_rounds in zip(queries, hits, rounds):
+                unique_parents = dict(list(self._rank_parents(vector_hits, lexical_hits).items())[:n_results])
+                responses.append({
+                    "status":             "success",
+                    "query":              query,
+                    "results":            self._format_results(parent_store, unique_parents, texts),
+                    "children_inspected": _distinct_children(vector_hits, lexical_hits),
+                    "fetch_rounds":       n_rounds
+                })
+            return responses
 
         except Exception as e:
             traceback.print_exc()
-            return {
-                "error":   f"Parent retrieval failed: {str(e)}",
-                "results": []
-            }
\ No newline at end of file
+            return [{"error": f"Parent retrieval failed: {str(e)}", "results": []} for _ in queries]
+        finally:
+            self._release_parent_store(parent_store)
+
+    @staticmethod
+    def _format_results(
+        parent_store: ParentStore,
+        unique_parents: Dict[str, Any],
+        texts: Optional[Dict[str, Optional[str]]] = None
+    ) -> List[Dict[str, Any]]:
+        """Ranked parents as response results with full file text. `texts` memoizes reads across calls."""
+        texts = {} if texts is None else texts
+        return [ParentChildRetriever._format_result(parent_store, parent_id, data, texts)
+                for parent_id, data in unique_parents.items()]
+
+    @staticmethod
+    def _format_result(
+        parent_store: ParentStore,
+        parent_id: str,
+        data: Dict[str, Any],
+        texts: Dict[str, Optional[str]]
+    ) -> Dict[str, Any]:
+        """One ranked parent as a response result, reading its text unless `texts` has it."""
+        metadata = data["metadata"]
+        if parent_id not in texts:
+            texts[parent_id] = parent_store.read(parent_id)
+        parent_text = texts[parent_id]
+        if parent_text is None:
+            parent_text = "Content not found."
+
+        result = {
+            "chunk":     parent_text,
+            "source":    metadata.get("filepath", "unknown"),
+            "filename":  metadata.get("filename", "unknown"),
+            "relevance": data["relevance"],
+            "match":     data["match"],
+            "spans":     data["spans"]
+        }
+        if "rerank_score" in data:
+            result["rerank_score"] = data["rerank_score"]
+        return result
+
+    def _fetch_children(
+        self,
+        query: str,
+        repo_name: str,
+        n_children: int,
+        lexical_query: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> Tuple[List[Tuple], List[Tuple]]:
+        """Top n_children vector hits and BM25 hits as (child_id, metadata, distance/score)."""
+        results = self.vector_store.query(
+            query, n_results=n_children, repo_name=repo_name, where=where, query_embedding=query_embedding
+        )
+        vector_hits = list(zip(results['ids'], results['metadatas'], results['distances']))
+        return vector_hits, self._lexical_hits(lexical_query or query, repo_name, n_children, where)
+
+    def _lexical_hits(
+        self,
+        query: str,
+        repo_name: str,
+        n_children: int,
+        where: Optional[Dict[str, Any]] = None
+    ) -> List[Tuple]:
+        """BM25 hits as (child_id, metadata, score); empty when hybrid retrieval is off or unindexed."""
+        if not HYBRID_RETRIEVAL:
+            return []
+        lexical_index = self._get_lexical_index(repo_name)
+        if lexical_index is None:
+            return []
+        return lexical_index.search(query, n_results=n_children, where=where)
+
+    def _fetch_distinct_parents(
+        self,
+        query: str,
+        repo_name: str,
+        n_results: int,
+        lexical_query: Optional[str] = None,
+        where: Optional[Dict[str, Any]] = None,
+        query_embedding: Optional[List[float]] = None
+    ) -> Tuple[List[Tuple], List[Tuple], int]:
+        """
+        Fetch growing pages of children until n_results distinct parents are
+        ranked. Stops early when the page is not filled (nothing left to
+        fetch), when the last vector hit falls below ADAPTIVE_SCORE_FLOOR, or
+        at ADAPTIVE_MAX_CHILDREN. Returns (vector_hits, lexical_hits, rounds).
+        """
+        if query_embedding is None:
+            query_embedding = self.vector_store.embedding_engine.embed_text(query)
+        n_children = max(n_results, n_results * ADAPTIVE_INITIAL_FACTOR)
+        rounds = 0
+        while True:
+            rounds += 1
+            vector_hits, lexical_hits = self._fetch_children(
+                query, repo_name, n_children, lexical_query, where, query_embedding
+            )
+            parents = self._rank_parents(vector_hits, lexical_hits)
+
+            exhausted = len(vector_hits) < n_children and len(lexical_hits) < n_children
+            below_floor = bool(vector_hits) and 1 - vector_hits[-1][2] < ADAPTIVE_SCORE_FLOOR
+            if len(parents) >= n_results or exhausted or below_floor or n_children >= ADAPTIVE_MAX_CHILDREN:
+                break
+            n_children = min(n_children * ADAPTIVE_GROWTH, ADAPTIVE_MAX_CHILDREN)
+
+        print(f"  [ParentChild] Adaptive fetch: {len(parents)} parents from "
+              f"{_distinct_children(vector_hits, lexical_hits)} children in {rounds} round(s)", flush=True)
+        return vector_hits, lexical_hits, rounds
+
+    def _rerank(
+        self,
+        query: str,
+        repo_name: str,
+        vector_hits: List[Tuple],
+        lexical_hits: List[Tuple],
+        budget_ms: Optional[float] = None
+    ) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """Cross-encoder scores for the top fused children (texts fetched in one call)."""
+        _, fused = self._fuse(vector_hits, lexical_hits)
+        candidate_ids = sorted(fused, key=fused.get, reverse=True)[:self.reranker.max_candidates]
+        stored = self.vector_store.get_children(repo_name, candidate_ids, include=["documents"])
+        candidates = [(cid, stored[cid]["documents"]) for cid in candidate_ids if cid in stored]
+
+        scores, info = self.reranker.rerank(query, candidates, budget_ms)
+        print(f"  [ParentChild] Re-ranked {info['scored']}/{info['candidates']} children "
+              f"in {info['ms']:.0f} ms", flush=True)
+        return scores, info
+
+    def _diversify(
+        self,
+        repo_name: str,
+        parents: Dict[str, Any],
+        query_embedding: List[float],
+        k: int,
+        lambda_mult: float
+    ) -> Dict[str, Any]:
+        """MMR over parents, each represented by its best child's stored embedding (one get call)."""
+        child_ids = [parent["child_id"] for parent in parents.values()]
+        stored = self.vector_store.get_children(repo_name, child_ids, include=["embeddings"])
+        candidates = [pid for pid, parent in parents.items() if parent["child_id"] in stored]
+        if len(candidates) <= k:
+            return parents
+
+        vectors = [stored[parents[pid]["child_id"]]["embeddings"] for pid in candidates]
+        picked = mmr_select(query_embedding, vectors, k, lambda_mult)
+        return {candidates[i]: parents[candidates[i]] for i in picked}
+
+    @staticmethod
+    def _fuse(vector_hits: List[Tuple], lexical_hits: List[Tuple]) -> Tuple[Dict[str, Any], Dict[str, float]]:
+        """Per-child info and RRF score: sum(1 / (RRF_K + rank)) over the rankings it appears in."""
+        fused: Dict[str, float] = {}
+        children: Dict[str, Dict[str, Any]] = {}
+
+        for rank, (child_id, metadata, distance) in enumerate(vector_hits, start=1):
+            child = children.setdefault(child_id, {"metadata": metadata, "match": set()})
+            child["vector_relevance"] = round(max(0, 1 - distance), 4)
+            child["match"].add("vector")
+            fused[child_id] = fused.get(child_id, 0.0) + 1.0 / (RRF_K + rank)
+
+        for rank, (child_id, metadata, _score) in enumerate(lexical_hits, start=1):
+            child = children.setdefault(child_id, {"metadata": metadata, "match": set()})
+            child["match"].add("lexical")
+            fused[child_id] = fused.get(child_id, 0.0) + 1.0 / (RRF_K + rank)
+        return children, fused
+
+    @classmethod
+    def _rank_parents(
+        cls,
+        vector_hits: List[Tuple],
+        lexical_hits: List[Tuple],
+        rerank_scores: Optional[Dict[str, float]] = None
+    ) -> Dict[str, Any]:
+        """
+        Collapse child hits to parents, best parent first.
+
+        Children are ordered by fused RRF score (see _fuse), or by cross-encoder
+        score when re-ranked (unscored children follow in fused order); a parent
+        takes its best child's place. `relevance` stays the cosine relevance
+        when the parent had a vector hit, otherwise the fused score scaled so
+        rank 1 in both lists would be 1.0.
+        """
+        children, fused = cls._fuse(vector_hits, lexical_hits)
+        rerank_scores = rerank_scores or {}
+        order = sorted(fused, key=lambda cid: (cid in rerank_scores, rerank_scores.get(cid, fused[cid])), reverse=True)
+
+        best_possible = 2.0 / (RRF_K + 1)
+        parents: Dict[str, Any] = {}
+        for child_id in order:
+            child = children[child_id]
+            parent_id = child["metadata"].get("parent_id")
+            if not parent_id:
+                continue
+
+            parent = parents.get(parent_id)
+            if parent is None:
+                parent = parents[parent_id] = {
+                    "metadata":  child["metadata"],
+                    "child_id":  child_id,
+                    "score":     fused[child_id],
+                    "relevance": None,
+                    "match":     set(),
+                    "spans":     [],
+                }
+                if child_id in rerank_scores:
+                    parent["rerank_score"] = round(rerank_scores[child_id], 4)
+            parent["match"] |= child["match"]
+            # Matched regions of the file, best child first (indexes built
+            # before offsets were stored have none)
+            if "start_char" in child["metadata"]:
+                parent["spans"].append([child["metadata"]["start_char"], child["metadata"]["end_char"]])
+            # Keep the parent with highest relevance if seen multiple times
+            if "vector_relevance" in child and (parent["relevance"] is None or child["vector_relevance"] > parent["relevance"]):
+                parent["relevance"] = child["vector_relevance"]
+
+        for parent in parents.values():
+            if parent["relevance"] is None:
+                parent["relevance"] = round(min(1.0, parent["score"] / best_possible), 4)
+            parent["match"] = "+".join(sorted(parent["match"]))
+        return parents
+
+    @staticmethod
+    def fuse_results(result_lists: List[Dict[str, Any]], n_results: int) -> Dict[str, Any]:
+        """
+        RRF-fuse finished retrieve_parent_context responses (e.g. for the HyDE
+        text and the plain query) into one, keyed by file. A file found by
+        several keeps its higher relevance and the union of its spans.
+        """
+        fused: Dict[str, float] = {}
+        merged: Dict[str, Dict[str, Any]] = {}
+        for result in result_lists:
+            for rank, item in enumerate(result.get("results", []), start=1):
+                key = item["source"]
+                fused[key] = fused.get(key, 0.0) + 1.0 / (RRF_K + rank)
+                entry = merged.get(key)
+                if entry is None:
+                    merged[key] = dict(item, spans=list(item.get("spans") or []))
+                    continue
+                if item["relevance"] > entry["relevance"]:
+                    entry["relevance"] = item["relevance"]
+                entry["match"] = "+".join(sorted(set(entry["match"].split("+")) | set(item["match"].split("+"))))
+                entry["spans"] += [span for span in item.get("spans") or [] if span not in entry["spans"]]
+
+        order = sorted(fused, key=fused.get, reverse=True)[:n_results]
+        response = dict(result_lists[-1])
+        response.update(
+            results=[merged[key] for key in order],
+            children_inspected=sum(r.get("children_inspected", 0) for r in result_lists),
+            fetch_rounds=sum(r.get("fetch_rounds", 0) for r in result_lists),
+        )
+        return response
+
+
+def _distinct_children(vector_hits: List[Tuple], lexical_hits: List[Tuple]) -> int:
+    return len({hit[0] for hit in vector_hits} | {hit[0] for hit in lexical_hits})
+
+
+def _common_root(rel_paths: List[str]) -> str:
+    """
+    "repo-main/" when every file sits under one wrapper folder (typical of
+    GitHub ZIP downloads), else "". Used so top_dir is "frontend", not the wrapper.
+    """
+    paths = [p.replace("\\", "/") for p in rel_paths]
+    if not paths or not all("/" in p for p in paths):
+        return ""
+    roots = {p.split("/", 1)[0] for p in paths}
+    return roots.pop() + "/" if len(roots) == 1 else ""
@@ -0,0 +1,256 @@
+import os
+import mmap
+import json
+import zlib
+import shutil
+import threading
+from typing import Dict, List, Optional, Set, Tuple
+
+try:
+    import zstandard
+except ImportError:  # optional — PARENT_COMPRESSION=zstd falls back to zlib
+    zstandard = None
+
+
+# Per-record compression for new writes: "none", "zlib" or "zstd".
+# Each record keeps its codec in the index, so one pack may mix them.
+PARENT_COMPRESSION = os.getenv("PARENT_COMPRESSION", "zlib").lower()
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+PACK_FILE = "parents.pack"
+INDEX_FILE = "parents.idx.json"
+INDEX_VERSION = 1
+
+# parent_id -> (offset, length, codec)
+Record = Tuple[int, int, str]
+
+
+class ParentStore:
+    """
+    Parent documents (full files) of ONE repository, packed into one file.
+    Layout: <root_dir>/<repo_name>/parents.pack      append-only records
+            <root_dir>/<repo_name>/parents.idx.json  parent_id -> [offset, length, codec]
+
+    Reads slice a read-only mmap of the pack. Appended records become durable
+    on flush(). A closed store reopens its files on next use. With a
+    ParentTextCache, read() serves hot parents from memory.
+    """
+
+    def __init__(self, root_dir: str, repo_name: str, compression: str = PARENT_COMPRESSION, cache=None):
+        self.repo_name = repo_name
+        self.cache = cache  # shared ParentTextCache, invalidated for rewritten parents on flush()
+        self.repo_dir = os.path.join(root_dir, repo_name)
+        self.pack_path = os.path.join(self.repo_dir, PACK_FILE)
+        self.index_path = os.path.join(self.repo_dir, INDEX_FILE)
+        os.makedirs(self.repo_dir, exist_ok=True)
+
+        if compression not in ("none", "zlib", "zstd"):
+            raise ValueError(f"Unknown parent compression '{compression}'. Use none, zlib or zstd")
+        if compression == "zstd" and zstandard is None:
+            print("  [ParentStore] zstandard not installed — using zlib", flush=True)
+            compression = "zlib"
+        self.compression = compression
+
+        self._lock = threading.RLock()
+        self._index: Dict[str, Record] = {}
+        self._index_dirty = False
+        self._writer = None
+        self._mmap: Optional[mmap.mmap] = None
+        self._uncached: Set[str] = set()   # rewritten since the last flush(); read() skips the cache
+
+        self._load_index()
+        self._migrate_legacy_files()
+
+    # ── Index ────────────────────────────────────────────────────────────────
+
+    def _load_index(self) -> None:
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, encoding="utf-8") as f:
+            records = json.load(f).get("records", {})
+        self._index = {pid: (rec[0], rec[1], rec[2]) for pid, rec in records.items()}
+
+    def _save_index(self) -> None:
+        tmp_path = self.index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "records": self._index}, f)
+        os.replace(tmp_path, self.index_path)
+        self._index_dirty = False
+
+    def _migrate_legacy_files(self) -> None:
+        """Pack the <parent_id>.txt files of the old one-file-per-parent layout."""
+        legacy = sorted(name for name in os.listdir(self.repo_dir) if name.endswith(".txt"))
+        if not legacy:
+            return
+        for name in legacy:
+            parent_id = name[:-4]
+            if parent_id not in self._index:
+                with open(os.path.join(self.repo_dir, name), "r", encoding="utf-8") as f:
+                    self.write(parent_id, f.read())
+        self.flush()
+        for name in legacy:
+            os.remove(os.path.join(self.repo_dir, name))
+        print(f"  [ParentStore] Packed {len(legacy)} legacy parent files for '{self.repo_name}'", flush=True)
+
+    # ── Codecs ───────────────────────────────────────────────────────────────
+
+    def _encode(self, raw: bytes) -> Tuple[bytes, str]:
+        if self.compression == "zlib":
+            packed = zlib.compress(raw, ZLIB_LEVEL)
+        elif self.compression == "zstd":
+            packed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(raw)
+        else:
+            return raw, "none"
+        # Tiny or incompressible files are cheaper to keep raw
+        return (packed, self.compression) if len(packed) < len(raw) else (raw, "none")
+
+    @staticmethod
+    def _decode(data: bytes, codec: str) -> bytes:
+        if codec == "zlib":
+            return zlib.decompress(data)
+        if codec == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Parent record is zstd-compressed but zstandard is not installed")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return data
+
+    # ── Read / write ─────────────────────────────────────────────────────────
+
+    def write(self, parent_id: str, content: str) -> None:
+        data, codec = self._encode(content.encode("utf-8"))
+        with self._lock:
+            if self._writer is None:
+                self._writer = open(self.pack_path, "ab")
+            offset = self._writer.tell()
+            self._writer.write(data)
+            self._index[parent_id] = (offset, len(data), codec)
+            self._index_dirty = True
+            if self.cache is not None:
+                self._uncached.add(parent_id)
+
+    def flush(self) -> None:
+        """Make appended records and the index durable, and drop their cached text."""
+        with self._lock:
+            if self._writer is not None:
+                self._writer.flush()
+            if self._index_dirty:
+                self._save_index()
+            if self._uncached:
+                self.cache.invalidate_many(self.repo_name, self._uncached)
+                self._uncached = set()
+
+    def read(self, parent_id: str, cached: bool = True) -> Optional[str]:
+        """Parent text, or None if it was never stored."""
+        if cached and self.cache is not None and parent_id not in self._uncached:
+            return self.cache.get_or_load(self.repo_name, parent_id, lambda: self._read_packed(parent_id))
+        return self._read_packed(parent_id)
+
+    def _read_packed(self, parent_id: str) -> Optional[str]:
+        with self._lock:
+            record = self._index.get(parent_id)
+            if record is None:
+                return None
+            offset, length, codec = record
+            if self._writer is not None:
+                self._writer.flush()
+            data = self._mapped(offset + length)[offset:offset + length]
+        return self._decode(data, codec).decode("utf-8")
+
+    def _mapped(self, needed: int) -> mmap.mmap:
+        """Read-only mmap of the pack, remapped once appends outgrow it."""
+        if self._mmap is None or len(self._mmap) < needed:
+            self._unmap()
+            with open(self.pack_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def _unmap(self) -> None:
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def list_ids(self) -> List[str]:
+        """All stored parent ids."""
+        with self._lock:
+            return sorted(self._index)
+
+    def pack_size(self) -> int:
+        """Bytes on disk (pack + index)."""
+        return sum(os.path.getsize(p) for p in (self.pack_path, self.index_path) if os.path.exists(p))
+
+    # ── Maintenance ──────────────────────────────────────────────────────────
+
+    def delete(self, parent_ids: List[str]) -> None:
+        """Drop records from the index; compact() reclaims their bytes."""
+        with self._lock:
+            for parent_id in parent_ids:
+                if self._index.pop(parent_id, None) is not None:
+                    self._index_dirty = True
+                if self.cache is not None:
+                    self._uncached.add(parent_id)
+            self.flush()
+
+    def compact(self) -> int:
+        """Rewrite the pack with only indexed records. Returns bytes freed."""
+        with self._lock:
+            self.flush()
+            if not os.path.exists(self.pack_path):
+                return 0
+            before = os.path.getsize(self.pack_path)
+            live = sum(length for _, length, _ in self._index.values())
+            if live == before:
+                return 0
+
+            tmp_path = self.pack_path + ".tmp"
+            compacted: Dict[str, Record] = {}
+            view = self._mapped(before) if before else b""
+            with open(tmp_path, "wb") as out:
+                for parent_id, (offset, length, codec) in sorted(self._index.items(), key=lambda kv: kv[1][0]):
+                    compacted[parent_id] = (out.tell(), length, codec)
+                    out.write(view[offset:offset + length])
+
+            self._close_files()
+            os.replace(tmp_path, self.pack_path)
+            self._index = compacted
+            self._save_index()
+            return before - os.path.getsize(self.pack_path)
+
+    def clear(self) -> None:
+        """Delete every parent of this repo."""
+        with self._lock:
+            self._close_files()
+            shutil.rmtree(self.repo_dir, ignore_errors=True)
+            os.makedirs(self.repo_dir, exist_ok=True)
+            self._index = {}
+            self._index_dirty = False
+            self._uncached = set()
+        if self.cache is not None:
+            self.cache.invalidate(self.repo_name)
+
+    def move_to(self, repo_dir: str) -> None:
+        """
+        Move this store's files to repo_dir and keep serving them from there
+        (used to retire a store when a rebuilt one takes over its directory).
+        """
+        with self._lock:
+            self.flush()
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+            os.replace(self.repo_dir, repo_dir)
+            self.repo_dir = repo_dir
+            self.pack_path = os.path.join(repo_dir, PACK_FILE)
+            self.index_path = os.path.join(repo_dir, INDEX_FILE)
+
+    def close(self) -> None:
+        """Flush, then release the append handle and the mmap."""
+        with self._lock:
+            self.flush()
+            self._close_files()
+
+    def _close_files(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        self._unmap()
@@ -0,0 +1,102 @@
+import os
+import time
+import threading
+from typing import Dict, List, Optional, Tuple
+
+
+# ── Cross-encoder re-ranking of child candidates (optional, CPU) ──────────────
+# RERANK_MODEL is a local directory or a sentence-transformers model id that is
+# already in the HF cache; it is never downloaded at query time.
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "false").lower() in ("1", "true", "yes")
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", 30))
+RERANK_BUDGET_MS = float(os.getenv("RERANK_BUDGET_MS", 150))
+RERANK_MAX_CHARS = int(os.getenv("RERANK_MAX_CHARS", 1000))
+RERANK_MIN_CANDIDATES = 2
+
+# Weight of the newest batch in the per-pair cost estimate
+COST_SMOOTHING = 0.3
+
+
+class CrossEncoderReranker:
+    """
+    Scores (query, child text) pairs with a small cross-encoder in one batch.
+
+    The budget caps how many candidates get scored: a running estimate of
+    milliseconds per pair (which grows when the CPU is busy) decides how many
+    fit, and the rest keep their retrieval order behind the scored ones.
+    """
+
+    def __init__(self,
+                 model_name: str = RERANK_MODEL,
+                 budget_ms: float = RERANK_BUDGET_MS,
+                 max_chars: int = RERANK_MAX_CHARS,
+                 max_candidates: int = RERANK_CANDIDATES):
+        self.model_name = model_name
+        self.max_candidates = max_candidates
+        self.budget_ms = budget_ms
+        self.max_chars = max_chars
+        self._model = None
+        self._load_failed = False
+        self._load_lock = threading.Lock()
+        self._ms_per_pair: Optional[float] = None
+
+    def _get_model(self):
+        if self._model is not None or self._load_failed:
+            return self._model
+        with self._load_lock:
+            if self._model is None and not self._load_failed:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    print(f"Loading re-rank model: {self.model_name}...", flush=True)
+                    local_only = not os.path.isdir(self.model_name)
+                    self._model = CrossEncoder(self.model_name, device="cpu", local_files_only=local_only)
+                    print("Re-rank model loaded.", flush=True)
+                except Exception as e:
+                    print(f"[RERANK] Model unavailable ({e}) — re-ranking disabled", flush=True)
+                    self._load_failed = True
+        return self._model
+
+    def load(self) -> bool:
+        """Load the model now (e.g. at startup) instead of on the first query."""
+        return self._get_model() is not None
+
+    def rerank(self,
+               query: str,
+               candidates: List[Tuple[str, str]],
+               budget_ms: Optional[float] = None) -> Tuple[Dict[str, float], Dict[str, float]]:
+        """
+        candidates: (child_id, text), best-first. Returns ({child_id: score}
+        for the scored prefix, {"candidates", "scored", "ms"}). Nothing is
+        scored when the model is missing or the budget fits too few pairs.
+        """
+        budget_ms = self.budget_ms if budget_ms is None else budget_ms
+        info = {"candidates": len(candidates), "scored": 0, "ms": 0.0}
+        model = self._get_model()
+        if model is None or not candidates:
+            return {}, info
+
+        n_pairs = len(candidates)
+        if self._ms_per_pair:
+            n_pairs = min(n_pairs, int(budget_ms / self._ms_per_pair))
+        if n_pairs < RERANK_MIN_CANDIDATES:
+            if self._ms_per_pair:
+                # Let the estimate decay so a past spike does not disable re-ranking for good
+                self._ms_per_pair *= 1 - COST_SMOOTHING
+            return {}, info
+
+        batch = candidates[:n_pairs]
+        started = time.perf_counter()
+        scores = model.predict(
+            [(query, text[:self.max_chars]) for _, text in batch],
+            batch_size=n_pairs,
+            show_progress_bar=False
+        )
+        elapsed_ms = (time.perf_counter() - started) * 1000
+
+        per_pair = elapsed_ms / n_pairs
+        self._ms_per_pair = per_pair if self._ms_per_pair is None else (
+            COST_SMOOTHING * per_pair + (1 - COST_SMOOTHING) * self._ms_per_pair
+        )
+        info.update(scored=n_pairs, ms=round(elapsed_ms, 2))
+        return {child_id: float(score) for (child_id, _), score in zip(batch, scores)}, info
@@ -0,0 +1,211 @@
+import os
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+# ── Single-flight: identical concurrent requests share one computation ───────
+# Keys start with the layer name ("hyde", "retrieve", "generate") and carry
+# the repo name and version, the normalized query and the options. A caller
+# whose key is already in flight waits for that computation instead of
+# starting its own; the key is released when it finishes, so this covers only
+# the burst (the answer cache covers what comes after).
+SINGLE_FLIGHT_ENABLED = os.getenv("SINGLE_FLIGHT_ENABLED", "true").lower() in ("1", "true", "yes")
+
+
+def normalize_query(query: str) -> str:
+    """Case and whitespace folded, so "Where is X?" and "where is  x?" coalesce."""
+    return " ".join(query.casefold().split())
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+
+
+class _Broadcast:
+    """
+    One upstream token stream fanned out to every subscriber. A pump thread
+    reads the upstream so no single client drives it; the upstream is closed
+    when the last subscriber leaves.
+    """
+
+    def __init__(self, on_finish: Callable[[], None]):
+        self.cond = threading.Condition()
+        self.source: Optional[Dict[str, Any]] = None
+        self.meta: Optional[Dict[str, Any]] = None
+        self.parts = []
+        self.finished = False
+        self.cancelled = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self._on_finish = on_finish
+
+    def attach(self, source: Dict[str, Any]) -> None:
+        with self.cond:
+            self.source = source
+            self.meta = {k: v for k, v in source.items() if k not in ("tokens", "close")}
+            wanted = self.subscribers > 0
+            self.cond.notify_all()
+        if wanted:
+            threading.Thread(target=self._pump, name="single-flight-stream", daemon=True).start()
+        else:
+            self._finish(close=True)
+
+    def fail(self, error: BaseException) -> None:
+        with self.cond:
+            self.error = error
+        self._finish(close=False)
+
+    def _pump(self) -> None:
+        try:
+            for text in self.source["tokens"]:
+                with self.cond:
+                    if self.cancelled:
+                        break
+                    self.parts.append(text)
+                    self.cond.notify_all()
+        except Exception as e:
+            with self.cond:
+                self.error = e
+        self._finish(close=True)
+
+    def _finish(self, close: bool) -> None:
+        if close:
+            self.source["close"]()
+        with self.cond:
+            self.finished = True
+            self.cond.notify_all()
+        self._on_finish()
+
+    def subscription(self) -> Dict[str, Any]:
+        """The stream as seen by one subscriber: {**meta, "tokens", "close"}."""
+        with self.cond:
+            while self.meta is None and self.error is None:
+                self.cond.wait()
+            if self.meta is None:
+                self._leave()
+                raise self.error
+
+        def tokens():
+            i = 0
+            while True:
+                with self.cond:
+                    while i >= len(self.parts) and not self.finished:
+                        self.cond.wait()
+                    if i < len(self.parts):
+                        text = self.parts[i]
+                        i += 1
+                    elif self.error is not None:
+                        raise self.error
+                    else:
+                        return
+                yield text
+
+        left = []
+
+        def close():
+            if not left:
+                left.append(True)
+                self._leave()
+
+        return {**self.meta, "tokens": tokens(), "close": close}
+
+    def _leave(self) -> None:
+        with self.cond:
+            self.subscribers -= 1
+            last = self.subscribers == 0 and not self.finished
+            if last:
+                self.cancelled = True
+            source = self.source
+        if last and source is not None:
+            source["close"]()   # unblocks the pump's read
+
+
+class SingleFlight:
+    """
+    In-flight request coalescing. do() shares one call's return value (or
+    exception) with every concurrent caller of the same key; stream() does
+    the same for a token stream, replaying the pieces already produced to
+    late joiners.
+    """
+
+    def __init__(self, enabled: bool = SINGLE_FLIGHT_ENABLED):
+        self.enabled = enabled
+        self._calls: Dict[Hashable, _Call] = {}
+        self._streams: Dict[Hashable, _Broadcast] = {}
+        self._lock = threading.Lock()
+        self.leaders: Counter = Counter()     # per layer
+        self.coalesced: Counter = Counter()
+
+    def do(self, key: Tuple, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """(fn()'s value, shared). shared is True when another caller's computation was reused."""
+        if not self.enabled:
+            return fn(), False
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+                self.leaders[key[0]] += 1
+            else:
+                self.coalesced[key[0]] += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.value, True
+
+        try:
+            call.value = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.value, False
+
+    def stream(self, key: Tuple, start: Callable[[], Dict[str, Any]]) -> Tuple[Dict[str, Any], bool]:
+        """
+        start() returns {"tokens", "close", ...}. Returns (subscription,
+        shared): every caller gets its own {"tokens", "close", ...} over the
+        same upstream, and close() only unsubscribes.
+        """
+        if not self.enabled:
+            return start(), False
+        with self._lock:
+            broadcast = self._streams.get(key)
+            leader = broadcast is None or broadcast.cancelled
+            if leader:
+                broadcast = self._streams[key] = _Broadcast(lambda: self._release(key, broadcast))
+                self.leaders[key[0]] += 1
+            else:
+                self.coalesced[key[0]] += 1
+            with broadcast.cond:
+                broadcast.subscribers += 1
+
+        if leader:
+            try:
+                broadcast.attach(start())
+            except BaseException as e:
+                broadcast.fail(e)
+        return broadcast.subscription(), not leader
+
+    def _release(self, key: Tuple, broadcast: _Broadcast) -> None:
+        with self._lock:
+            if self._streams.get(key) is broadcast:
+                del self._streams[key]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled":   self.enabled,
+                "in_flight": len(self._calls) + len(self._streams),
+                "leaders":   dict(self.leaders),
+                "coalesced": dict(self.coalesced),
+            }
@@ -0,0 +1,255 @@
+import os
+import re
+import ast
+import json
+from typing import List, Dict, Any, Optional
+
+
+# ── Symbol definitions extracted at ingest ────────────────────────────────────
+# "Where is X defined" is a table lookup, not a similarity search. Python is
+# parsed with `ast`; other languages use one regex per definition form, and
+# brace languages take the definition's extent from brace balance.
+INDEX_VERSION = 1
+
+_BACKTICK_RE = re.compile(r"`([^`\s]+)`")
+_IDENT_RE = re.compile(r"[A-Za-z_][A-Za-z0-9_]*(?:\.[A-Za-z_][A-Za-z0-9_]*)*")
+
+# Lookup questions are matched whole, with the names masked as "@": "where is
+# @ defined", "which file defines @", "definition of @" and close variants.
+# Anything else in the question ("where is @ called", "how do I find why @
+# fails") means it needs retrieval, not a table lookup.
+_SYMBOL = (r"(?:the\s+)?(?:(?:function|method|class|variable|constant|symbol|type)\s+)?"
+           r"@(?:\s*(?:,|and|, and|or)\s*@)*(?:\s+(?:function|method|class|variable|constant))?")
+_PREFIX = r"(?:(?:can|could)\s+you\s+)?(?:please\s+)?(?:tell\s+me\s+|show\s+me\s+)?"
+_SUFFIX = r"(?:\s+in\s+(?:this|the)\s+(?:repo|repository|codebase|project|code))?"
+_DEFINED = r"(?:defined|declared|implemented)"
+LOOKUP_QUESTIONS = [re.compile(_PREFIX + pattern + _SUFFIX) for pattern in (
+    rf"where\s+(?:is|are)\s+{_SYMBOL}\s+{_DEFINED}",
+    rf"where's\s+{_SYMBOL}\s+{_DEFINED}",
+    rf"(?:in\s+)?(?:which|what)\s+(?:file|module)\s+(?:is|are)\s+{_SYMBOL}\s+{_DEFINED}(?:\s+in)?",
+    rf"(?:which|what)\s+(?:file|module)\s+(?:defines|declares|implements|(?:contains|has)\s+the\s+definition\s+of)\s+{_SYMBOL}",
+    rf"(?:(?:what\s+is|what's|where\s+is|where's|find)\s+)?(?:the\s+)?(?:definition|declaration)s?\s+of\s+{_SYMBOL}",
+)]
+# Usage questions are never lookups, whatever their wording
+_USAGE_RE = re.compile(r"\b(used|uses|using|call(s|ed|ing)?|referenc(e|es|ed|ing)|import(s|ed|ing)?|invok(e|es|ed|ing))\b")
+
+# Regex definitions per extension: (kind, pattern with a `name` group)
+_JS_PATTERNS = [
+    ("function", r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*(?P<name>[A-Za-z_$][\w$]*)"),
+    ("class",    r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+(?P<name>[A-Za-z_$][\w$]*)"),
+    ("function", r"^\s*(?:export\s+)?(?:const|let|var)\s+(?P<name>[A-Za-z_$][\w$]*)\s*=\s*(?:async\s+)?(?:function\b|\([^)]*\)\s*=>|[A-Za-z_$][\w$]*\s*=>)"),
+    ("interface", r"^\s*(?:export\s+)?(?:interface|type|enum)\s+(?P<name>[A-Za-z_$][\w$]*)"),
+]
+_C_FAMILY_PATTERNS = [
+    ("class",    r"^\s*(?:(?:public|private|protected|internal|static|abstract|final|sealed|partial)\s+)*(?:class|interface|struct|enum|record)\s+(?P<name>[A-Za-z_]\w*)"),
+    ("function", r"^\s*(?:(?:public|private|protected|internal|static|virtual|override|final|async|inline)\s+)*[\w<>\[\],:*&\s]+?\s+\*?(?P<name>[A-Za-z_]\w*)\s*\([^;]*\)\s*(?:const\s*)?(?:throws\s+[\w.,\s]+)?\{?\s*$"),
+]
+_REGEX_PATTERNS: Dict[str, List] = {
+    ".js": _JS_PATTERNS, ".jsx": _JS_PATTERNS, ".ts": _JS_PATTERNS, ".tsx": _JS_PATTERNS,
+    ".mjs": _JS_PATTERNS, ".cjs": _JS_PATTERNS,
+    ".java": _C_FAMILY_PATTERNS, ".cs": _C_FAMILY_PATTERNS,
+    ".c": _C_FAMILY_PATTERNS, ".h": _C_FAMILY_PATTERNS, ".cpp": _C_FAMILY_PATTERNS,
+    ".hpp": _C_FAMILY_PATTERNS, ".cc": _C_FAMILY_PATTERNS,
+    ".go": [
+        ("function", r"^func\s+(?:\([^)]*\)\s*)?(?P<name>[A-Za-z_]\w*)"),
+        ("class",    r"^type\s+(?P<name>[A-Za-z_]\w*)\s+(?:struct|interface)"),
+    ],
+    ".rs": [
+        ("function", r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:async\s+)?fn\s+(?P<name>[A-Za-z_]\w*)"),
+        ("class",    r"^\s*(?:pub(?:\([^)]*\))?\s+)?(?:struct|enum|trait)\s+(?P<name>[A-Za-z_]\w*)"),
+    ],
+    ".rb": [
+        ("function", r"^\s*def\s+(?:self\.)?(?P<name>[A-Za-z_]\w*[?!]?)"),
+        ("class",    r"^\s*(?:class|module)\s+(?P<name>[A-Z]\w*)"),
+    ],
+    ".php": [
+        ("function", r"^\s*(?:(?:public|private|protected|static|final|abstract)\s+)*function\s+(?P<name>[A-Za-z_]\w*)"),
+        ("class",    r"^\s*(?:(?:abstract|final)\s+)?(?:class|interface|trait)\s+(?P<name>[A-Za-z_]\w*)"),
+    ],
+    ".sql": [
+        ("table",    r"(?i)^\s*create\s+(?:or\s+replace\s+)?(?:table|view|function|procedure)\s+(?:if\s+not\s+exists\s+)?(?P<name>[A-Za-z_][\w.]*)"),
+    ],
+}
+MAX_LINE_LENGTH = 300  # longer lines (minified code, data) are not scanned
+_CONTROL_WORDS = {"if", "for", "while", "switch", "catch", "return", "else", "new", "sizeof", "elif"}
+_COMPILED = {ext: [(kind, re.compile(p)) for kind, p in patterns] for ext, patterns in _REGEX_PATTERNS.items()}
+
+
+def extract_symbols(text: str, filename: str) -> List[Dict[str, Any]]:
+    """
+    Definitions in one file as {"name", "kind", "line_start", "line_end"}
+    (1-based, inclusive). Methods are listed as "Class.method".
+    """
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".py":
+        try:
+            return _python_symbols(text)
+        except (SyntaxError, ValueError):
+            return []
+    patterns = _COMPILED.get(ext)
+    return _regex_symbols(text, patterns) if patterns else []
+
+
+def _python_symbols(text: str) -> List[Dict[str, Any]]:
+    symbols = []
+
+    def visit(nodes, prefix: str) -> None:
+        for node in nodes:
+            if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                kind = "class" if isinstance(node, ast.ClassDef) else ("method" if prefix else "function")
+                start = min([node.lineno] + [d.lineno for d in node.decorator_list])
+                symbols.append({
+                    "name": prefix + node.name,
+                    "kind": kind,
+                    "line_start": start,
+                    "line_end": getattr(node, "end_lineno", None) or node.lineno,
+                })
+                if isinstance(node, ast.ClassDef):
+                    visit(node.body, prefix + node.name + ".")
+            elif not prefix and isinstance(node, (ast.Assign, ast.AnnAssign)):
+                # Module-level constants (MAX_UPLOAD_SIZE = ...)
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    if isinstance(target, ast.Name) and target.id.isupper():
+                        symbols.append({
+                            "name": target.id,
+                            "kind": "constant",
+                            "line_start": node.lineno,
+                            "line_end": getattr(node, "end_lineno", None) or node.lineno,
+                        })
+
+    visit(ast.parse(text).body, "")
+    return symbols
+
+
+def _regex_symbols(text: str, patterns) -> List[Dict[str, Any]]:
+    lines = text.splitlines()
+    symbols = []
+    for number, line in enumerate(lines, start=1):
+        if len(line) > MAX_LINE_LENGTH:
+            continue
+        for kind, pattern in patterns:
+            match = pattern.match(line)
+            if match and match.group("name") not in _CONTROL_WORDS:
+                symbols.append({
+                    "name": match.group("name"),
+                    "kind": kind,
+                    "line_start": number,
+                    "line_end": _brace_end(lines, number - 1),
+                })
+                break
+    return symbols
+
+
+def _brace_end(lines: List[str], start: int, max_lines: int = 2000) -> int:
+    """1-based last line of the block opened at or after lines[start] (the start line if none opens)."""
+    depth = 0
+    opened = False
+    for i in range(start, min(len(lines), start + max_lines)):
+        for char in lines[i]:
+            if char == "{":
+                depth += 1
+                opened = True
+            elif char == "}":
+                depth -= 1
+        if opened and depth <= 0:
+            return i + 1
+        if not opened and (lines[i].rstrip().endswith(";") or i - start >= 3):
+            return start + 1
+    return start + 1
+
+
+def _mask_symbols(query: str):
+    """(query with each code-like name replaced by "@", the names in order)."""
+    names = []
+
+    def backticked(match):
+        names.append(match.group(1).strip("()"))
+        return "@"
+
+    def identifier(match):
+        ident = match.group(0)
+        if "_" in ident or "." in ident or any(c.isupper() for c in ident[1:]):
+            names.append(ident)
+            return "@"
+        return ident
+
+    masked = _IDENT_RE.sub(identifier, _BACKTICK_RE.sub(backticked, query))
+    return masked.replace("@()", "@"), names
+
+
+def query_symbols(query: str) -> List[str]:
+    """
+    Names in the query that look like code: `backticked` text, or
+    identifiers with an underscore, a dot or an inner capital (extract_zip_file,
+    ParentChildRetriever, vector_store.query). Plain words are not looked up.
+    """
+    return list(dict.fromkeys(n for n in _mask_symbols(query)[1] if n))
+
+
+def is_lookup_question(query: str) -> bool:
+    """
+    True when the query only asks where named code is defined ("where is
+    `extract_zip_file` defined?", "which file defines ParentChildRetriever").
+    """
+    masked, names = _mask_symbols(query)
+    if not names:
+        return False
+    text = " ".join(masked.casefold().split()).rstrip("?.! ")
+    if _USAGE_RE.search(text):
+        return False
+    return any(pattern.fullmatch(text) for pattern in LOOKUP_QUESTIONS)
+
+
+class SymbolIndex:
+    """
+    Definitions of one repository, keyed by name. Qualified method names
+    ("Class.method") are also reachable by their short name, and lookups
+    fall back to a case-insensitive match.
+    """
+
+    def __init__(self, definitions: List[Dict[str, Any]]):
+        self.definitions = definitions
+        self._by_name: Dict[str, List[int]] = {}
+        self._by_lower: Dict[str, List[int]] = {}
+        for row, definition in enumerate(definitions):
+            name = definition["name"]
+            keys = {name, name.rsplit(".", 1)[-1]}
+            for key in keys:
+                self._by_name.setdefault(key, []).append(row)
+                self._by_lower.setdefault(key.lower(), []).append(row)
+
+    @classmethod
+    def build(cls, files: List[Dict[str, Any]]) -> "SymbolIndex":
+        """files: {"text", "filename", "filepath", "parent_id"} per parent document."""
+        definitions = []
+        for file in files:
+            for symbol in extract_symbols(file["text"], file["filename"]):
+                symbol.update(filename=file["filename"], filepath=file["filepath"], parent_id=file["parent_id"])
+                definitions.append(symbol)
+        return cls(definitions)
+
+    def __len__(self) -> int:
+        return len(self.definitions)
+
+    def lookup(self, name: str) -> List[Dict[str, Any]]:
+        """Definitions of `name` (exact first, else case-insensitive), classes before functions."""
+        rows = self._by_name.get(name) or self._by_lower.get(name.lower()) or []
+        found = [self.definitions[r] for r in rows]
+        return sorted(found, key=lambda d: (d["name"] != name, d["kind"] != "class"))
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump({"version": INDEX_VERSION, "definitions": self.definitions}, f)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional["SymbolIndex"]:
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION:
+            return None
+        return cls(data["definitions"])
@@ -276,9 +276,14 @@
 #         return self.repository_metadata[repo_name]
 import os
 import sys
+import copy
 import json
+import time
+import threading
 import traceback
-from typing import List, Dict, Tuple, Any
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import List, Dict, Tuple, Any, Optional, Iterator
 from pathlib import Path
 
 from vector_store import VectorStore
@@ -292,18 +297,39 @@ from utils import (
 # New Advanced RAG Modules
 from rag.parent_child_retriever import ParentChildRetriever
 from rag.hyde import HyDE
+from rag.metadata_filter import build_where, is_empty_where
+from rag.symbol_index import is_lookup_question, query_symbols
+from rag.answer_cache import SemanticAnswerCache
+from rag.single_flight import SingleFlight, normalize_query
 from security.jailbreak_guard import JailbreakGuard
 
+# ── HyDE runs beside the plain-query search, not in front of it ──────────────
+# The plain search starts at once. If the expansion arrives within
+# HYDE_DEADLINE_MS of the request start, a second search runs on it and the
+# two result lists are fused; otherwise the plain results are served and the
+# expansion is discarded. HYDE_DEADLINE_MS=0 turns HyDE off.
+HYDE_DEADLINE_MS = float(os.getenv('HYDE_DEADLINE_MS', 2000))
+HYDE_WORKERS = int(os.getenv('HYDE_WORKERS', 4))
+
+# ── "Where is X defined" straight from the symbol table ──────────────────────
+SYMBOL_LOOKUP = os.getenv('SYMBOL_LOOKUP', 'true').lower() in ('1', 'true', 'yes')
+SYMBOL_MAX_DEFINITIONS = 5   # per name
+SYMBOL_SNIPPET_LINES = 12    # lines of each definition quoted in the answer
+
 class SimpleTextSplitter:
     def __init__(self, chunk_size: int = 800, chunk_overlap: int = 100):
         self.chunk_size = chunk_size
         self.chunk_overlap = chunk_overlap
 
     def split_text(self, text: str) -> List[str]:
+        return [chunk for chunk, _, _ in self.split_text_with_offsets(text)]
+
+    def split_text_with_offsets(self, text: str) -> List[Tuple[str, int, int]]:
+        """Chunks as (text, start_char, end_char) — offsets into `text` of the stripped chunk."""
         if not text or not text.strip():
             return []
         if len(text) <= self.chunk_size:
-            return [text.strip()]
+            return [_stripped_span(text, 0, len(text))]
 
         chunks = []
         text_len = len(text)
@@ -323,8 +349,8 @@ class SimpleTextSplitter:
                 if boundary > start:
                     end = boundary
 
-            chunk = text[start:end].strip()
-            if chunk:
+            chunk = _stripped_span(text, start, end)
+            if chunk[0]:
                 chunks.append(chunk)
 
             next_start = end - self.chunk_overlap
@@ -334,7 +360,14 @@ class SimpleTextSplitter:
             if start >= text_len:
                 break
 
-        return chunks if chunks else ([text.strip()] if text.strip() else [])
+        return chunks if chunks else [_stripped_span(text, 0, len(text))]
+
+
+def _stripped_span(text: str, start: int, end: int) -> Tuple[str, int, int]:
+    raw = text[start:end]
+    chunk = raw.strip()
+    chunk_start = start + (len(raw) - len(raw.lstrip()))
+    return chunk, chunk_start, chunk_start + len(chunk)
 
 
 class RAGPipeline:
@@ -348,7 +381,19 @@ class RAGPipeline:
         self.hyde = HyDE()
         self.jailbreak_guard = JailbreakGuard()
 
-    def process_repository(self, zip_path: str, repo_name: str, progress_callback=None) -> Dict[str, Any]:
+        # Background HyDE calls, and how each retrieval was served
+        self._hyde_executor = ThreadPoolExecutor(max_workers=HYDE_WORKERS, thread_name_prefix="hyde")
+        self.retrieval_paths: Counter = Counter()
+        self._paths_lock = threading.Lock()
+
+        # Chat answers reused for rephrased questions; invalidated on re-index
+        self.answer_cache = SemanticAnswerCache()
+
+        # Identical concurrent HyDE / retrieval / generation calls share one run
+        self.single_flight = SingleFlight()
+
+    def process_repository(self, zip_path: str, repo_name: str, progress_callback=None,
+                           backend: Optional[str] = None, hnsw_preset: Optional[str] = None) -> Dict[str, Any]:
         import time
         import gc
         extract_dir = None
@@ -362,6 +407,8 @@ class RAGPipeline:
 
         try:
             total_start = time.time()
+            # Answers from the previous upload must not outlive it
+            self.answer_cache.invalidate(repo_name)
 
             # Step 1: Extract ZIP
             print(f"\n{'='*60}", flush=True)
@@ -466,7 +513,9 @@ class RAGPipeline:
             _cb(f'Embedding {len(chunks)} children...', 80)
             step_start = time.time()
             try:
-                self.parent_child_retriever.store_child_embeddings(chunks, metadatas, repo_name, progress_callback=_cb)
+                ingestion = self.parent_child_retriever.store_child_embeddings(
+                    chunks, metadatas, repo_name, progress_callback=_cb, backend=backend, hnsw_preset=hnsw_preset
+                )
                 print(f"  ✓ Embeddings created and stored in {time.time() - step_start:.1f}s", flush=True)
             except Exception as e:
                 print(f"  ✗ Embedding/storage FAILED: {str(e)}", flush=True)
@@ -478,6 +527,12 @@ class RAGPipeline:
             print(f"\n{'='*60}", flush=True)
             print(f"  ✓ COMPLETED in {total_time:.1f}s", flush=True)
             print(f"  Files: {len(files)} | Children: {len(chunks)}", flush=True)
+            if ingestion:
+                print(f"  Ingest ({ingestion['mode']}): embed {ingestion['embed_seconds']}s | "
+                      f"store {ingestion['store_seconds']}s | wall {ingestion['wall_seconds']}s | "
+                      f"overlap {ingestion['overlap_seconds']}s ({ingestion['overlap_ratio']:.0%})", flush=True)
+                if ingestion['failed_docs']:
+                    print(f"  Failed: {ingestion['failed_docs']} docs in {ingestion['failed_batches']} batches", flush=True)
             print(f"{'='*60}\n", flush=True)
             _cb(f'Done! {len(files)} files -> {len(chunks)} children', 99)
 
@@ -492,6 +547,7 @@ class RAGPipeline:
                 "repo_name": repo_name,
                 "file_count": len(files),
                 "chunk_count": len(chunks),
+                "ingestion": ingestion,
                 "message": f"Successfully processed {len(files)} files into {len(chunks)} children chunks"
             }
 
@@ -501,67 +557,360 @@ class RAGPipeline:
             sys.stdout.flush()
             raise Exception(f"Pipeline error: {str(e)}")
         finally:
+            # A failed rebuild leaves its staged parents behind — the old ones stay live
+            self.parent_child_retriever.discard_staged(repo_name)
+            # Again at the end: drops answers generated while the index was rebuilt
+            self.answer_cache.invalidate(repo_name)
             if extract_dir and os.path.exists(extract_dir):
                 print(f"  [CLEANUP] Removing extracted files...", flush=True)
                 cleanup_directory(extract_dir)
                 print(f"  [CLEANUP] Done", flush=True)
 
-    def retrieve(self, query: str, n_results: int = 5) -> Dict[str, Any]:
+    def retrieve(self,
+                 query: str,
+                 n_results: int = 5,
+                 repo_name: Optional[str] = None,
+                 filters: Optional[Dict[str, Any]] = None,
+                 adaptive: Optional[bool] = None,
+                 rerank: Optional[bool] = None,
+                 mmr: Optional[bool] = None,
+                 mmr_lambda: Optional[float] = None,
+                 hyde: bool = True,
+                 query_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
         """
         Retrive context for the given query using the Advanced RAG flow:
         1. Jailbreak Guard (blocks jailbreak + off-topic queries)
         2. HyDE
         3. Parent-Child retrieval
+
+        repo_name selects the repository; defaults to the last uploaded one.
+        filters: normalized path/extension/language filters (rag.metadata_filter).
+        adaptive: over-fetch until n_results distinct files (None = ADAPTIVE_RETRIEVAL).
+        rerank: cross-encoder re-ranking of the candidates (None = RERANK_ENABLED).
+        mmr / mmr_lambda: diversify the files by MMR (None = MMR_ENABLED / MMR_LAMBDA).
+        hyde: False skips the HyDE expansion (no LLM call) for this query.
+        query_embedding: the query's vector, when the caller already embedded it.
         """
         try:
             # 1. Jailbreak + Off-topic Check
             if not self.jailbreak_guard.is_safe_query(query):
-                reason = self.jailbreak_guard.get_block_reason(query)
-                print(f"[SECURITY] Query blocked — {reason}: '{query}'", flush=True)
-
-                # Off-topic vs jailbreak ke liye alag messages
-                if "off-topic" in reason.lower():
-                    block_msg = (
-                        "⚠️ I can only answer questions about the uploaded code repository. "
-                        "Please ask something related to the codebase — like file structure, "
-                        "functions, classes, logic, or architecture."
-                    )
-                else:
-                    block_msg = (
-                        "🚫 This query has been blocked by the security policy. "
-                        "Please ask a valid question about the uploaded code."
-                    )
-
                 return {
-                    "error": block_msg,
+                    "error": self._block_message(query),
                     "results": []
                 }
             
-            # 2. HyDE Expansion
-            print(f"[HyDE] Expanding query...", flush=True)
-            expanded_query = self.hyde.generate_hypothetical_answer(query)
-            
-            # 3. Parent-Child Retrieval
-            repo_name = self.vector_store.current_repo
+            repo_name = repo_name or self.vector_store.current_repo
             if not repo_name:
                 raise ValueError("No active repository to query against.")
-                
+
+            where = None
+            if filters:
+                where = build_where(filters, known_paths=lambda: self.vector_store.list_filepaths(repo_name))
+                print(f"[RETRIEVE] Metadata filter: {where}", flush=True)
+                if is_empty_where(where):
+                    # Glob matched no files — skip HyDE and search entirely
+                    return {"status": "success", "query": query, "results": [], "filters": filters}
+
+            # 2 + 3. Plain-query retrieval, with HyDE expansion racing beside it
             print(f"[RETRIEVE] Fetching parent contexts for repo {repo_name}...", flush=True)
-            retrieval_result = self.parent_child_retriever.retrieve_parent_context(
-                query=expanded_query, 
-                repo_name=repo_name, 
-                n_results=n_results
+            retrieval_kwargs = dict(
+                repo_name=repo_name, n_results=n_results, lexical_query=query, where=where,
+                adaptive=adaptive, rerank=rerank, mmr=mmr, mmr_lambda=mmr_lambda
             )
-            
+            # Concurrent duplicates (same repo version, query and options) wait on one run
+            flight_key = ("retrieve", self.repo_version(repo_name), normalize_query(query),
+                          json.dumps(filters, sort_keys=True), n_results, adaptive, rerank, mmr, mmr_lambda, hyde)
+            shared_result, shared = self.single_flight.do(
+                flight_key, lambda: self._retrieve_with_hyde(query, retrieval_kwargs, hyde=hyde,
+                                                             query_embedding=query_embedding)
+            )
+            # Every caller (the leader too) gets its own copy: results and spans are edited downstream
+            retrieval_result = copy.deepcopy(shared_result)
+            if shared:
+                retrieval_result["coalesced"] = True
+
             # Wrap the actual query back onto the results directly so the caller has it
             retrieval_result["query"] = query
+            if filters:
+                retrieval_result["filters"] = filters
             return retrieval_result
 
         except Exception as e:
             print(f"[RAG] Retrieval error: {str(e)}", flush=True)
             return {"error": f"Retrieval failed: {str(e)}", "results": []}
 
+    def iter_retrieve(self,
+                      query: str,
+                      n_results: int = 5,
+                      repo_name: Optional[str] = None,
+                      filters: Optional[Dict[str, Any]] = None,
+                      rerank: Optional[bool] = None,
+                      hyde: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        retrieve() as a stream, for callers that show results as they come:
+        first the response without "results" (or {"error"}), then one result
+        per file as its text is read. Without HyDE the files are read one by
+        one after ranking; with it, the fused list needs both searches
+        finished, so the results follow the buffered retrieve().
+        """
+        if hyde and HYDE_DEADLINE_MS > 0:
+            result = self.retrieve(query, n_results=n_results, repo_name=repo_name, filters=filters,
+                                   rerank=rerank, hyde=True)
+            results = result.pop("results", [])
+            yield result
+            if not result.get("error"):
+                yield from results
+            return
+
+        try:
+            if not self.jailbreak_guard.is_safe_query(query):
+                yield {"error": self._block_message(query)}
+                return
+
+            repo_name = repo_name or self.vector_store.current_repo
+            if not repo_name:
+                raise ValueError("No active repository to query against.")
+
+            where = None
+            if filters:
+                where = build_where(filters, known_paths=lambda: self.vector_store.list_filepaths(repo_name))
+                if is_empty_where(where):
+                    yield {"status": "success", "query": query, "filters": filters}
+                    return
+        except Exception as e:
+            print(f"[RAG] Retrieval error: {str(e)}", flush=True)
+            yield {"error": f"Retrieval failed: {str(e)}"}
+            return
+
+        stream = self.parent_child_retriever.iter_parent_context(
+            query, repo_name, n_results=n_results, lexical_query=query, where=where, rerank=rerank
+        )
+        try:
+            head = next(stream)
+            if not head.get("error"):
+                with self._paths_lock:
+                    self.retrieval_paths["plain:disabled"] += 1
+                head["retrieval_path"] = "plain:disabled"
+                if filters:
+                    head["filters"] = filters
+            yield head
+            if not head.get("error"):
+                yield from stream
+        finally:
+            stream.close()
+
+    def retrieve_many(self,
+                      queries: List[str],
+                      n_results: int = 5,
+                      repo_name: Optional[str] = None,
+                      filters: Optional[Dict[str, Any]] = None,
+                      adaptive: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Retrieve for a batch of queries against one repository: every query
+        passes the Jailbreak Guard, then the allowed ones are embedded in one
+        encoder batch and searched together (no HyDE — one LLM call per query
+        would dominate). "results" holds one retrieval result per query, in
+        order; blocked queries get an "error" entry.
+        """
+        try:
+            repo_name = repo_name or self.vector_store.current_repo
+            if not repo_name:
+                raise ValueError("No active repository to query against.")
+
+            results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+            allowed = []
+            for i, query in enumerate(queries):
+                if self.jailbreak_guard.is_safe_query(query):
+                    allowed.append(i)
+                else:
+                    results[i] = {"error": self._block_message(query), "query": query, "results": []}
+
+            where = None
+            if filters:
+                where = build_where(filters, known_paths=lambda: self.vector_store.list_filepaths(repo_name))
+                if is_empty_where(where):
+                    for i in allowed:
+                        results[i] = {"status": "success", "query": queries[i], "results": []}
+                    allowed = []
+
+            started = time.perf_counter()
+            batch = self.parent_child_retriever.retrieve_many(
+                [queries[i] for i in allowed], repo_name, n_results=n_results, where=where, adaptive=adaptive
+            )
+            for i, result in zip(allowed, batch):
+                result["query"] = queries[i]
+                results[i] = result
+            print(f"[RETRIEVE] Batch of {len(allowed)}/{len(queries)} queries for repo {repo_name} "
+                  f"in {(time.perf_counter() - started) * 1000:.0f} ms", flush=True)
+
+            response = {"status": "success", "repository": repo_name, "results": results}
+            if filters:
+                response["filters"] = filters
+            return response
+
+        except Exception as e:
+            print(f"[RAG] Batch retrieval error: {str(e)}", flush=True)
+            return {"error": f"Batch retrieval failed: {str(e)}", "results": []}
+
+    def lookup_symbol(self, query: str, repo_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        Answer a definition lookup ("where is `extract_zip_file` defined",
+        "which file defines ParentChildRetriever") from the repo's symbol
+        table, without HyDE, embedding or vector search. Returns None when the
+        query is not such a lookup, names no known symbol, or is blocked by
+        the Jailbreak Guard, so the caller falls back to retrieve().
+        """
+        if not SYMBOL_LOOKUP or not is_lookup_question(query):
+            return None
+        names = query_symbols(query)
+        repo_name = repo_name or self.vector_store.current_repo
+        if not names or not repo_name or not self.jailbreak_guard.is_safe_query(query):
+            return None
+
+        retriever = self.parent_child_retriever
+        symbol_index = retriever.get_symbol_index(repo_name)
+        if symbol_index is None:
+            return None
+        found = {name: symbol_index.lookup(name)[:SYMBOL_MAX_DEFINITIONS] for name in names}
+        found = {name: definitions for name, definitions in found.items() if definitions}
+        if not found:
+            return None
+
+        lines = []
+        results = []
+        with retriever.open_parent_store(repo_name) as parent_store:
+            for name, definitions in found.items():
+                for definition in definitions:
+                    text = parent_store.read(definition["parent_id"]) or ""
+                    file_lines = text.splitlines(keepends=True)
+                    start = sum(len(line) for line in file_lines[:definition["line_start"] - 1])
+                    end = start + sum(len(line) for line in file_lines[definition["line_start"] - 1:definition["line_end"]])
+                    snippet = "".join(
+                        file_lines[definition["line_start"] - 1:definition["line_end"]][:SYMBOL_SNIPPET_LINES]
+                    ).rstrip()
+
+                    lines.append(f"`{definition['name']}` ({definition['kind']}) is defined in "
+                                 f"`{definition['filepath']}`, lines {definition['line_start']}–{definition['line_end']}:")
+                    lines.append(f"```\n{snippet}\n```")
+                    if not any(r["source"] == definition["filepath"] for r in results):
+                        results.append({
+                            "chunk":     text,
+                            "source":    definition["filepath"],
+                            "filename":  definition["filename"],
+                            "relevance": 1.0,
+                            "match":     "symbol",
+                            "spans":     [[start, end]],
+                        })
+        print(f"[SYMBOL] Answered {list(found)} from the symbol table (repo={repo_name})", flush=True)
+
+        return {
+            "status":  "success",
+            "query":   query,
+            "answer":  "\n\n".join(lines),
+            "symbols": [dict(d) for definitions in found.values() for d in definitions],
+            "results": results,
+        }
+
+    def repo_version(self, repo_name: str) -> Tuple[str, int, int]:
+        """
+        The repo name and the answer cache's generation, which changes whenever
+        the repo is re-indexed, imported or deleted. Generations of different
+        repos can be equal, so keys built from this must keep the name.
+        """
+        return (repo_name, *self.answer_cache.generation(repo_name))
+
+    def _block_message(self, query: str) -> str:
+        """User-facing message for a query the Jailbreak Guard rejected (logs the reason)."""
+        reason = self.jailbreak_guard.get_block_reason(query)
+        print(f"[SECURITY] Query blocked — {reason}: '{query}'", flush=True)
+
+        # Off-topic vs jailbreak ke liye alag messages
+        if "off-topic" in reason.lower():
+            return (
+                "⚠️ I can only answer questions about the uploaded code repository. "
+                "Please ask something related to the codebase — like file structure, "
+                "functions, classes, logic, or architecture."
+            )
+        return (
+            "🚫 This query has been blocked by the security policy. "
+            "Please ask a valid question about the uploaded code."
+        )
+
+    def _retrieve_with_hyde(self, query: str, retrieval_kwargs: Dict[str, Any], hyde: bool = True,
+                            query_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """
+        Search with the plain query while HyDE expands it in the background.
+        Records the path taken in the result ("retrieval_path") and in
+        self.retrieval_paths:
+          hyde+plain      expansion arrived in time; both result lists fused
+          plain:timeout   expansion missed the deadline and was discarded
+          plain:failed    HyDE returned nothing beyond the query
+          plain:disabled  HYDE_DEADLINE_MS=0 or hyde=False
+        query_embedding (the plain query's vector) spares the plain search an encoder pass.
+        """
+        started = time.perf_counter()
+        future = None
+        if hyde and HYDE_DEADLINE_MS > 0:
+            future = self._hyde_executor.submit(self._expand_query, query)
+
+        retriever = self.parent_child_retriever
+        plain_result = retriever.retrieve_parent_context(query=query, query_embedding=query_embedding,
+                                                         **retrieval_kwargs)
+
+        expanded = None
+        if future is None:
+            path = "plain:disabled"
+        else:
+            remaining = HYDE_DEADLINE_MS / 1000 - (time.perf_counter() - started)
+            try:
+                expanded = future.result(timeout=max(0.0, remaining))
+                path = "hyde+plain" if expanded and expanded.strip() != query.strip() else "plain:failed"
+            except FutureTimeout:
+                future.cancel()  # only stops it while still queued; a running call is ignored
+                path = "plain:timeout"
+            except Exception as e:
+                print(f"[HyDE] Expansion error: {e}", flush=True)
+                path = "plain:failed"
+
+        result = plain_result
+        if path == "hyde+plain" and not plain_result.get("error"):
+            hyde_result = retriever.retrieve_parent_context(query=expanded, **retrieval_kwargs)
+            if not hyde_result.get("error"):
+                result = retriever.fuse_results([hyde_result, plain_result], retrieval_kwargs["n_results"])
+
+        print(f"[HyDE] Served by {path} in {(time.perf_counter() - started) * 1000:.0f} ms", flush=True)
+        with self._paths_lock:
+            self.retrieval_paths[path] += 1
+        result["retrieval_path"] = path
+        return result
+
+    def _expand_query(self, query: str) -> str:
+        """HyDE expansion; the same question asked concurrently is expanded once."""
+        def hypothetical() -> str:
+            # Only the generated part is shared: followers may word the query differently
+            expanded = self.hyde.generate_hypothetical_answer(query)
+            return expanded[len(query):].strip() if expanded.startswith(query) else expanded.strip()
+
+        answer, _ = self.single_flight.do(("hyde", normalize_query(query)), hypothetical)
+        return f"{query}\n{answer}" if answer else query
+
     def get_repository_summary(self, repo_name: str) -> Dict[str, Any]:
-        if repo_name not in self.repository_metadata:
-            return {"status": "Repository not found"}
-        return self.repository_metadata[repo_name]
\ No newline at end of file
+        """
+        Counts come from the vector store's cached collection stats, so the
+        summary survives restarts and snapshot imports; the ingest-time file
+        list is added when this process indexed the repo.
+        """
+        stats = self.vector_store.collection_stats(repo_name)
+        if stats is None:
+            if repo_name not in self.repository_metadata:
+                return {"status": "Repository not found"}
+            return self.repository_metadata[repo_name]
+
+        summary = dict(self.repository_metadata.get(repo_name) or {})
+        summary.setdefault("file_count", len(stats["files"]))
+        summary.setdefault("files", sorted(stats["files"]))
+        summary["chunk_count"] = stats["count"]
+        summary["chunks_per_file"] = stats["files"]
+        summary["embedding_dimension"] = stats["dimension"]
+        summary["last_modified"] = stats["last_modified"]
+        return summary
\ No newline at end of file
@@ -0,0 +1,320 @@
+"""
+snapshot.py — Portable repository index snapshots
+══════════════════════════════════════════════════════════════
+One processed repo = one versioned tar archive (optionally gzipped):
+
+  manifest.json      format/version, repo, embedding model, counts,
+                     sha256 of every payload file, repository_metadata
+  vectors.npy        float32 (N x dim) child embeddings
+  sidecar.json       ids / documents / metadatas in row order
+  lexical.npz/.json  BM25 index (if the repo has one)
+  chunks.json        chunk dump used by /api/workflow (if present)
+  symbols.json       symbol definition table (if the repo has one)
+  parents/<id>.txt   parent documents
+
+Import never re-embeds: the numpy backend adopts vectors.npy as-is and
+memory-maps it; Chroma bulk-loads the stored vectors. Index once on a big
+box, copy the archive, import on each query node.
+
+Usage (from backend/, uses VECTOR_STORE_PATH like the server):
+  python snapshot.py export CodeGenius snapshots/CodeGenius.cgsnap
+  python snapshot.py import snapshots/CodeGenius.cgsnap [--repo NAME] [--backend numpy]
+══════════════════════════════════════════════════════════════
+"""
+
+import os
+import io
+import json
+import time
+import shutil
+import hashlib
+import tarfile
+import tempfile
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional
+
+from rag.symbol_index import SymbolIndex
+from vector_store import staging_name
+
+
+SNAPSHOT_FORMAT = "codegenius-snapshot"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_EXTENSION = ".cgsnap"
+
+MANIFEST_FILE = "manifest.json"
+PARENTS_PREFIX = "parents/"
+# Payload files in archive order (the big ones first, so import streams them early)
+PAYLOAD_FILES = ("vectors.npy", "sidecar.json", "lexical.npz", "lexical.json", "chunks.json", "symbols.json")
+
+CHUNKS_DIR = os.path.join(os.path.dirname(__file__), "chunks")
+_COPY_BUFFER = 1024 * 1024
+
+
+# ══════════════════════════════════════════════════════════════
+# HELPERS
+# ══════════════════════════════════════════════════════════════
+
+def _sha256_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(_COPY_BUFFER), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _valid_name(name: str) -> bool:
+    """Repo / parent ids become file names — refuse anything path-like."""
+    return bool(name) and name not in (".", "..") and os.path.basename(name) == name and "\\" not in name
+
+
+def _add_bytes(tar: tarfile.TarFile, name: str, data: bytes) -> None:
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    info.mtime = int(time.time())
+    tar.addfile(info, io.BytesIO(data))
+
+
+# ══════════════════════════════════════════════════════════════
+# EXPORT
+# ══════════════════════════════════════════════════════════════
+
+def export_snapshot(pipeline, repo_name: str, archive_path: str, compress: bool = False) -> Dict[str, Any]:
+    """
+    Write repo_name's vectors, BM25 index, chunks and parents to archive_path.
+    compress=True gzips the archive (smaller, slower to import). Returns the manifest.
+    """
+    vector_store = pipeline.vector_store
+    retriever = pipeline.parent_child_retriever
+    if not vector_store.has_repository(repo_name):
+        raise ValueError(f"Repository '{repo_name}' not found")
+
+    started = time.time()
+    staging = tempfile.mkdtemp(prefix=f".snapshot-{repo_name}-", dir=vector_store.persist_directory)
+    try:
+        vectors = vector_store.export_vectors(repo_name, staging)
+
+        lexical_prefix = retriever.lexical_index_prefix(repo_name)
+        for ext in (".npz", ".json"):
+            if os.path.exists(lexical_prefix + ext):
+                shutil.copyfile(lexical_prefix + ext, os.path.join(staging, "lexical" + ext))
+        chunks_path = os.path.join(CHUNKS_DIR, f"{repo_name}.json")
+        if os.path.exists(chunks_path):
+            shutil.copyfile(chunks_path, os.path.join(staging, "chunks.json"))
+        symbols_path = retriever.symbol_index_path(repo_name)
+        if os.path.exists(symbols_path):
+            shutil.copyfile(symbols_path, os.path.join(staging, "symbols.json"))
+
+        payload = [name for name in PAYLOAD_FILES if os.path.exists(os.path.join(staging, name))]
+        with retriever.open_parent_store(repo_name) as parent_store:
+            parent_ids = parent_store.list_ids()
+
+            manifest = {
+                "format":          SNAPSHOT_FORMAT,
+                "version":         SNAPSHOT_VERSION,
+                "repo_name":       repo_name,
+                "created_at":      datetime.now(timezone.utc).isoformat(),
+                "embedding_model": vector_store.embedding_engine.model_name,
+                "dimension":       vectors["dimension"],
+                "count":           vectors["count"],
+                "backend":         vectors["backend"],
+                "hnsw":            vectors["hnsw"],
+                "parent_count":    len(parent_ids),
+                "files": {
+                    name: {
+                        "bytes":  os.path.getsize(os.path.join(staging, name)),
+                        "sha256": _sha256_file(os.path.join(staging, name)),
+                    }
+                    for name in payload
+                },
+                "repository_metadata": pipeline.repository_metadata.get(repo_name),
+            }
+
+            os.makedirs(os.path.dirname(os.path.abspath(archive_path)), exist_ok=True)
+            tmp_path = archive_path + ".tmp"
+            with tarfile.open(tmp_path, "w:gz" if compress else "w") as tar:
+                # Manifest first so import can validate before reading any payload
+                _add_bytes(tar, MANIFEST_FILE, json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8"))
+                for name in payload:
+                    tar.add(os.path.join(staging, name), arcname=name)
+                for parent_id in parent_ids:
+                    content = parent_store.read(parent_id, cached=False)
+                    if content is not None:
+                        _add_bytes(tar, f"{PARENTS_PREFIX}{parent_id}.txt", content.encode("utf-8"))
+            os.replace(tmp_path, archive_path)
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+
+    print(f"  [SNAPSHOT] Exported '{repo_name}' ({manifest['count']} vectors, {len(parent_ids)} parents) "
+          f"-> {archive_path} in {time.time() - started:.1f}s", flush=True)
+    return manifest
+
+
+# ══════════════════════════════════════════════════════════════
+# IMPORT
+# ══════════════════════════════════════════════════════════════
+
+def read_manifest(tar: tarfile.TarFile) -> Dict[str, Any]:
+    """Read and validate the manifest (must be the archive's first member)."""
+    first = tar.next()
+    if first is None or first.name != MANIFEST_FILE:
+        raise ValueError("Not a CodeGenius snapshot: manifest.json must come first")
+    manifest = json.load(tar.extractfile(first))
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Not a CodeGenius snapshot (format={manifest.get('format')!r})")
+    if manifest.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"Unsupported snapshot version {manifest.get('version')} (this build reads {SNAPSHOT_VERSION})")
+    return manifest
+
+
+def peek_manifest(archive_path: str) -> Dict[str, Any]:
+    """Validated manifest of an archive, without reading the payload."""
+    try:
+        with tarfile.open(archive_path, "r:*") as tar:
+            return read_manifest(tar)
+    except tarfile.ReadError:
+        raise ValueError("Not a CodeGenius snapshot: unreadable archive")
+
+
+def import_snapshot(pipeline,
+                    archive_path: str,
+                    repo_name: Optional[str] = None,
+                    backend: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Load a snapshot as repo_name (default: the name it was exported under),
+    replacing any existing repo of that name. backend defaults to the one it
+    was exported from. Returns an import summary.
+    """
+    vector_store = pipeline.vector_store
+    retriever = pipeline.parent_child_retriever
+    started = time.time()
+
+    staging = tempfile.mkdtemp(prefix=".snapshot-import-", dir=vector_store.persist_directory)
+    parent_store = None
+    collection_name = None
+    try:
+        parents_dir = os.path.join(staging, "parents")
+        os.makedirs(parents_dir)
+
+        try:
+            tar = tarfile.open(archive_path, "r:*")
+        except tarfile.ReadError:
+            raise ValueError("Not a CodeGenius snapshot: unreadable archive")
+        with tar:
+            manifest = read_manifest(tar)
+            repo_name = repo_name or manifest.get("repo_name")
+            if not _valid_name(repo_name or ""):
+                raise ValueError(f"Invalid repository name: {repo_name!r}")
+
+            model = vector_store.embedding_engine.model_name
+            if manifest.get("embedding_model") != model:
+                raise ValueError(f"Snapshot was embedded with '{manifest.get('embedding_model')}', "
+                                 f"this server uses '{model}' — re-index instead")
+
+            # Stream members straight to staging; only known names are written
+            files = manifest.get("files", {})
+            for member in tar:
+                if not member.isfile():
+                    continue
+                if member.name in files:
+                    target = os.path.join(staging, member.name)
+                elif member.name.startswith(PARENTS_PREFIX) and member.name.endswith(".txt"):
+                    parent_file = member.name[len(PARENTS_PREFIX):]
+                    if not _valid_name(parent_file):
+                        raise ValueError(f"Invalid parent entry in snapshot: {member.name}")
+                    target = os.path.join(parents_dir, parent_file)
+                else:
+                    continue
+                with tar.extractfile(member) as src, open(target, "wb") as dst:
+                    shutil.copyfileobj(src, dst, _COPY_BUFFER)
+
+        for name, info in files.items():
+            path = os.path.join(staging, name)
+            if not os.path.exists(path):
+                raise ValueError(f"Snapshot is missing {name}")
+            if os.path.getsize(path) != info["bytes"] or _sha256_file(path) != info["sha256"]:
+                raise ValueError(f"Snapshot file {name} is corrupt (checksum mismatch)")
+        if "vectors.npy" not in files or "sidecar.json" not in files:
+            raise ValueError("Snapshot has no vectors")
+
+        # Collection, BM25 index, parents and symbol table are all staged and
+        # published together, as on a re-index
+        parent_store = retriever.stage_parent_store(repo_name)
+        parent_files = sorted(os.listdir(parents_dir))
+        for parent_file in parent_files:
+            with open(os.path.join(parents_dir, parent_file), encoding="utf-8") as f:
+                parent_store.write(parent_file[:-len(".txt")], f.read())
+        parent_store.flush()
+
+        lexical_prefix = retriever.staged_lexical_prefix(parent_store)
+        for ext in (".npz", ".json"):
+            staged = os.path.join(staging, "lexical" + ext)
+            if os.path.exists(staged):
+                shutil.move(staged, lexical_prefix + ext)
+
+        symbol_index = SymbolIndex.load(os.path.join(staging, "symbols.json"))
+
+        backend = backend or manifest.get("backend")
+        collection_name = staging_name(repo_name)
+        count = vector_store.import_vectors(collection_name, staging, backend=backend, hnsw_params=manifest.get("hnsw"))
+        retriever.publish_parent_store(repo_name, parent_store, symbol_index, collection_name=collection_name)
+        parent_store = collection_name = None
+
+        if os.path.exists(os.path.join(staging, "chunks.json")):
+            os.makedirs(CHUNKS_DIR, exist_ok=True)
+            shutil.move(os.path.join(staging, "chunks.json"), os.path.join(CHUNKS_DIR, f"{repo_name}.json"))
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+        if parent_store is not None:
+            # Never published: the repo keeps its old build
+            parent_store.close()
+            shutil.rmtree(os.path.dirname(parent_store.repo_dir), ignore_errors=True)
+        if collection_name is not None:
+            vector_store.drop_collection(collection_name)
+        # Cached answers were generated from whatever index the name held before
+        if repo_name:
+            pipeline.answer_cache.invalidate(repo_name)
+
+    if manifest.get("repository_metadata"):
+        pipeline.repository_metadata[repo_name] = manifest["repository_metadata"]
+
+    seconds = time.time() - started
+    print(f"  [SNAPSHOT] Imported '{repo_name}' ({count} vectors, {len(parent_files)} parents, "
+          f"{backend}) in {seconds:.1f}s", flush=True)
+    return {
+        "status": "success",
+        "repo_name": repo_name,
+        "backend": backend,
+        "vector_count": count,
+        "parent_count": len(parent_files),
+        "snapshot_created_at": manifest.get("created_at"),
+        "seconds": round(seconds, 2),
+    }
+
+
+# ══════════════════════════════════════════════════════════════
+# ENTRY POINT
+# ══════════════════════════════════════════════════════════════
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Export / import CodeGenius repository snapshots")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_cmd = sub.add_parser("export")
+    export_cmd.add_argument("repo")
+    export_cmd.add_argument("archive")
+    import_cmd = sub.add_parser("import")
+    import_cmd.add_argument("archive")
+    import_cmd.add_argument("--repo", default=None)
+    import_cmd.add_argument("--backend", default=None)
+    args = parser.parse_args()
+
+    from vector_store import VectorStore
+    from rag_pipeline import RAGPipeline
+
+    store = VectorStore(persist_directory=os.getenv('VECTOR_STORE_PATH', './chroma_data'))
+    rag = RAGPipeline(store)
+    if args.command == "export":
+        export_snapshot(rag, args.repo, args.archive)
+    else:
+        print(json.dumps(import_snapshot(rag, args.archive, repo_name=args.repo, backend=args.backend), indent=2))
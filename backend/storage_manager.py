@@ -0,0 +1,455 @@
+import os
+import json
+import time
+import shutil
+import sqlite3
+import threading
+import traceback
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterable
+
+from snapshot import CHUNKS_DIR, SNAPSHOT_EXTENSION, export_snapshot, import_snapshot
+from vector_store import STATS_PAGE_SIZE, staged_owner
+
+
+# Disk quota for all indexed repos (vectors, parents, BM25, chunks). 0 = no quota.
+STORAGE_QUOTA_MB = int(os.getenv('STORAGE_QUOTA_MB', 0))
+# What happens to a least-recently-used repo over quota:
+#   "offload" — gzipped snapshot in the offload dir, restored on next request
+#   "delete"  — removed; it has to be uploaded again
+STORAGE_EVICTION = os.getenv('STORAGE_EVICTION', 'offload').lower()
+# Repos used more recently than this are never evicted (may be mid-request)
+STORAGE_MIN_IDLE_SECONDS = int(os.getenv('STORAGE_MIN_IDLE_SECONDS', 300))
+
+ACCESS_FILE = "storage_access.json"
+ACCESS_FLUSH_SECONDS = 60
+# Staging dirs / temp files older than this are leftovers of a crashed export/import
+STALE_TEMP_SECONDS = 3600
+
+
+def _path_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def _remove(path: str) -> int:
+    """Delete a file or directory tree; returns the bytes freed."""
+    size = _path_size(path)
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+    return size
+
+
+class RepositoryBusy(Exception):
+    """Another upload or import of the same repo is in progress."""
+
+
+class StorageManager:
+    """
+    Disk lifecycle for indexed repos: per-repo footprint and last access,
+    quota enforcement by evicting least-recently-used repos, and garbage
+    collection of files no live repo references.
+    """
+
+    def __init__(self,
+                 pipeline,
+                 offload_dir: str,
+                 quota_bytes: int = STORAGE_QUOTA_MB * 1024 * 1024,
+                 eviction: str = STORAGE_EVICTION,
+                 min_idle_seconds: int = STORAGE_MIN_IDLE_SECONDS):
+        if eviction not in ("offload", "delete"):
+            raise ValueError(f"Unknown STORAGE_EVICTION '{eviction}'. Use 'offload' or 'delete'")
+
+        self.pipeline = pipeline
+        self.vector_store = pipeline.vector_store
+        self.retriever = pipeline.parent_child_retriever
+        self.offload_dir = offload_dir
+        self.quota_bytes = quota_bytes
+        self.eviction = eviction
+        self.min_idle_seconds = min_idle_seconds
+        os.makedirs(self.offload_dir, exist_ok=True)
+
+        # One eviction / GC pass at a time
+        self._lock = threading.RLock()
+        # Repos being uploaded / imported right now — never evicted or collected
+        self._busy: Dict[str, int] = {}
+        # Scans done by the manager itself must not count as "access"
+        self._quiet = threading.local()
+
+        # Guards _last_access and its file. Separate from _lock so that access
+        # notifications from queries don't wait out a long eviction / GC pass
+        self._access_lock = threading.Lock()
+        self._access_path = os.path.join(self.vector_store.persist_directory, ACCESS_FILE)
+        self._last_access: Dict[str, float] = self._load_access()
+        self._access_saved_at = time.time()
+        self.vector_store.add_access_listener(self.touch)
+
+    @contextmanager
+    def in_use(self, repo_name: str):
+        """
+        Mark a repo as being written (ingest / import) for the duration of the
+        block. One writer per repo: raises RepositoryBusy if another upload or
+        import of it is still running.
+        """
+        with self._lock:
+            if repo_name in self._busy:
+                raise RepositoryBusy(f"Repository '{repo_name}' is already being uploaded or imported")
+            self._busy[repo_name] = self._busy.get(repo_name, 0) + 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._busy[repo_name] -= 1
+                if not self._busy[repo_name]:
+                    del self._busy[repo_name]
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Access tracking
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def touch(self, repo_name: str) -> None:
+        if getattr(self._quiet, "active", False):
+            return
+        now = time.time()
+        with self._access_lock:
+            self._last_access[repo_name] = now
+            if now - self._access_saved_at > ACCESS_FLUSH_SECONDS:
+                self._save_access_locked()
+
+    def _load_access(self) -> Dict[str, float]:
+        try:
+            with open(self._access_path, encoding="utf-8") as f:
+                return {k: float(v) for k, v in json.load(f).items()}
+        except (OSError, ValueError):
+            return {}
+
+    def _save_access(self) -> None:
+        with self._access_lock:
+            self._save_access_locked()
+
+    def _save_access_locked(self) -> None:
+        self._access_saved_at = time.time()
+        try:
+            with open(self._access_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self._last_access, f)
+            os.replace(self._access_path + ".tmp", self._access_path)
+        except OSError as e:
+            print(f"  [STORAGE] Could not save access times: {str(e)}", flush=True)
+
+    def _last_used(self, repo_name: str) -> float:
+        """Last access; repos never seen fall back to their last write."""
+        with self._access_lock:
+            if repo_name in self._last_access:
+                return self._last_access[repo_name]
+        stats_path = self.vector_store.stats_path(repo_name)
+        return os.path.getmtime(stats_path) if os.path.exists(stats_path) else 0.0
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Footprint
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def _chroma_segments(self) -> Optional[Dict[str, List[str]]]:
+        """
+        Collection name -> its HNSW segment dirs under the persist dir, read
+        from Chroma's SQLite catalog (read-only). None if the layout is unknown.
+        """
+        db_path = os.path.join(self.vector_store.persist_directory, "chroma.sqlite3")
+        if not os.path.exists(db_path):
+            return {}
+        try:
+            names = {}
+            for collection in self.vector_store.client.list_collections():
+                name = collection if isinstance(collection, str) else collection.name
+                collection_id = getattr(collection, "id", None) or self.vector_store.client.get_collection(name=name).id
+                names[str(collection_id)] = name
+            con = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5)
+            try:
+                rows = con.execute("SELECT id, collection FROM segments WHERE scope = 'VECTOR'").fetchall()
+            finally:
+                con.close()
+        except Exception as e:
+            print(f"  [STORAGE] Chroma segment catalog unavailable: {str(e)}", flush=True)
+            return None
+
+        segments: Dict[str, List[str]] = {name: [] for name in names.values()}
+        for segment_id, collection_id in rows:
+            name = names.get(str(collection_id))
+            if name is not None:
+                segments[name].append(os.path.join(self.vector_store.persist_directory, str(segment_id)))
+        return segments
+
+    def repository_paths(self, repo_name: str) -> List[str]:
+        """Every file / dir that belongs to one repo (outside Chroma's own storage)."""
+        return [
+            os.path.join(self.vector_store.numpy_index_dir, repo_name),
+            self.vector_store.stats_path(repo_name),
+            os.path.join(CHUNKS_DIR, f"{repo_name}.json"),
+        ] + self.retriever.repository_paths(repo_name)
+
+    def footprint(self) -> Dict[str, Any]:
+        """Per-repo bytes and last access, plus totals against the quota."""
+        segments = self._chroma_segments() or {}
+        repos: Dict[str, Dict[str, Any]] = {}
+        for repo_name in self.vector_store.list_repositories():
+            vector_bytes = sum(_path_size(p) for p in segments.get(repo_name, []))
+            file_bytes = sum(_path_size(p) for p in self.repository_paths(repo_name) if os.path.exists(p))
+            repos[repo_name] = {
+                "bytes": vector_bytes + file_bytes,
+                "last_access": self._last_used(repo_name),
+            }
+
+        # Chroma's SQLite file is shared; attribute it by each repo's share of vector bytes
+        db_path = os.path.join(self.vector_store.persist_directory, "chroma.sqlite3")
+        shared = _path_size(db_path) if os.path.exists(db_path) else 0
+        chroma_repos = [r for r in repos if r in segments]
+        chroma_bytes = sum(repos[r]["bytes"] for r in chroma_repos) or 1
+        for repo_name in chroma_repos:
+            repos[repo_name]["bytes"] += int(shared * repos[repo_name]["bytes"] / chroma_bytes)
+
+        return {
+            "repositories": repos,
+            "total_bytes": sum(r["bytes"] for r in repos.values()) + (shared if not chroma_repos else 0),
+            "quota_bytes": self.quota_bytes,
+            "eviction": self.eviction,
+            "offloaded": {
+                name: _path_size(self._offload_path(name)) for name in self.offloaded_repositories()
+            },
+        }
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Quota / eviction
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def enforce_quota(self, protect: Iterable[str] = ()) -> List[str]:
+        """
+        Evict least-recently-used repos until the footprint fits the quota.
+        Never evicts the default repo, `protect`, or repos used in the last
+        min_idle_seconds. Returns the evicted repo names.
+        """
+        if self.quota_bytes <= 0:
+            return []
+
+        with self._lock:
+            report = self.footprint()
+            total = report["total_bytes"]
+            if total <= self.quota_bytes:
+                return []
+
+            protected = set(protect) | set(self._busy) | {self.vector_store.current_repo}
+            now = time.time()
+            candidates = sorted(
+                (name for name, info in report["repositories"].items()
+                 if name not in protected and now - info["last_access"] >= self.min_idle_seconds),
+                key=lambda name: report["repositories"][name]["last_access"]
+            )
+
+            evicted = []
+            for repo_name in candidates:
+                if total <= self.quota_bytes:
+                    break
+                try:
+                    self.evict(repo_name)
+                except Exception as e:
+                    print(f"  [STORAGE] Eviction of '{repo_name}' failed: {str(e)}", flush=True)
+                    traceback.print_exc()
+                    continue
+                total -= report["repositories"][repo_name]["bytes"]
+                evicted.append(repo_name)
+
+            if total > self.quota_bytes:
+                print(f"  [STORAGE] Still {total / 1e6:.1f} MB over a {self.quota_bytes / 1e6:.1f} MB quota "
+                      f"(remaining repos are in use or protected)", flush=True)
+            self._save_access()
+            return evicted
+
+    def evict(self, repo_name: str) -> None:
+        """Offload (gzipped snapshot) or delete one repo, per the eviction policy."""
+        with self._lock:
+            if self.eviction == "offload":
+                self._quiet.active = True
+                try:
+                    export_snapshot(self.pipeline, repo_name, self._offload_path(repo_name), compress=True)
+                finally:
+                    self._quiet.active = False
+            self._delete_local(repo_name)
+            print(f"  [STORAGE] Evicted '{repo_name}' ({self.eviction})", flush=True)
+
+    def delete_repository(self, repo_name: str) -> None:
+        """Remove a repo's collection, parents, BM25 index, chunks, stats and offloaded snapshot."""
+        with self._lock:
+            _remove(self._offload_path(repo_name))
+            self._delete_local(repo_name)
+
+    def _delete_local(self, repo_name: str) -> None:
+        with self._lock:
+            self.vector_store.delete_repository(repo_name)
+            self.retriever.delete_repository(repo_name)
+            for path in self.repository_paths(repo_name):
+                _remove(path)
+            self.pipeline.repository_metadata.pop(repo_name, None)
+            self.pipeline.answer_cache.invalidate(repo_name)
+            with self._access_lock:
+                self._last_access.pop(repo_name, None)
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Offloaded repos
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def _offload_path(self, repo_name: str) -> str:
+        return os.path.join(self.offload_dir, f"{repo_name}{SNAPSHOT_EXTENSION}")
+
+    def offloaded_repositories(self) -> List[str]:
+        return sorted(
+            name[:-len(SNAPSHOT_EXTENSION)] for name in os.listdir(self.offload_dir)
+            if name.endswith(SNAPSHOT_EXTENSION)
+        )
+
+    def restore(self, repo_name: str) -> bool:
+        """
+        Bring an offloaded repo back from its snapshot. False if there is none.
+        The default repo is left as it is (importing never switches it).
+        Callers should enforce_quota() afterwards, protecting the repos they need.
+        """
+        archive_path = self._offload_path(repo_name)
+        with self._lock:
+            if not os.path.exists(archive_path):
+                return False
+            import_snapshot(self.pipeline, archive_path, repo_name=repo_name)
+            os.remove(archive_path)
+            self.touch(repo_name)
+        print(f"  [STORAGE] Restored offloaded repo '{repo_name}'", flush=True)
+        return True
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Garbage collection
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def collect_garbage(self) -> Dict[str, Any]:
+        """
+        Delete data no live repo references:
+          - parents / chunks / BM25 / stats / numpy dirs of repos with no collection
+          - staging collections of rebuilds that are no longer running
+          - parent files of live repos that no child chunk points to
+          - Chroma HNSW segment dirs missing from Chroma's catalog
+          - stale snapshot staging dirs, staged parent stores and temp files
+        """
+        with self._lock:
+            started = time.time()
+            live = set(self.vector_store.list_repositories())
+            keep = live | set(self._busy)
+            removed: List[str] = []
+            freed = 0
+
+            def drop(path: str) -> None:
+                nonlocal freed
+                freed += _remove(path)
+                removed.append(path)
+
+            # Repo-level leftovers, keyed by the repo name in the path
+            retriever_dirs = [self.retriever.parent_store_dir, self.retriever.lexical_index_dir,
+                              self.retriever.symbol_index_dir]
+            for directory in retriever_dirs + [CHUNKS_DIR, self.vector_store.stats_dir, self.vector_store.numpy_index_dir]:
+                if not os.path.isdir(directory):
+                    continue
+                for entry in os.listdir(directory):
+                    path = os.path.join(directory, entry)
+                    if path == self.retriever.parent_staging_dir:
+                        continue
+                    repo_name = entry if os.path.isdir(path) else os.path.splitext(entry)[0]
+                    # A staging collection's files are kept only while its repo is rebuilt
+                    owner = staged_owner(repo_name)
+                    in_use = owner in self._busy if owner else repo_name in keep
+                    if not in_use:
+                        drop(path)
+
+            # Chroma staging collections of crashed rebuilds (numpy ones went above)
+            for name in self.vector_store.list_staged():
+                if staged_owner(name) not in self._busy:
+                    self.vector_store.drop_collection(name)
+                    removed.append(name)
+
+            # Parents no child chunk references (ids shift on re-upload)
+            self._quiet.active = True
+            try:
+                for repo_name in live - set(self._busy):
+                    collection = self.vector_store.get_collection(repo_name)
+                    if collection is None:
+                        continue
+                    referenced = self._referenced_parents(collection)
+                    with self.retriever.open_parent_store(repo_name) as store:
+                        orphans = [pid for pid in store.list_ids() if pid not in referenced]
+                        if orphans:
+                            store.delete(orphans)
+                            freed += store.compact()
+                            removed.extend(f"{store.pack_path}#{pid}" for pid in orphans)
+            finally:
+                self._quiet.active = False
+
+            # Chroma segment dirs (UUID-named) the catalog no longer lists. An
+            # ingest creates its segment dir before the catalog row can be
+            # read here, so the sweep waits until no repo is being written,
+            # and the dirs are listed before the catalog is read.
+            persist_dir = self.vector_store.persist_directory
+            entries = os.listdir(persist_dir)
+            segments = self._chroma_segments() if not self._busy else None
+            if segments is not None:
+                known = {os.path.basename(p) for paths in segments.values() for p in paths}
+                for entry in entries:
+                    path = os.path.join(persist_dir, entry)
+                    if os.path.isdir(path) and len(entry) == 36 and entry.count("-") == 4 and entry not in known:
+                        if os.path.exists(os.path.join(path, "header.bin")) or not os.listdir(path):
+                            drop(path)
+
+            # Crashed exports / imports, and parent stores of crashed rebuilds
+            for directory in (self.vector_store.persist_directory, self.offload_dir):
+                for entry in os.listdir(directory):
+                    path = os.path.join(directory, entry)
+                    stale = time.time() - os.path.getmtime(path) > STALE_TEMP_SECONDS
+                    if stale and (entry.startswith(".snapshot-") or entry.endswith(".tmp")):
+                        drop(path)
+            staging_dir = self.retriever.parent_staging_dir
+            if os.path.isdir(staging_dir):
+                for entry in os.listdir(staging_dir):
+                    path = os.path.join(staging_dir, entry)
+                    in_use = os.path.isdir(path) and any(name in self._busy for name in os.listdir(path))
+                    if not in_use and time.time() - os.path.getmtime(path) > STALE_TEMP_SECONDS:
+                        drop(path)
+
+            print(f"  [STORAGE] GC removed {len(removed)} items, freed {freed / 1e6:.1f} MB "
+                  f"in {time.time() - started:.1f}s", flush=True)
+            return {"removed": removed, "freed_bytes": freed}
+
+    @staticmethod
+    def _referenced_parents(collection, page_size: int = STATS_PAGE_SIZE) -> set:
+        """parent_ids the collection's children point to, read page_size rows at a time."""
+        referenced = set()
+        for offset in range(0, collection.count(), page_size):
+            page = collection.get(include=["metadatas"], limit=page_size, offset=offset)
+            referenced.update(m.get("parent_id") for m in page.get("metadatas") or [] if m)
+        return referenced
+
+    def reset(self) -> None:
+        """Delete every repo's files and offloaded snapshots (after VectorStore.reset)."""
+        with self._lock:
+            self.retriever.parent_cache.clear()
+            self.pipeline.answer_cache.clear()
+            for directory in (self.retriever.parent_store_dir, self.retriever.lexical_index_dir,
+                              self.retriever.symbol_index_dir, CHUNKS_DIR):
+                if os.path.isdir(directory):
+                    for entry in os.listdir(directory):
+                        _remove(os.path.join(directory, entry))
+            for repo_name in self.offloaded_repositories():
+                _remove(self._offload_path(repo_name))
+            with self._access_lock:
+                self._last_access.clear()
+                self._save_access_locked()
@@ -0,0 +1,116 @@
+import pytest
+
+from rag import answer_cache
+from rag.answer_cache import SemanticAnswerCache
+
+
+PAYLOAD = {"answer": "It adds a and b.", "model": "Groq", "sources": [{"filepath": "lib/math_utils.py"}]}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(answer_cache.time, "time", lambda: now[0])
+    return now
+
+
+def _stored(cache, repo="alpha", vector=(1.0, 0.0, 0.0), variant=""):
+    cache.put(repo, vector, "what does add do", PAYLOAD, cache.generation(repo), variant)
+
+
+def test_hit_at_or_above_threshold_only():
+    cache = SemanticAnswerCache(threshold=0.9, ttl=0)
+    _stored(cache)
+
+    hit = cache.lookup("alpha", [0.95, 0.2, 0.0])   # cos ~0.978
+    assert hit["payload"] == PAYLOAD
+    assert hit["query"] == "what does add do"
+    assert hit["similarity"] >= 0.9
+
+    assert cache.lookup("alpha", [0.6, 0.8, 0.0]) is None   # cos 0.6
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_vectors_are_compared_by_direction():
+    cache = SemanticAnswerCache(threshold=0.99, ttl=0)
+    _stored(cache, vector=(2.0, 0.0, 0.0))
+    assert cache.lookup("alpha", [10.0, 0.0, 0.0])["similarity"] == 1.0
+
+
+def test_repos_and_variants_are_separate():
+    cache = SemanticAnswerCache(threshold=0.9, ttl=0)
+    _stored(cache, variant='{"rerank": true}')
+    assert cache.lookup("beta", [1.0, 0.0, 0.0], '{"rerank": true}') is None
+    assert cache.lookup("alpha", [1.0, 0.0, 0.0]) is None
+    assert cache.lookup("alpha", [1.0, 0.0, 0.0], '{"rerank": true}') is not None
+
+
+def test_entries_expire_after_ttl(clock):
+    cache = SemanticAnswerCache(threshold=0.9, ttl=60)
+    _stored(cache)
+
+    clock[0] += 59
+    assert cache.lookup("alpha", [1.0, 0.0, 0.0])["age_s"] == 59.0
+
+    clock[0] += 2
+    assert cache.lookup("alpha", [1.0, 0.0, 0.0]) is None
+    assert cache.stats()["expirations"] == 1
+    assert cache.stats()["entries"] == 0
+
+
+def test_zero_ttl_never_expires(clock):
+    cache = SemanticAnswerCache(threshold=0.9, ttl=0)
+    _stored(cache)
+    clock[0] += 10 ** 6
+    assert cache.lookup("alpha", [1.0, 0.0, 0.0]) is not None
+
+
+def test_lru_eviction_per_variant():
+    cache = SemanticAnswerCache(threshold=0.99, ttl=0, max_entries=2)
+    for vector in ([1.0, 0.0, 0.0], [0.0, 1.0, 0.0]):
+        _stored(cache, vector=vector)
+    cache.lookup("alpha", [1.0, 0.0, 0.0])          # touch the first, so the second is oldest
+    _stored(cache, vector=(0.0, 0.0, 1.0))
+
+    assert cache.lookup("alpha", [0.0, 1.0, 0.0]) is None
+    assert cache.lookup("alpha", [1.0, 0.0, 0.0]) is not None
+    assert cache.stats()["evictions"] == 1
+
+
+def test_put_after_invalidate_is_dropped():
+    cache = SemanticAnswerCache(threshold=0.9, ttl=0)
+    generation = cache.generation("alpha")          # taken at lookup time
+    cache.invalidate("alpha")                       # re-index while the answer was generated
+    cache.put("alpha", [1.0, 0.0, 0.0], "q", PAYLOAD, generation)
+    assert cache.lookup("alpha", [1.0, 0.0, 0.0]) is None
+
+    cache.put("alpha", [1.0, 0.0, 0.0], "q", PAYLOAD, cache.generation("alpha"))
+    assert cache.lookup("alpha", [1.0, 0.0, 0.0]) is not None
+
+
+def test_invalidate_drops_only_that_repo():
+    cache = SemanticAnswerCache(threshold=0.9, ttl=0)
+    _stored(cache, repo="alpha")
+    _stored(cache, repo="beta", variant="x")
+    generation_beta = cache.generation("beta")
+    cache.invalidate("alpha")
+
+    assert cache.lookup("alpha", [1.0, 0.0, 0.0]) is None
+    assert cache.lookup("beta", [1.0, 0.0, 0.0], "x") is not None
+    assert cache.generation("beta") == generation_beta
+
+
+def test_clear_voids_every_generation():
+    cache = SemanticAnswerCache(threshold=0.9, ttl=0)
+    generation = cache.generation("alpha")
+    cache.clear()
+    cache.put("alpha", [1.0, 0.0, 0.0], "q", PAYLOAD, generation)
+    assert cache.stats()["entries"] == 0
+
+
+def test_disabled_cache_stores_nothing():
+    cache = SemanticAnswerCache(threshold=0.9, ttl=0, enabled=False)
+    _stored(cache)
+    assert cache.lookup("alpha", [1.0, 0.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
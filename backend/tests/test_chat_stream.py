@@ -0,0 +1,108 @@
+import json
+import threading
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("sentence_transformers")
+pytest.importorskip("flask_cors")
+pytest.importorskip("dotenv")
+
+
+class StubEngine:
+    model_name = "stub"
+    embedding_dim = 8
+
+    def embed_text(self, text):
+        return [1.0] + [0.0] * 7
+
+    def embed_texts(self, texts, batch_size=64):
+        return [self.embed_text(t) for t in texts]
+
+
+@pytest.fixture(scope="module")
+def app_module(tmp_path_factory):
+    import llm_providers
+    import vector_store
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.chdir(tmp_path_factory.mktemp("server"))     # uploads/, chroma_data/, snapshots/
+        mp.setattr(vector_store, "EmbeddingEngine", StubEngine)
+        mp.setattr(llm_providers.ProviderManager, "start_probing", lambda self: None)
+        import app
+        yield app
+
+
+SOURCES = [{"filename": "app.py", "filepath": "server/app.py", "relevance": 0.9}]
+
+
+@pytest.fixture
+def chat(app_module, monkeypatch):
+    """Test client with retrieval and the LLM stubbed; returns (client, upstream)."""
+    upstream = {"tokens": ["Hello", " world"], "closed": threading.Event(), "hold": False}
+
+    def tokens():
+        yield from upstream["tokens"]
+        if upstream["hold"]:
+            upstream["closed"].wait(30)         # a long answer, cut short by close()
+
+    def generate_answer_stream(context, query, results=None, hedge=False):
+        return {"tokens": tokens(), "close": upstream["closed"].set,
+                "model": "Groq", "model_name": "stub-model", "context": context}
+
+    monkeypatch.setattr(app_module, "_resolve_repo", lambda requested: ("alpha", None))
+    monkeypatch.setattr(app_module, "_retrieve_for_chat",
+                        lambda options, cache_slot=None: ({"results": []}, "[app.py]\ncode", SOURCES))
+    monkeypatch.setattr(app_module, "generate_answer_stream", generate_answer_stream)
+    return app_module.app.test_client(), upstream
+
+
+def _events(chunks):
+    """Parse SSE text chunks into (event, data) pairs."""
+    text = "".join(c.decode() if isinstance(c, bytes) else c for c in chunks)
+    events = []
+    for block in text.split("\n\n"):
+        if block.strip():
+            fields = dict(line.split(": ", 1) for line in block.splitlines())
+            events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_events_arrive_in_order(chat):
+    client, upstream = chat
+    response = client.post("/api/chat/stream", json={"query": "how are chat answers generated", "cache": False})
+
+    assert response.status_code == 200
+    assert response.mimetype == "text/event-stream"
+    events = _events([response.data])
+    assert [name for name, _ in events] == ["sources", "model", "token", "token", "done"]
+    assert events[0][1]["sources"] == SOURCES and events[0][1]["repository"] == "alpha"
+    assert events[1][1]["model"] == "Groq"
+    assert "".join(data["text"] for name, data in events if name == "token") == "Hello world"
+    assert events[-1][1]["cache"] == {"hit": False}
+    assert upstream["closed"].is_set()
+
+
+def test_upstream_closed_when_client_stops_reading(chat):
+    client, upstream = chat
+    upstream["hold"] = True
+    response = client.post("/api/chat/stream", json={"query": "explain the upload flow", "cache": False},
+                           buffered=False)
+
+    received = []
+    for chunk in response.response:
+        received.append(chunk)
+        if b"event: token" in chunk:
+            break
+    response.close()                            # the client goes away mid-answer
+
+    assert upstream["closed"].wait(5)
+    names = [name for name, _ in _events(received)]
+    assert names[:3] == ["sources", "model", "token"] and "done" not in names
+
+
+def test_invalid_body_is_rejected_before_streaming(chat):
+    client, _ = chat
+    response = client.post("/api/chat/stream", json={"query": "  "})
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Empty query"}
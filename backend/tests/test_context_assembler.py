@@ -0,0 +1,94 @@
+from rag.context_assembler import (
+    CHARS_PER_TOKEN, _allocate, _clip, _windows, assemble_context, estimate_tokens
+)
+
+
+LINES = "".join(f"line {i:03d} of the file\n" for i in range(200))   # 22 chars per line
+
+
+def test_allocate_splits_by_weight():
+    assert _allocate([1000, 1000], [3.0, 1.0], 400) == [300, 100]
+
+
+def test_allocate_gives_small_files_what_they_need_and_reshares_the_rest():
+    # File 0's share is 250 but it needs 50; the other 350 goes to files 1 and 2 by weight
+    assert _allocate([50, 1000, 1000], [1.0, 1.0, 1.0], 750) == [50, 350, 350]
+
+
+def test_allocate_never_exceeds_budget_or_need():
+    needs, weights = [120, 40, 900, 10], [0.9, 0.5, 0.3, 0.05]
+    allocation = _allocate(needs, weights, 500)
+    assert sum(allocation) <= 500
+    assert all(a <= n for a, n in zip(allocation, needs))
+    assert allocation[:2] == [120, 40] and allocation[3] == 10
+
+
+def test_allocate_everything_fits():
+    assert _allocate([10, 20], [0.5, 0.5], 1000) == [10, 20]
+
+
+def test_allocate_empty_and_zero_budget():
+    assert _allocate([], [], 100) == []
+    assert _allocate([10, 20], [1.0, 1.0], 0) == [0, 0]
+
+
+def test_clip_keeps_focus_and_whole_lines():
+    focus = LINES.index("line 100")
+    window = {"start": 0, "end": len(LINES), "focus_start": focus, "focus_end": focus + 21}
+    start, end = _clip(LINES, window, 200)
+
+    assert end - start <= 200
+    assert start <= focus < end
+    assert start == 0 or LINES[start - 1] == "\n"
+    assert end == len(LINES) or LINES[end] == "\n"
+
+
+def test_clip_stays_inside_the_window():
+    start_line = LINES.index("line 050")
+    window = {"start": start_line, "end": start_line + 22 * 10, "focus_start": start_line, "focus_end": start_line + 5}
+    start, end = _clip(LINES, window, 110)
+    assert window["start"] <= start < end <= window["end"]
+    assert end - start <= 110
+
+
+def test_clip_focus_at_end_of_window():
+    end_line = LINES.index("line 199")
+    window = {"start": 0, "end": len(LINES), "focus_start": end_line, "focus_end": len(LINES)}
+    start, end = _clip(LINES, window, 88)
+    assert end == len(LINES)
+    assert LINES[start:end].startswith("line 196")
+
+
+def test_windows_merge_overlapping_spans_and_keep_best_rank():
+    a = LINES.index("line 010")
+    b = LINES.index("line 012")
+    windows = _windows(LINES, [[b, b + 5], [a, a + 5]], padding=22)
+    assert len(windows) == 1
+    assert windows[0]["rank"] == 0 and windows[0]["focus_start"] == b
+
+
+RESULTS = [
+    {"chunk": LINES, "filename": "big.py", "relevance": 0.9, "spans": [[LINES.index("line 100"), LINES.index("line 101")]]},
+    {"chunk": LINES, "filename": "other.py", "relevance": 0.1, "spans": [[0, 22]]},
+]
+
+
+def test_assemble_context_respects_budget_and_relevance():
+    context, report = assemble_context(RESULTS, token_budget=400, padding=22 * 40)
+
+    assert report["tokens_used"] <= 400 + 1      # the "\n\n" join between files
+    assert report["files"] == 2
+    big, other = context.split("\n\n[other.py]\n")
+    assert big.startswith("[big.py]\n") and "line 100" in big
+    assert estimate_tokens(big) > 4 * estimate_tokens(other)
+    assert report["source_tokens"] == 2 * len(LINES) // CHARS_PER_TOKEN
+
+
+def test_assemble_context_drops_files_whose_share_is_too_small():
+    context, report = assemble_context(RESULTS, token_budget=150, padding=22 * 40)
+    assert report["files"] == 1 and "[other.py]" not in context
+
+
+def test_assemble_context_skips_empty_files():
+    context, report = assemble_context([{"chunk": "  \n", "filename": "empty.py"}], token_budget=100)
+    assert context == "" and report["files"] == 0
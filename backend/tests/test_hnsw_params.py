@@ -0,0 +1,49 @@
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("sentence_transformers")
+
+from vector_store import HNSW_PRESETS, hnsw_metadata, hnsw_preset_for, resolve_hnsw_params
+
+
+@pytest.fixture(autouse=True)
+def no_env_overrides(monkeypatch):
+    for name in ("HNSW_M", "HNSW_CONSTRUCTION_EF", "HNSW_SEARCH_EF"):
+        monkeypatch.delenv(name, raising=False)
+
+
+@pytest.mark.parametrize("count,preset", [
+    (None, "small"), (0, "small"), (49_999, "small"),
+    (50_000, "medium"), (249_999, "medium"), (250_000, "large"), (5_000_000, "large"),
+])
+def test_preset_by_size(count, preset):
+    assert hnsw_preset_for(count) == preset
+    assert resolve_hnsw_params(count) == HNSW_PRESETS[preset]
+
+
+def test_explicit_preset_beats_size():
+    assert resolve_hnsw_params(10, preset="LARGE") == HNSW_PRESETS["large"]
+    assert resolve_hnsw_params(300_000, preset="auto") == HNSW_PRESETS["large"]
+
+
+def test_env_then_overrides(monkeypatch):
+    monkeypatch.setenv("HNSW_SEARCH_EF", "300")
+    monkeypatch.setenv("HNSW_M", "20")
+    params = resolve_hnsw_params(10, overrides={"M": 48})
+    assert params == {"M": 48, "construction_ef": HNSW_PRESETS["small"]["construction_ef"], "search_ef": 300}
+
+
+@pytest.mark.parametrize("kwargs", [
+    {"preset": "huge"},
+    {"overrides": {"ef": 10}},
+    {"overrides": {"M": 1}},
+])
+def test_invalid_settings(kwargs):
+    with pytest.raises(ValueError):
+        resolve_hnsw_params(10, **kwargs)
+
+
+def test_collection_metadata():
+    assert hnsw_metadata({"M": 16, "construction_ef": 100, "search_ef": 64}) == {
+        "hnsw:space": "cosine", "hnsw:M": 16, "hnsw:construction_ef": 100, "hnsw:search_ef": 64,
+    }
@@ -0,0 +1,89 @@
+from rag.lexical_index import LexicalIndex, tokenize_code
+from rag.metadata_filter import build_where, normalize_filters
+
+
+DOCS = [
+    ("c1", "def get_groq_response(context, query):\n    return groq_client.chat(context)",
+     {"parent_id": "p1", "filepath": "backend/app.py", "filename": "app.py",
+      "extension": ".py", "language": "python", "top_dir": "backend", "start_line": 1}),
+    ("c2", "export function GroqBadge() { return <span>groq</span> }",
+     {"parent_id": "p2", "filepath": "frontend/src/Badge.jsx", "filename": "Badge.jsx",
+      "extension": ".jsx", "language": "javascript", "top_dir": "frontend"}),
+    ("c3", "GROQ_API_KEY = os.getenv('GROQ_API_KEY')  # groq settings",
+     {"parent_id": "p3", "filepath": "backend/config.py", "filename": "config.py",
+      "extension": ".py", "language": "python", "top_dir": "backend"}),
+    ("c4", "CREATE TABLE users (id INT, name TEXT);",
+     {"parent_id": "p4", "filepath": "db/schema.sql", "filename": "schema.sql",
+      "extension": ".sql", "language": "sql", "top_dir": "db"}),
+]
+KNOWN_PATHS = [m["filepath"] for _, _, m in DOCS]
+
+
+def _index():
+    ids, texts, metadatas = zip(*DOCS)
+    return LexicalIndex.build(list(ids), list(texts), list(metadatas))
+
+
+def _search(index, query, filters=None, n_results=10):
+    where = build_where(normalize_filters(filters), known_paths=lambda: KNOWN_PATHS) if filters else None
+    return [doc_id for doc_id, _, _ in index.search(query, n_results=n_results, where=where)]
+
+
+def test_tokenizer_keeps_identifier_and_pieces():
+    tokens = tokenize_code("get_groq_response GroqBadge")
+    assert "get_groq_response" in tokens
+    assert {"groq", "response", "badge"} <= set(tokens)
+
+
+def test_exact_identifier_ranks_first():
+    assert _search(_index(), "get_groq_response")[0] == "c1"
+
+
+def test_unfiltered_search_spans_all_files():
+    assert set(_search(_index(), "groq")) == {"c1", "c2", "c3"}
+    assert _search(_index(), "nothing_like_this") == []
+
+
+def test_extension_and_language_filters():
+    index = _index()
+    assert _search(index, "groq", {"extensions": ["jsx"]}) == ["c2"]
+    assert set(_search(index, "groq", {"languages": "python"})) == {"c1", "c3"}
+    assert _search(index, "groq", {"languages": ["sql"]}) == []
+
+
+def test_path_filters():
+    index = _index()
+    # top-level directory → top_dir lookup
+    assert set(_search(index, "groq", {"path": "backend/**"})) == {"c1", "c3"}
+    # any other glob → filepath $in the matching files
+    assert _search(index, "groq", {"path": "backend/conf*"}) == ["c3"]
+    assert _search(index, "groq", {"path": "nowhere/*.py"}) == []
+
+
+def test_combined_filters_and_n_results():
+    index = _index()
+    assert _search(index, "groq", {"path": "backend", "extensions": [".py"]}, n_results=1) in (["c1"], ["c3"])
+    assert len(_search(index, "groq", {"path": "backend"}, n_results=1)) == 1
+    assert _search(index, "groq", {"path": "frontend", "languages": ["python"]}) == []
+
+
+def test_filtered_results_keep_bm25_order():
+    index = _index()
+    unfiltered = [doc_id for doc_id in _search(index, "groq") if doc_id in ("c1", "c3")]
+    assert _search(index, "groq", {"languages": ["python"]}) == unfiltered
+
+
+def test_save_and_load_round_trip(tmp_path):
+    index = _index()
+    prefix = str(tmp_path / "lexical" / "alpha")
+    index.save(prefix)
+    loaded = LexicalIndex.load(prefix)
+    assert loaded.search("groq", where={"top_dir": "backend"}) == index.search("groq", where={"top_dir": "backend"})
+    # Only the search keys are kept per child
+    assert "start_line" not in loaded.metadatas[0]
+    assert LexicalIndex.load(str(tmp_path / "missing")) is None
+
+
+def test_empty_index():
+    index = LexicalIndex.build([], [], [])
+    assert index.search("groq") == []
@@ -0,0 +1,168 @@
+import threading
+
+import pytest
+
+import llm_providers
+from llm_providers import CircuitBreaker, ProviderManager, ProviderUnavailable
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(llm_providers.time, "time", lambda: now[0])
+    return now
+
+
+def _fail(breaker, times=1):
+    for _ in range(times):
+        breaker.record_failure("boom")
+
+
+def test_breaker_opens_after_threshold_consecutive_failures(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=30)
+    _fail(breaker, 2)
+    assert breaker.state == "closed" and breaker.allow()
+
+    _fail(breaker)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.stats()["times_opened"] == 1
+    assert breaker.stats()["rejected"] == 1
+    assert breaker.stats()["last_error"] == "boom"
+
+
+def test_success_resets_the_failure_count(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=30)
+    _fail(breaker, 2)
+    breaker.record_success()
+    _fail(breaker, 2)
+    assert breaker.state == "closed"
+
+
+def test_half_open_lets_one_trial_through_after_cooldown(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    _fail(breaker)
+    clock[0] += 10
+    assert not breaker.allow()
+    assert breaker.retry_in() == 20
+
+    clock[0] += 20
+    assert breaker.allow()                  # the trial call
+    assert breaker.state == "half_open"
+    assert not breaker.allow()              # everyone else waits for its outcome
+    assert breaker.retry_in() == 0.0
+
+
+def test_successful_trial_closes_the_breaker(clock):
+    breaker = CircuitBreaker(threshold=1, cooldown=30)
+    _fail(breaker)
+    clock[0] += 30
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.allow() and breaker.allow()
+
+
+def test_failed_trial_reopens_for_another_cooldown(clock):
+    breaker = CircuitBreaker(threshold=3, cooldown=30)
+    _fail(breaker, 3)
+    clock[0] += 30
+    assert breaker.allow()
+    _fail(breaker)                          # one failure is enough while half-open
+    assert breaker.state == "open"
+    assert breaker.stats()["times_opened"] == 2
+    assert breaker.retry_in() == 30
+    assert not breaker.allow()
+
+
+def test_manager_call_counts_failures_and_rejects_when_open(clock):
+    manager = ProviderManager(threshold=2, cooldown=30, probe_interval=0)
+
+    def broken():
+        raise ConnectionError("refused")
+
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            manager.call("ollama", broken)
+    with pytest.raises(ProviderUnavailable, match="ollama circuit open after 2 failures; retry in 30s"):
+        manager.call("ollama", lambda: "never called")
+    assert manager.call("groq", lambda: "ok") == "ok"    # breakers are per provider
+
+
+@pytest.fixture
+def manager(monkeypatch):
+    monkeypatch.setattr(llm_providers, "LLM_HEDGE_DELAY_MS", 50)
+    monkeypatch.setattr(llm_providers, "LLM_HEDGE_MIN_MS", 10)
+    monkeypatch.setattr(llm_providers, "LLM_HEDGE_MAX_MS", 2000)
+    monkeypatch.setattr(llm_providers, "LLM_HEDGE_PERCENTILE", 90)
+    return ProviderManager(probe_interval=0)
+
+
+def test_hedge_delay_uses_default_until_enough_samples(manager):
+    for _ in range(llm_providers.HEDGE_MIN_SAMPLES - 1):
+        manager.record_first_token("groq", 1.0)
+    assert manager.hedge_delay("groq") == 0.05
+
+
+def test_hedge_delay_is_the_percentile_of_first_token_times(manager):
+    for ms in range(100, 1100, 10):                     # 100 samples: 100, 110, ..., 1090 ms
+        manager.record_first_token("groq", ms / 1000)
+    assert manager.hedge_delay("groq") == pytest.approx(1.0)   # 90th percentile
+    assert manager.hedge_delay("ollama") == 0.05               # per provider
+
+
+def test_hedge_delay_is_clamped(manager):
+    for _ in range(llm_providers.HEDGE_MIN_SAMPLES):
+        manager.record_first_token("groq", 0.001)
+        manager.record_first_token("ollama", 60.0)
+    assert manager.hedge_delay("groq") == 0.01
+    assert manager.hedge_delay("ollama") == 2.0
+
+
+def _stream(model, tokens, started=None, gate=None, closed=None):
+    def gen():
+        if started is not None:
+            started.set()
+        if gate is not None:
+            gate.wait(5)
+        yield from tokens
+
+    def start():
+        return {"tokens": gen(), "close": lambda: closed.append(model) if closed is not None else None,
+                "model": model, "model_name": model}
+    return start
+
+
+def test_slow_primary_is_hedged_and_closed(manager):
+    gate, closed = threading.Event(), []
+    result = manager.hedge(("groq", _stream("groq", ["late"], gate=gate, closed=closed)),
+                           ("ollama", _stream("ollama", ["fast", "er"], closed=closed)))
+    gate.set()
+    assert list(result["tokens"]) == ["fast", "er"]
+    assert result["hedge"] == {"hedged": True, "delay_ms": 50, "winner": "ollama"}
+    assert closed[0] == "groq" and "ollama" not in closed    # the loser may close again once released
+    assert manager.hedge_stats()["wins"]["ollama"] == 1
+
+
+def test_fast_primary_never_starts_the_secondary(manager, monkeypatch):
+    monkeypatch.setattr(llm_providers, "LLM_HEDGE_DELAY_MS", 2000)
+    secondary_started = threading.Event()
+    result = manager.hedge(("groq", _stream("groq", ["hi"])),
+                           ("ollama", _stream("ollama", ["x"], started=secondary_started)))
+    assert list(result["tokens"]) == ["hi"]
+    assert result["hedge"]["hedged"] is False
+    assert not secondary_started.is_set()
+
+
+def test_failed_primary_starts_the_secondary_at_once(manager, monkeypatch):
+    monkeypatch.setattr(llm_providers, "LLM_HEDGE_DELAY_MS", 2000)
+    result = manager.hedge(("groq", lambda: {"error": "groq down"}),
+                           ("ollama", _stream("ollama", ["ok"])))
+    assert list(result["tokens"]) == ["ok"]
+    assert result["hedge"]["winner"] == "ollama" and result["hedge"]["hedged"] is False
+
+
+def test_both_failing_returns_both_errors(manager):
+    result = manager.hedge(("groq", lambda: {"error": "groq down"}),
+                           ("ollama", _stream("ollama", [])))
+    assert result == {"error": "groq down; ollama returned empty response"}
@@ -0,0 +1,102 @@
+import pytest
+
+from rag.metadata_filter import build_where, is_empty_where, matches, normalize_filters, path_matches
+
+
+PATHS = ["repo-main/backend/app.py", "repo-main/backend/rag/hyde.py", "repo-main/frontend/src/App.jsx"]
+
+
+@pytest.mark.parametrize("raw", [None, {}, "", {"path": ""}, {"path": "."}, {"path": "./"}, {"extensions": []}])
+def test_normalize_empty(raw):
+    assert normalize_filters(raw) == {}
+
+
+def test_normalize_cleans_values():
+    assert normalize_filters({
+        "path": ".\\backend\\rag",
+        "extension": "PY",
+        "languages": [" Python ", "python"],
+    }) == {"path": "backend/rag", "extensions": [".py"], "languages": ["python"]}
+    assert normalize_filters({"extensions": ["jsx", ".JSX", "tsx"]}) == {"extensions": [".jsx", ".tsx"]}
+
+
+@pytest.mark.parametrize("raw", [
+    ["backend"],
+    {"path": 3},
+    {"extensions": [".py", 1]},
+    {"extensions": [""]},
+    {"languages": {"python": True}},
+])
+def test_normalize_rejects_malformed(raw):
+    with pytest.raises(ValueError):
+        normalize_filters(raw)
+
+
+def test_build_where_no_filters():
+    assert build_where({}) is None
+    assert not is_empty_where(None)
+
+
+@pytest.mark.parametrize("path", ["backend", "backend/", "backend/*", "backend/**"])
+def test_top_level_dir_uses_top_dir(path):
+    assert build_where({"path": path}) == {"top_dir": "backend"}
+
+
+def test_single_values_are_equalities_and_lists_are_in():
+    assert build_where({"extensions": [".py"]}) == {"extension": ".py"}
+    assert build_where({"extensions": [".jsx", ".tsx"], "languages": ["javascript"]}) == {
+        "$and": [{"extension": {"$in": [".jsx", ".tsx"]}}, {"language": "javascript"}]
+    }
+
+
+def test_glob_resolves_against_known_paths():
+    where = build_where({"path": "backend/rag/*.py"}, known_paths=lambda: PATHS)
+    assert where == {"filepath": {"$in": ["repo-main/backend/rag/hyde.py"]}}
+    # A dotted name is taken as a file, not a directory
+    assert build_where({"path": "app.py"}, known_paths=lambda: PATHS) == {"filepath": {"$in": []}}
+
+
+def test_glob_without_matches_is_empty_in():
+    where = build_where({"path": "docs/**/*.md"}, known_paths=lambda: PATHS)
+    assert where == {"filepath": {"$in": []}}
+    assert is_empty_where(where)
+    assert not matches({"filepath": "repo-main/backend/app.py"}, where)
+
+
+def test_glob_without_known_paths_is_empty_in():
+    assert is_empty_where(build_where({"path": "backend/*.py"}))
+
+
+def test_empty_in_inside_and_is_empty():
+    where = build_where({"path": "docs/*.md", "extensions": [".md"]}, known_paths=lambda: PATHS)
+    assert where == {"$and": [{"filepath": {"$in": []}}, {"extension": ".md"}]}
+    assert is_empty_where(where)
+    assert not is_empty_where(build_where({"path": "backend/*.py", "extensions": [".py"]}, known_paths=lambda: PATHS))
+
+
+def test_empty_language_in_is_not_the_empty_glob():
+    # Only the filepath clause marks "glob matched nothing"
+    assert not is_empty_where({"language": {"$in": []}})
+    assert not matches({"language": "python"}, {"language": {"$in": []}})
+
+
+@pytest.mark.parametrize("filepath,glob,expected", [
+    ("backend/app.py", "backend", True),
+    ("backend/app.py", "back", False),
+    ("repo-main/backend/app.py", "backend/app.py", True),  # ZIP wrapper folder dropped
+    ("backend/rag/hyde.py", "backend/*.py", True),         # * crosses '/'
+    ("backend/rag/hyde.py", "**/hyde.py", True),
+    ("frontend/src/App.jsx", "*.py", False),
+    ("backend\\app.py", "backend/*", True),
+])
+def test_path_matches(filepath, glob, expected):
+    assert path_matches(filepath, glob) is expected
+
+
+def test_matches_operators():
+    metadata = {"extension": ".py", "language": "python"}
+    assert matches(metadata, None)
+    assert matches(metadata, {"extension": {"$eq": ".py"}, "language": {"$ne": "sql"}})
+    assert matches(metadata, {"$or": [{"extension": ".jsx"}, {"language": "python"}]})
+    assert not matches(metadata, {"extension": {"$nin": [".py"]}})
+    assert not matches(metadata, {"$and": [{"extension": ".py"}, {"language": "sql"}]})
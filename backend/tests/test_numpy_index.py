@@ -0,0 +1,140 @@
+import os
+import json
+
+import numpy as np
+import pytest
+
+import numpy_index
+from numpy_index import NumpyCollection, SIDECAR_FILE, VECTORS_FILE
+
+
+def _vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+
+def _add(collection, start, vectors, **metadata):
+    ids = [f"c{start + i}" for i in range(len(vectors))]
+    collection.add(ids=ids, documents=[f"doc {i}" for i in ids],
+                   metadatas=[dict(metadata, row=start + i) for i in range(len(vectors))],
+                   embeddings=vectors.tolist())
+    return ids
+
+
+def test_exact_nearest_neighbour_with_pending_rows(tmp_path):
+    collection = NumpyCollection(str(tmp_path), "alpha")
+    vectors = _vectors(20)
+    _add(collection, 0, vectors)
+
+    # Unflushed rows are searchable
+    result = collection.query([vectors[7].tolist()], n_results=3)
+    assert result["ids"][0][0] == "c7"
+    assert result["distances"][0][0] == pytest.approx(0.0, abs=1e-5)
+    assert result["distances"][0] == sorted(result["distances"][0])
+    assert len(result["ids"][0]) == 3
+
+
+def test_flushes_write_segments_and_reload(tmp_path):
+    collection = NumpyCollection(str(tmp_path), "alpha")
+    vectors = _vectors(30)
+    for batch in range(3):
+        _add(collection, batch * 10, vectors[batch * 10:(batch + 1) * 10])
+        collection.flush()
+
+    files = sorted(name for name in os.listdir(tmp_path / "alpha") if name.endswith(".npy"))
+    assert files == ["vectors.1.npy", "vectors.2.npy", VECTORS_FILE]
+    with open(tmp_path / "alpha" / SIDECAR_FILE, encoding="utf-8") as f:
+        assert json.load(f)["segments"] == [VECTORS_FILE, "vectors.1.npy", "vectors.2.npy"]
+
+    reopened = NumpyCollection(str(tmp_path), "alpha")
+    assert reopened.count() == 30
+    assert reopened.query([vectors[25].tolist()], n_results=1)["ids"] == [["c25"]]
+    embeddings = reopened.get(ids=["c3", "c25"], include=["embeddings"])["embeddings"]
+    expected = vectors[[3, 25]] / np.linalg.norm(vectors[[3, 25]], axis=1, keepdims=True)
+    assert np.allclose(embeddings, expected, atol=1e-6)
+
+
+def test_segments_compact_past_the_limit(tmp_path, monkeypatch):
+    monkeypatch.setattr(numpy_index, "MAX_SEGMENTS", 2)
+    collection = NumpyCollection(str(tmp_path), "alpha")
+    vectors = _vectors(12)
+    for batch in range(3):
+        _add(collection, batch * 4, vectors[batch * 4:(batch + 1) * 4])
+        collection.flush()
+
+    assert [n for n in os.listdir(tmp_path / "alpha") if n.endswith(".npy")] == [VECTORS_FILE]
+    assert len(np.load(tmp_path / "alpha" / VECTORS_FILE)) == 12
+    assert NumpyCollection(str(tmp_path), "alpha").query([vectors[9].tolist()], n_results=1)["ids"] == [["c9"]]
+
+
+def test_compact_merges_for_export(tmp_path):
+    collection = NumpyCollection(str(tmp_path), "alpha")
+    vectors = _vectors(6)
+    _add(collection, 0, vectors[:3])
+    collection.flush()
+    _add(collection, 3, vectors[3:])
+    collection.compact()
+
+    assert len(np.load(collection.file_paths()["vectors"])) == 6
+    assert NumpyCollection(str(tmp_path), "alpha").count() == 6
+
+
+def test_legacy_sidecar_without_segments(tmp_path):
+    collection = NumpyCollection(str(tmp_path), "alpha")
+    vectors = _vectors(4)
+    _add(collection, 0, vectors)
+    collection.flush()
+    sidecar_path = tmp_path / "alpha" / SIDECAR_FILE
+    sidecar = json.loads(sidecar_path.read_text(encoding="utf-8"))
+    del sidecar["segments"]
+    sidecar_path.write_text(json.dumps(sidecar), encoding="utf-8")
+
+    assert NumpyCollection(str(tmp_path), "alpha").query([vectors[2].tolist()], n_results=1)["ids"] == [["c2"]]
+
+
+def test_where_subset(tmp_path):
+    collection = NumpyCollection(str(tmp_path), "alpha")
+    vectors = _vectors(12)
+    _add(collection, 0, vectors[:4], language="python", top_dir="backend")
+    _add(collection, 4, vectors[4:8], language="javascript", top_dir="frontend")
+    collection.flush()
+    _add(collection, 8, vectors[8:], language="python", top_dir="scripts")  # still pending
+
+    def ids(where):
+        return set(collection.get(where=where)["ids"])
+
+    assert ids({"language": "javascript"}) == {"c4", "c5", "c6", "c7"}
+    assert ids({"top_dir": {"$in": ["backend", "scripts"]}}) == {f"c{i}" for i in (0, 1, 2, 3, 8, 9, 10, 11)}
+    assert ids({"$and": [{"language": "python"}, {"top_dir": {"$ne": "backend"}}]}) == {"c8", "c9", "c10", "c11"}
+    assert ids({"$or": [{"top_dir": "frontend"}, {"row": 0}]}) == {"c0", "c4", "c5", "c6", "c7"}
+    assert ids({"top_dir": {"$nin": ["backend", "frontend"]}}) == {"c8", "c9", "c10", "c11"}
+    assert ids({"filepath": {"$in": []}}) == set()
+
+    # Filtered query: only matching rows, even when a closer row exists outside the filter
+    result = collection.query([vectors[5].tolist()], n_results=10, where={"language": "python"})
+    assert "c5" not in result["ids"][0]
+    assert len(result["ids"][0]) == 8
+
+    with pytest.raises(ValueError):
+        collection.get(where={"row": {"$gt": 3}})
+
+
+def test_get_paging_and_validation(tmp_path):
+    collection = NumpyCollection(str(tmp_path), "alpha")
+    _add(collection, 0, _vectors(5))
+    assert collection.get(limit=2, offset=2, include=[])["ids"] == ["c2", "c3"]
+    assert collection.get(offset=4, include=[])["ids"] == ["c4"]
+
+    with pytest.raises(ValueError, match="Duplicate"):
+        _add(collection, 4, _vectors(1))
+    with pytest.raises(ValueError, match="dimension"):
+        _add(collection, 10, _vectors(1, dim=4))
+
+
+def test_list_and_delete(tmp_path):
+    NumpyCollection(str(tmp_path), "alpha").flush()  # nothing pending: no sidecar yet
+    collection = NumpyCollection(str(tmp_path), "beta")
+    _add(collection, 0, _vectors(2))
+    collection.flush()
+    assert NumpyCollection.list_names(str(tmp_path)) == ["beta"]
+    assert NumpyCollection.delete(str(tmp_path), "beta")
+    assert NumpyCollection.list_names(str(tmp_path)) == []
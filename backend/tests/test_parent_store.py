@@ -0,0 +1,133 @@
+import os
+import json
+
+import pytest
+
+from rag.parent_cache import ParentTextCache
+from rag.parent_store import ParentStore, PACK_FILE, INDEX_FILE
+
+
+TEXT = "def get_groq_response(context, query):\n    return client.chat(context)\n" * 20
+
+
+@pytest.mark.parametrize("compression", ["none", "zlib"])
+def test_write_flush_reopen(tmp_path, compression):
+    store = ParentStore(str(tmp_path), "alpha", compression=compression)
+    store.write("app.py", TEXT)
+    store.write("empty.py", "")
+    store.write("unicode.py", "naïve = 'ünïcödé' ✓\n")
+    assert store.read("app.py") == TEXT  # readable before flush
+    store.close()
+
+    reopened = ParentStore(str(tmp_path), "alpha", compression=compression)
+    assert reopened.list_ids() == ["app.py", "empty.py", "unicode.py"]
+    assert reopened.read("app.py") == TEXT
+    assert reopened.read("empty.py") == ""
+    assert reopened.read("unicode.py") == "naïve = 'ünïcödé' ✓\n"
+    assert reopened.read("missing.py") is None
+    reopened.close()
+
+
+def test_zlib_pack_is_smaller(tmp_path):
+    raw = ParentStore(str(tmp_path), "raw", compression="none")
+    packed = ParentStore(str(tmp_path), "packed", compression="zlib")
+    for store in (raw, packed):
+        store.write("app.py", TEXT)
+        store.close()
+    assert packed.pack_size() < raw.pack_size()
+
+
+def test_unknown_compression_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        ParentStore(str(tmp_path), "alpha", compression="lz4")
+
+
+def test_rewrite_keeps_latest_text(tmp_path):
+    store = ParentStore(str(tmp_path), "alpha")
+    store.write("app.py", "old")
+    store.write("app.py", "new")
+    store.close()
+    assert ParentStore(str(tmp_path), "alpha").read("app.py") == "new"
+
+
+def test_rewrite_with_cache_invalidates_on_flush(tmp_path):
+    cache = ParentTextCache(max_bytes=1 << 20)
+    store = ParentStore(str(tmp_path), "alpha", cache=cache)
+    store.write("app.py", "old")
+    store.flush()
+    assert store.read("app.py") == "old"
+    assert cache.stats()["entries"] == 1
+
+    store.write("app.py", "new")
+    assert cache.stats()["entries"] == 1     # dropped on flush, not per write
+    assert store.read("app.py") == "new"     # the stale copy is never served
+    store.flush()
+    assert cache.stats()["entries"] == 0
+    assert store.read("app.py") == "new"
+    store.close()
+
+
+def test_compact_frees_deleted_and_overwritten_records(tmp_path):
+    store = ParentStore(str(tmp_path), "alpha", compression="none")
+    for i in range(5):
+        store.write(f"f{i}.py", f"file {i}\n" * 50)
+    store.write("f0.py", "rewritten\n")
+    store.delete(["f1.py", "f2.py"])
+    pack_path = os.path.join(store.repo_dir, PACK_FILE)
+    before = os.path.getsize(pack_path)
+
+    freed = store.compact()
+
+    assert freed > 0
+    assert os.path.getsize(pack_path) == before - freed
+    assert store.list_ids() == ["f0.py", "f3.py", "f4.py"]
+    assert store.read("f0.py") == "rewritten\n"
+    assert store.read("f1.py") is None
+    assert store.read("f4.py") == "file 4\n" * 50
+    assert store.compact() == 0  # nothing left to reclaim
+
+    # Appends after a compaction land after the rewritten records
+    store.write("f5.py", "late\n")
+    store.close()
+    reopened = ParentStore(str(tmp_path), "alpha")
+    assert reopened.read("f3.py") == "file 3\n" * 50
+    assert reopened.read("f5.py") == "late\n"
+
+
+def test_legacy_txt_files_are_packed(tmp_path):
+    repo_dir = tmp_path / "alpha"
+    repo_dir.mkdir()
+    (repo_dir / "server_app.py.txt").write_text(TEXT, encoding="utf-8")
+    (repo_dir / "web_main.jsx.txt").write_text("export default App\n", encoding="utf-8")
+
+    store = ParentStore(str(tmp_path), "alpha")
+
+    assert store.list_ids() == ["server_app.py", "web_main.jsx"]
+    assert store.read("server_app.py") == TEXT
+    assert sorted(os.listdir(repo_dir)) == sorted([PACK_FILE, INDEX_FILE])
+    with open(repo_dir / INDEX_FILE, encoding="utf-8") as f:
+        assert set(json.load(f)["records"]) == {"server_app.py", "web_main.jsx"}
+    store.close()
+
+
+def test_legacy_file_does_not_override_packed_record(tmp_path):
+    store = ParentStore(str(tmp_path), "alpha")
+    store.write("app.py", "packed")
+    store.close()
+    (tmp_path / "alpha" / "app.py.txt").write_text("legacy", encoding="utf-8")
+
+    reopened = ParentStore(str(tmp_path), "alpha")
+    assert reopened.read("app.py") == "packed"
+    assert not (tmp_path / "alpha" / "app.py.txt").exists()
+
+
+def test_clear_and_move_to(tmp_path):
+    store = ParentStore(str(tmp_path), "alpha")
+    store.write("app.py", TEXT)
+    store.move_to(str(tmp_path / "retired"))
+    assert not (tmp_path / "alpha").exists()
+    assert store.read("app.py") == TEXT
+
+    store.clear()
+    assert store.list_ids() == []
+    assert store.read("app.py") is None
@@ -0,0 +1,197 @@
+import queue
+import threading
+
+import pytest
+
+from rag.single_flight import SingleFlight, normalize_query
+
+
+def _run(fn, *args):
+    """Start fn(*args) in a thread; join() returns its value or raises its error."""
+    box = {}
+
+    def target():
+        try:
+            box["value"] = fn(*args)
+        except BaseException as e:
+            box["error"] = e
+
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+
+    def join():
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+        if "error" in box:
+            raise box["error"]
+        return box["value"]
+    return join
+
+
+def _wait_for(predicate):
+    for _ in range(500):
+        if predicate():
+            return
+        threading.Event().wait(0.01)
+    raise AssertionError("condition not reached")
+
+
+class _Upstream:
+    """A token stream fed by the test; close() ends it like an aborted HTTP read."""
+
+    def __init__(self):
+        self.queue = queue.Queue()
+        self.closed = threading.Event()
+
+    def tokens(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            yield item
+
+    def close(self):
+        self.closed.set()
+        self.queue.put(None)
+
+    def source(self):
+        return {"model": "fake", "tokens": self.tokens(), "close": self.close}
+
+
+def test_normalize_query_folds_case_and_whitespace():
+    assert normalize_query("  Where is  X?\n") == normalize_query("where is x?")
+
+
+def test_concurrent_duplicates_share_one_call():
+    flight = SingleFlight(enabled=True)
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        release.wait(5)
+        return {"answer": 42}
+
+    key = ("retrieve", ("alpha", 0, 1), "q")
+    leader = _run(flight.do, key, compute)
+    _wait_for(lambda: calls)
+    follower = _run(flight.do, key, compute)
+    _wait_for(lambda: flight.coalesced["retrieve"] == 1)
+    release.set()
+
+    assert leader() == ({"answer": 42}, False)
+    assert follower() == ({"answer": 42}, True)
+    assert len(calls) == 1
+    assert flight.stats()["in_flight"] == 0
+
+
+def test_different_keys_do_not_coalesce():
+    flight = SingleFlight(enabled=True)
+    release = threading.Event()
+    started = []
+
+    def compute(repo):
+        def fn():
+            started.append(repo)
+            release.wait(5)
+            return repo
+        return fn
+
+    # Same generation, same query: only the repo name tells the keys apart
+    alpha = _run(flight.do, ("retrieve", ("alpha", 0, 1), "q"), compute("alpha"))
+    beta = _run(flight.do, ("retrieve", ("beta", 0, 1), "q"), compute("beta"))
+    _wait_for(lambda: len(started) == 2)
+    release.set()
+
+    assert alpha() == ("alpha", False)
+    assert beta() == ("beta", False)
+    assert flight.leaders["retrieve"] == 2
+    assert flight.coalesced["retrieve"] == 0
+
+
+def test_error_is_shared_and_key_released():
+    flight = SingleFlight(enabled=True)
+    release = threading.Event()
+    key = ("generate", ("alpha", 0, 1), "q")
+
+    def fail():
+        release.wait(5)
+        raise RuntimeError("upstream down")
+
+    leader = _run(flight.do, key, fail)
+    _wait_for(lambda: flight.stats()["in_flight"] == 1)
+    follower = _run(flight.do, key, fail)
+    _wait_for(lambda: flight.coalesced["generate"] == 1)
+    release.set()
+
+    for join in (leader, follower):
+        with pytest.raises(RuntimeError, match="upstream down"):
+            join()
+    assert flight.do(key, lambda: "retried") == ("retried", False)
+
+
+def test_disabled_runs_every_call():
+    flight = SingleFlight(enabled=False)
+    assert flight.do(("retrieve", "k"), lambda: 1) == (1, False)
+    assert flight.stats()["leaders"] == {}
+
+
+def test_stream_replays_parts_to_late_joiner():
+    flight = SingleFlight(enabled=True)
+    upstream = _Upstream()
+    key = ("generate", ("alpha", 0, 1), "q")
+
+    first, shared = flight.stream(key, upstream.source)
+    assert not shared and first["model"] == "fake"
+    tokens = first["tokens"]
+    upstream.queue.put("a")
+    assert next(tokens) == "a"
+
+    second, shared = flight.stream(key, lambda: pytest.fail("a follower must not start the upstream"))
+    assert shared
+    upstream.queue.put("b")
+    upstream.queue.put(None)
+
+    assert "".join(tokens) == "b"
+    assert "".join(second["tokens"]) == "ab"
+    first["close"]()
+    second["close"]()
+    _wait_for(lambda: flight.stats()["in_flight"] == 0)
+    assert upstream.closed.is_set()
+
+
+def test_stream_upstream_closed_when_last_subscriber_leaves():
+    flight = SingleFlight(enabled=True)
+    upstream = _Upstream()
+    key = ("generate", ("alpha", 0, 1), "q")
+
+    first, _ = flight.stream(key, upstream.source)
+    second, _ = flight.stream(key, upstream.source)
+    upstream.queue.put("a")
+    assert next(first["tokens"]) == "a"
+
+    first["close"]()
+    first["close"]()  # closing twice only unsubscribes once
+    assert not upstream.closed.is_set()
+
+    second["close"]()
+    assert upstream.closed.wait(5)
+    _wait_for(lambda: flight.stats()["in_flight"] == 0)
+
+    # The key is free again: the next request starts a fresh upstream
+    fresh = _Upstream()
+    third, shared = flight.stream(key, fresh.source)
+    assert not shared
+    third["close"]()
+    assert fresh.closed.wait(5)
+
+
+def test_stream_start_failure_is_raised_and_key_released():
+    flight = SingleFlight(enabled=True)
+
+    def start():
+        raise ConnectionError("no provider")
+
+    with pytest.raises(ConnectionError):
+        flight.stream(("generate", "k"), start)
+    assert flight.stats()["in_flight"] == 0
@@ -0,0 +1,147 @@
+import os
+import io
+import json
+import tarfile
+import hashlib
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("chromadb")
+pytest.importorskip("sentence_transformers")
+
+import snapshot
+import vector_store
+from rag.answer_cache import SemanticAnswerCache
+from rag.parent_child_retriever import ParentChildRetriever
+
+
+FILES = {
+    "server/app.py": "def get_groq_response(context, query):\n    \"\"\"Call the Groq API.\"\"\"\n    return client.chat(context)\n" * 3,
+    "lib/math_utils.py": "MAX_TERMS = 8\n\ndef add_numbers(a, b):\n    return a + b  # arithmetic helper\n" * 3,
+}
+
+
+class HashingEngine:
+    """Deterministic bag-of-words vectors, so no model is downloaded."""
+    model_name = "test-hashing"
+    embedding_dim = 16
+
+    def embed_text(self, text):
+        vector = [0.0] * self.embedding_dim
+        for word in text.split():
+            vector[int(hashlib.md5(word.encode()).hexdigest(), 16) % self.embedding_dim] += 1.0
+        return vector
+
+    def embed_texts(self, texts, batch_size=64):
+        return [self.embed_text(t) for t in texts]
+
+
+def _pipeline(root):
+    store = vector_store.VectorStore(persist_directory=str(root / "chroma"))
+    retriever = ParentChildRetriever(store)
+    retriever.parent_store_dir = str(root / "parents")
+    retriever.parent_staging_dir = str(root / "parents" / ".staging")
+    retriever.lexical_index_dir = str(root / "lexical")
+    retriever.symbol_index_dir = str(root / "symbols")
+    return SimpleNamespace(vector_store=store, parent_child_retriever=retriever,
+                           answer_cache=SemanticAnswerCache(), repository_metadata={})
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    monkeypatch.setattr(vector_store, "EmbeddingEngine", HashingEngine)
+    monkeypatch.setattr(snapshot, "CHUNKS_DIR", str(tmp_path / "chunks"))
+
+    source = tmp_path / "src"
+    files = []
+    for rel, text in FILES.items():
+        path = source / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+        files.append((str(path), rel))
+
+    pipeline = _pipeline(tmp_path / "a")
+    retriever = pipeline.parent_child_retriever
+    chunks, metadatas = retriever.split_parent_child_documents(files, "alpha")
+    retriever.store_child_embeddings(chunks, metadatas, "alpha", backend="numpy")
+    return SimpleNamespace(tmp=tmp_path, pipeline=pipeline, archive=str(tmp_path / "alpha.cgsnap"))
+
+
+def _search(pipeline, repo_name, query="add numbers arithmetic helper"):
+    result = pipeline.parent_child_retriever.retrieve_parent_context(query, repo_name, n_results=2,
+                                                                    rerank=False, mmr=False)
+    assert not result.get("error")
+    return [(r["source"], r["chunk"]) for r in result["results"]]
+
+
+@pytest.mark.parametrize("backend", ["numpy", "chroma"])
+def test_round_trip_into_another_store(env, backend):
+    manifest = snapshot.export_snapshot(env.pipeline, "alpha", env.archive)
+    assert manifest["repo_name"] == "alpha" and manifest["embedding_model"] == "test-hashing"
+    assert snapshot.peek_manifest(env.archive)["files"] == manifest["files"]
+
+    target = _pipeline(env.tmp / "b")
+    summary = snapshot.import_snapshot(target, env.archive, repo_name="beta", backend=backend)
+    assert summary["status"] == "success"
+    assert summary["vector_count"] == env.pipeline.vector_store.collection_stats("alpha")["count"]
+    assert summary["parent_count"] == len(FILES)
+
+    assert target.vector_store.list_repositories() == ["beta"]
+    assert target.vector_store.list_staged() == []
+    assert _search(target, "beta") == _search(env.pipeline, "alpha")
+    symbols = target.parent_child_retriever.get_symbol_index("beta")
+    assert symbols.lookup("add_numbers")[0]["filepath"] == "lib/math_utils.py"
+    assert os.path.exists(target.parent_child_retriever.lexical_index_prefix("beta") + ".npz")
+
+
+def test_import_replaces_an_existing_repo(env):
+    snapshot.export_snapshot(env.pipeline, "alpha", env.archive)
+    snapshot.import_snapshot(env.pipeline, env.archive, repo_name="alpha", backend="chroma")
+
+    store = env.pipeline.vector_store
+    assert store.list_repositories() == ["alpha"] and store.list_staged() == []
+    assert getattr(store.get_collection("alpha"), "backend", "chroma") == "chroma"
+    assert _search(env.pipeline, "alpha")[0][0] == "lib/math_utils.py"
+    assert os.listdir(env.pipeline.parent_child_retriever.parent_staging_dir) == []
+
+
+def _rewrite(archive, path, member_name, data):
+    """Copy archive to path with one member's bytes replaced (manifest untouched)."""
+    with tarfile.open(archive) as src, tarfile.open(path, "w") as dst:
+        for member in src:
+            payload = src.extractfile(member).read() if member.isfile() else None
+            if member.name == member_name:
+                payload = data
+                member.size = len(data)
+            dst.addfile(member, io.BytesIO(payload) if payload is not None else None)
+
+
+def test_checksum_mismatch_is_rejected_and_keeps_the_live_repo(env):
+    snapshot.export_snapshot(env.pipeline, "alpha", env.archive)
+    before = _search(env.pipeline, "alpha")
+    with tarfile.open(env.archive) as tar:
+        sidecar = json.loads(tar.extractfile("sidecar.json").read())
+    sidecar["documents"][0] = "tampered"
+    corrupt = str(env.tmp / "corrupt.cgsnap")
+    _rewrite(env.archive, corrupt, "sidecar.json", json.dumps(sidecar).encode())
+
+    with pytest.raises(ValueError, match="sidecar.json is corrupt"):
+        snapshot.import_snapshot(env.pipeline, corrupt, repo_name="alpha")
+
+    store = env.pipeline.vector_store
+    assert store.list_repositories() == ["alpha"] and store.list_staged() == []
+    assert _search(env.pipeline, "alpha") == before
+    assert os.listdir(env.pipeline.parent_child_retriever.parent_staging_dir) == []
+
+
+def test_other_model_and_non_snapshots_are_rejected(env, monkeypatch):
+    snapshot.export_snapshot(env.pipeline, "alpha", env.archive)
+    monkeypatch.setattr(HashingEngine, "model_name", "other-model")
+    with pytest.raises(ValueError, match="re-index instead"):
+        snapshot.import_snapshot(_pipeline(env.tmp / "b"), env.archive)
+
+    junk = env.tmp / "junk.cgsnap"
+    junk.write_bytes(b"not a tar archive")
+    with pytest.raises(ValueError, match="Not a CodeGenius snapshot"):
+        snapshot.import_snapshot(env.pipeline, str(junk))
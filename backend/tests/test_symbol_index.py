@@ -0,0 +1,114 @@
+import pytest
+
+from rag.symbol_index import SymbolIndex, extract_symbols, is_lookup_question, query_symbols
+
+
+PYTHON = '''\
+MAX_UPLOAD_SIZE = 100
+default_name = "x"
+
+
+@app.route("/api/upload")
+def upload_repository():
+    return extract_zip_file(path)
+
+
+class ParentStore:
+    def write(self, parent_id, content):
+        pass
+
+    async def flush(self):
+        pass
+'''
+
+JS = '''\
+export default function renderApp() {
+  return <App />;
+}
+
+export const fetchRepos = async (url) => {
+  if (url) {
+    return get(url);
+  }
+};
+
+class RepoList extends Component {
+  render() { return null; }
+}
+'''
+
+
+@pytest.mark.parametrize("query", [
+    "where is `extract_zip_file` defined?",
+    "Where is extract_zip_file defined",
+    "which file defines ParentChildRetriever?",
+    "In which file is the class ParentStore defined?",
+    "where are upload_repository and extract_zip_file defined",
+    "definition of vector_store.query",
+    "can you show me the definition of the function `build_where` in this repo?",
+    "where's MAX_UPLOAD_SIZE declared",
+])
+def test_lookup_questions(query):
+    assert is_lookup_question(query)
+
+
+@pytest.mark.parametrize("query", [
+    "where is extract_zip_file called?",
+    "which files use ParentChildRetriever",
+    "where is the upload defined",                     # no code-like name
+    "why does extract_zip_file fail on empty archives",
+    "where is extract_zip_file defined and how is it tested",
+    "explain how ParentStore is implemented",
+])
+def test_not_lookup_questions(query):
+    assert not is_lookup_question(query)
+
+
+def test_query_symbols_keeps_code_like_names_in_order():
+    assert query_symbols("does `upload` call extract_zip_file or ParentStore.write, and extract_zip_file?") == [
+        "upload", "extract_zip_file", "ParentStore.write"
+    ]
+    assert query_symbols("where is the upload handler") == []
+
+
+def test_extract_python_symbols():
+    symbols = {s["name"]: s for s in extract_symbols(PYTHON, "app.py")}
+    assert set(symbols) == {"MAX_UPLOAD_SIZE", "upload_repository", "ParentStore",
+                            "ParentStore.write", "ParentStore.flush"}
+    assert symbols["MAX_UPLOAD_SIZE"]["kind"] == "constant"
+    assert symbols["upload_repository"] == {"name": "upload_repository", "kind": "function",
+                                            "line_start": 5, "line_end": 7}   # from the decorator
+    assert symbols["ParentStore"]["kind"] == "class"
+    assert (symbols["ParentStore"]["line_start"], symbols["ParentStore"]["line_end"]) == (10, 15)
+    assert symbols["ParentStore.flush"]["kind"] == "method"
+
+
+def test_extract_python_syntax_error_yields_nothing():
+    assert extract_symbols("def broken(:\n", "broken.py") == []
+
+
+def test_extract_js_symbols_with_brace_extent():
+    symbols = {s["name"]: s for s in extract_symbols(JS, "App.jsx")}
+    assert set(symbols) == {"renderApp", "fetchRepos", "RepoList"}
+    assert (symbols["renderApp"]["line_start"], symbols["renderApp"]["line_end"]) == (1, 3)
+    assert (symbols["fetchRepos"]["line_start"], symbols["fetchRepos"]["line_end"]) == (5, 9)
+    assert symbols["RepoList"]["kind"] == "class"
+
+
+def test_extract_skips_control_words_and_unknown_extensions():
+    c_code = "int main(void) {\n  if (x) {\n    return 1;\n  }\n}\n"
+    assert [s["name"] for s in extract_symbols(c_code, "main.c")] == ["main"]
+    assert extract_symbols("def f(): pass", "notes.txt") == []
+
+
+def test_symbol_index_lookup_and_round_trip(tmp_path):
+    index = SymbolIndex.build([{"text": PYTHON, "filename": "app.py", "filepath": "server/app.py", "parent_id": "parent_0"}])
+    assert index.lookup("ParentStore")[0]["filepath"] == "server/app.py"
+    assert [d["name"] for d in index.lookup("write")] == ["ParentStore.write"]   # short method name
+    assert index.lookup("parentstore")[0]["name"] == "ParentStore"            # case-insensitive fallback
+    assert index.lookup("missing") == []
+
+    path = str(tmp_path / "symbols" / "alpha.json")
+    index.save(path)
+    assert SymbolIndex.load(path).definitions == index.definitions
+    assert SymbolIndex.load(str(tmp_path / "none.json")) is None
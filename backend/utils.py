@@ -26,6 +26,34 @@ SUPPORTED_DOCUMENT_EXTENSIONS = {
 
 SUPPORTED_EXTENSIONS = SUPPORTED_CODE_EXTENSIONS | SUPPORTED_DOCUMENT_EXTENSIONS
 
+# ── Language per extension — stored as chunk metadata for filtered search ─────
+LANGUAGE_BY_EXTENSION = {
+    '.py': 'python',
+    '.js': 'javascript', '.jsx': 'javascript',
+    '.ts': 'typescript', '.tsx': 'typescript',
+    '.java': 'java',
+    '.c': 'c', '.h': 'c',
+    '.cpp': 'cpp', '.cc': 'cpp', '.cxx': 'cpp', '.hpp': 'cpp',
+    '.cs': 'csharp',
+    '.go': 'go', '.rs': 'rust', '.rb': 'ruby', '.php': 'php',
+    '.xml': 'xml', '.pom': 'xml',
+    '.yaml': 'yaml', '.yml': 'yaml',
+    '.sh': 'shell', '.bash': 'shell',
+    '.sql': 'sql', '.html': 'html',
+    '.css': 'css', '.scss': 'css',
+    '.properties': 'properties', '.gradle': 'gradle',
+}
+
+
+def detect_language(file_path: str) -> str:
+    """Language name for a file ('document' for PDFs/Office files, else 'other')."""
+    ext = Path(file_path).suffix.lower()
+    if ext in LANGUAGE_BY_EXTENSION:
+        return LANGUAGE_BY_EXTENSION[ext]
+    if ext in SUPPORTED_DOCUMENT_EXTENSIONS:
+        return 'document'
+    return 'other'
+
 
 # ── FIX 1: Noise files jo retrieval kharab karte hain — inhe SKIP karo ────────
 # Yeh files har query pe retrieve hoti thi aur score giraati thi
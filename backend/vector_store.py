@@ -1,37 +1,420 @@
 import chromadb
 from chromadb.config import Settings
+import os
 import json
 import sys
 import gc
+import time
+import shutil
+import uuid
+import queue
+import threading
 import traceback
-from typing import List, Dict, Any
+from collections import OrderedDict
+from typing import List, Dict, Any, Optional, Callable
+import numpy as np
 from embeddings import EmbeddingEngine
+from numpy_index import NumpyCollection
+
+
+# How many collection handles stay open at once. One shared server answers
+# for many repos, so handles are kept in an LRU instead of a single slot.
+MAX_OPEN_COLLECTIONS = int(os.getenv('MAX_OPEN_COLLECTIONS', 8))
+
+# Index backend for new collections: "chroma" (HNSW + SQLite) or "numpy"
+# (exact in-process search, best for repos under ~100k chunks).
+# Can be overridden per collection at creation time.
+VECTOR_BACKEND = os.getenv('VECTOR_BACKEND', 'chroma').lower()
+SUPPORTED_BACKENDS = ('chroma', 'numpy')
+
+# Ingest tuning. Store batches are what one collection.add() persists; embed
+# batches are the encoder's micro-batch size inside each store batch.
+# Pipelined ingest embeds batch N+1 while a writer thread stores batch N.
+STORE_BATCH_SIZE = int(os.getenv('STORE_BATCH_SIZE', 100))
+EMBED_BATCH_SIZE = int(os.getenv('EMBED_BATCH_SIZE', 64))
+INGEST_PIPELINED = os.getenv('INGEST_PIPELINED', 'true').lower() in ('1', 'true', 'yes')
+INGEST_QUEUE_DEPTH = max(1, int(os.getenv('INGEST_QUEUE_DEPTH', 2)))
+
+# Snapshot export pages through Chroma; import bulk-loads stored vectors
+EXPORT_PAGE_SIZE = 5000
+IMPORT_BATCH_SIZE = 5000
+# Rows per metadata page when collection stats are rebuilt from a scan
+STATS_PAGE_SIZE = 5000
+
+# HNSW parameters for Chroma collections, picked by expected chunk count.
+#   M               graph degree — recall and memory both grow with it
+#   construction_ef candidate list at build — slower build, better graph
+#   search_ef       candidate list per query — the recall/latency knob
+# Starting points; re-check with evaluation/hnsw_sweep.py on real embeddings.
+HNSW_PRESETS = {
+    "small":  {"M": 16, "construction_ef": 100, "search_ef": 64},    # < 50k chunks
+    "medium": {"M": 24, "construction_ef": 200, "search_ef": 128},   # < 250k chunks
+    "large":  {"M": 32, "construction_ef": 256, "search_ef": 200},   # monorepos
+}
+HNSW_PRESET_LIMITS = (("small", 50_000), ("medium", 250_000))
+HNSW_PARAM_KEYS = ("M", "construction_ef", "search_ef")
+
+
+# Rebuilds are written to a collection named <repo><STAGING_MARKER><hex> beside
+# the live one, then renamed over it (publish_staged_collection). Replaced
+# collections get such a name too until they are dropped. Neither kind is a
+# repository: they are kept out of the handle LRU and list_repositories().
+STAGING_MARKER = ".staging-"
+
+
+def staging_name(repo_name: str) -> str:
+    """A fresh staging collection name for repo_name."""
+    return f"{repo_name}{STAGING_MARKER}{uuid.uuid4().hex[:12]}"
+
+
+def staged_owner(collection_name: str) -> Optional[str]:
+    """The repo a staging collection name belongs to, or None for a repo's own name."""
+    repo_name, marker, _ = collection_name.rpartition(STAGING_MARKER)
+    return repo_name if marker else None
+
+
+def hnsw_preset_for(expected_count: Optional[int]) -> str:
+    """Preset name for a collection expected to hold expected_count chunks."""
+    if not expected_count:
+        return "small"
+    for name, limit in HNSW_PRESET_LIMITS:
+        if expected_count < limit:
+            return name
+    return "large"
+
+
+def resolve_hnsw_params(expected_count: Optional[int] = None,
+                        preset: Optional[str] = None,
+                        overrides: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+    """
+    HNSW params for a new collection: preset (explicit or size-based), then
+    HNSW_M / HNSW_CONSTRUCTION_EF / HNSW_SEARCH_EF env vars, then overrides.
+    """
+    preset = (preset or "auto").lower()
+    if preset == "auto":
+        preset = hnsw_preset_for(expected_count)
+    if preset not in HNSW_PRESETS:
+        raise ValueError(f"Unknown HNSW preset '{preset}'. Use one of: auto, {', '.join(HNSW_PRESETS)}")
+
+    params = dict(HNSW_PRESETS[preset])
+    for key in HNSW_PARAM_KEYS:
+        env_value = os.getenv(f"HNSW_{key.upper()}")
+        if env_value:
+            params[key] = int(env_value)
+    for key, value in (overrides or {}).items():
+        if key not in HNSW_PARAM_KEYS:
+            raise ValueError(f"Unknown HNSW parameter '{key}'. Use one of: {', '.join(HNSW_PARAM_KEYS)}")
+        params[key] = int(value)
+    for key, value in params.items():
+        if value < 2:
+            raise ValueError(f"HNSW parameter {key} must be >= 2")
+    return params
+
+
+def hnsw_metadata(params: Dict[str, int]) -> Dict[str, Any]:
+    """Chroma collection metadata carrying the HNSW settings."""
+    metadata: Dict[str, Any] = {"hnsw:space": "cosine"}
+    for key in HNSW_PARAM_KEYS:
+        metadata[f"hnsw:{key}"] = params[key]
+    return metadata
 
 
 class VectorStore:
 
-    def __init__(self, persist_directory: str = "./chroma_data"):
+    def __init__(self, persist_directory: str = "./chroma_data", max_open_collections: int = MAX_OPEN_COLLECTIONS):
         self.persist_directory = persist_directory
         self.client = chromadb.PersistentClient(path=persist_directory)
+        self.numpy_index_dir = os.path.join(persist_directory, "numpy_index")
         self.embedding_engine = EmbeddingEngine()
+
+        # Default repo — used when a request does not name one (set by the app via set_default())
         self.collection = None
         self.current_repo = None
 
+        # LRU of open collection handles: repo_name -> collection
+        self.max_open_collections = max(1, max_open_collections)
+        self._collections: "OrderedDict[str, Any]" = OrderedDict()
+        self._collections_lock = threading.RLock()
+        # Handles of staged rebuilds, by staging name (never in the LRU)
+        self._staged_collections: Dict[str, Any] = {}
+        self._evict_listeners: List[Callable[[str], None]] = []
+        self._access_listeners: List[Callable[[str], None]] = []
+
+        # Collection statistics per repo (count, dimension, chunks per file,
+        # last write), kept current on writes and persisted next to the store
+        # so queries and health checks never need a count() round trip
+        self.stats_dir = os.path.join(persist_directory, "collection_stats")
+        self._stats: Dict[str, Dict[str, Any]] = {}
+        self._stats_lock = threading.Lock()
+
         # Auto-reconnect: reload the last persisted collection on startup
         self._auto_reconnect()
 
+    # ──────────────────────────────────────────────────────────────────────────
+    # Collection handle cache
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def add_evict_listener(self, callback: Callable[[str], None]) -> None:
+        """Register a callback fired with repo_name when its handle is dropped."""
+        self._evict_listeners.append(callback)
+
+    def add_access_listener(self, callback: Callable[[str], None]) -> None:
+        """Register a callback fired with repo_name whenever its collection is used."""
+        self._access_listeners.append(callback)
+
+    def _notify_accessed(self, repo_name: str) -> None:
+        for callback in self._access_listeners:
+            try:
+                callback(repo_name)
+            except Exception as e:
+                print(f"  [VECTOR] Access listener failed for '{repo_name}': {str(e)}", flush=True)
+
+    def _notify_evicted(self, repo_names: List[str]) -> None:
+        for name in repo_names:
+            for callback in self._evict_listeners:
+                try:
+                    callback(name)
+                except Exception as e:
+                    print(f"  [VECTOR] Evict listener failed for '{name}': {str(e)}", flush=True)
+
+    def _cache_put(self, repo_name: str, collection) -> None:
+        """Insert/refresh a handle and evict least-recently-used ones over capacity."""
+        evicted = []
+        with self._collections_lock:
+            self._collections[repo_name] = collection
+            self._collections.move_to_end(repo_name)
+            while len(self._collections) > self.max_open_collections:
+                name, handle = self._collections.popitem(last=False)
+                if name == self.current_repo:
+                    # Never evict the default repo — re-insert it as most recent
+                    self._collections[name] = handle
+                    continue
+                evicted.append(name)
+
+        for name in evicted:
+            print(f"  [VECTOR] Evicted collection handle '{name}' (LRU)", flush=True)
+        self._notify_evicted(evicted)
+
+    def _cache_drop(self, repo_name: str) -> None:
+        with self._collections_lock:
+            dropped = self._collections.pop(repo_name, None) is not None
+        if dropped:
+            self._notify_evicted([repo_name])
+
+    def get_collection(self, repo_name: str):
+        """
+        Return the open collection for repo_name, loading it from disk on a miss.
+        Returns None if the repo was never indexed. Safe to call from any thread.
+        """
+        if not repo_name:
+            return None
+        if staged_owner(repo_name):
+            with self._collections_lock:
+                return self._staged_collections.get(repo_name)
+
+        with self._collections_lock:
+            collection = self._collections.get(repo_name)
+            if collection is not None:
+                self._collections.move_to_end(repo_name)
+        if collection is not None:
+            self._notify_accessed(repo_name)
+            return collection
+
+        # Load outside the lock so a slow open does not block other repos
+        try:
+            if NumpyCollection.exists(self.numpy_index_dir, repo_name):
+                collection = NumpyCollection(self.numpy_index_dir, repo_name)
+            else:
+                collection = self.client.get_collection(name=repo_name)
+        except Exception:
+            return None
+
+        with self._collections_lock:
+            # Another thread may have loaded it meanwhile — keep the first handle
+            existing = self._collections.get(repo_name)
+            if existing is not None:
+                self._collections.move_to_end(repo_name)
+        if existing is not None:
+            self._notify_accessed(repo_name)
+            return existing
+        self._cache_put(repo_name, collection)
+        self._notify_accessed(repo_name)
+        print(f"  [VECTOR] Opened collection handle '{repo_name}'", flush=True)
+        return collection
+
+    def has_repository(self, repo_name: str) -> bool:
+        return self.get_collection(repo_name) is not None
+
+    def delete_repository(self, repo_name: str) -> None:
+        """Delete a repo's collection and stats; clears the default if it was this repo."""
+        self._delete_existing(repo_name)
+        if self.current_repo == repo_name:
+            self.collection = None
+            self.current_repo = None
+
+    def list_repositories(self) -> List[str]:
+        return [name for name in self._all_collection_names() if not staged_owner(name)]
+
+    def list_staged(self) -> List[str]:
+        """Staging collections on disk: rebuilds in progress, or leftovers of a crashed one."""
+        return [name for name in self._all_collection_names() if staged_owner(name)]
+
+    def _all_collection_names(self) -> List[str]:
+        names = [c if isinstance(c, str) else c.name for c in self.client.list_collections()]
+        return names + [n for n in NumpyCollection.list_names(self.numpy_index_dir) if n not in names]
+
+    def list_filepaths(self, repo_name: Optional[str] = None) -> List[str]:
+        """Distinct file paths stored in a repo's collection (from collection stats)."""
+        stats = self.collection_stats(repo_name)
+        return sorted(stats["files"]) if stats else []
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Collection statistics
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def collection_stats(self, repo_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        {"count", "dimension", "files": {filepath: chunks}, "last_modified", "backend"}
+        for a repo, or None if it does not exist. Served from memory; loaded
+        from disk on first use, or rebuilt once by scanning the collection
+        for repos indexed before stats were kept. Returns a copy, safe to use
+        while ingest keeps updating the stats.
+        """
+        stats = self._live_stats(repo_name)
+        if stats is None:
+            return None
+        with self._stats_lock:
+            return {**stats, "files": dict(stats["files"])}
+
+    def _live_stats(self, repo_name: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """The stats dict ingest updates in place — read it under _stats_lock."""
+        repo_name = repo_name or self.current_repo
+        if not repo_name:
+            return None
+        with self._stats_lock:
+            stats = self._stats.get(repo_name)
+        if stats is not None:
+            return stats
+
+        stats = self._load_stats(repo_name)
+        if stats is None:
+            collection = self.get_collection(repo_name)
+            if collection is None:
+                return None
+            stats = self._scan_stats(collection)
+            self._save_stats(repo_name, stats)
+        with self._stats_lock:
+            return self._stats.setdefault(repo_name, stats)
+
+    def stats_path(self, repo_name: str) -> str:
+        """Where a repo's collection stats are persisted."""
+        return os.path.join(self.stats_dir, f"{repo_name}.json")
+
+    def _load_stats(self, repo_name: str) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self.stats_path(repo_name), encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_stats(self, repo_name: str, stats: Dict[str, Any]) -> None:
+        os.makedirs(self.stats_dir, exist_ok=True)
+        path = self.stats_path(repo_name)
+        with self._stats_lock:
+            payload = json.dumps(stats, ensure_ascii=False)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(payload)
+        os.replace(path + ".tmp", path)
+
+    def _persist_stats(self, repo_name: str) -> None:
+        stats = self._live_stats(repo_name)
+        if stats is not None:
+            self._save_stats(repo_name, stats)
+
+    def _scan_stats(self, collection, page_size: int = STATS_PAGE_SIZE) -> Dict[str, Any]:
+        """Full stats from the collection itself (one metadata scan, page_size rows at a time)."""
+        stats = self._empty_stats(getattr(collection, "backend", "chroma"))
+        stats["count"] = collection.count()
+        if stats["count"]:
+            stats["dimension"] = self.embedding_engine.embedding_dim
+        files = stats["files"]
+        for offset in range(0, stats["count"], page_size):
+            for metadata in collection.get(include=["metadatas"], limit=page_size, offset=offset).get("metadatas") or []:
+                filepath = (metadata or {}).get("filepath")
+                if filepath:
+                    files[filepath] = files.get(filepath, 0) + 1
+        return stats
+
+    @staticmethod
+    def _empty_stats(backend: str) -> Dict[str, Any]:
+        return {"count": 0, "dimension": None, "files": {}, "last_modified": time.time(), "backend": backend}
+
+    def _reset_stats(self, repo_name: str, backend: Optional[str] = None) -> None:
+        """Forget a repo's stats (backend given = start fresh, empty stats)."""
+        with self._stats_lock:
+            if backend:
+                self._stats[repo_name] = self._empty_stats(backend)
+            else:
+                self._stats.pop(repo_name, None)
+        if backend:
+            self._save_stats(repo_name, self._stats[repo_name])
+        elif os.path.exists(self.stats_path(repo_name)):
+            os.remove(self.stats_path(repo_name))
+
+    def _record_write(self, repo_name: str, metadatas: List[Dict[str, Any]], dimension: int) -> None:
+        """Fold one stored batch into the in-memory stats (persisted after ingest)."""
+        with self._stats_lock:
+            stats = self._stats.get(repo_name)
+            if stats is None:
+                return
+            stats["count"] += len(metadatas)
+            stats["dimension"] = dimension
+            stats["last_modified"] = time.time()
+            files = stats["files"]
+            for metadata in metadatas:
+                filepath = (metadata or {}).get("filepath")
+                if filepath:
+                    files[filepath] = files.get(filepath, 0) + 1
+
+    def _cached_count(self, repo_name: Optional[str], collection) -> int:
+        stats = self._live_stats(repo_name)
+        if stats is None:
+            return collection.count()
+        with self._stats_lock:
+            return stats["count"]
+
+    def _resolve_collection(self, repo_name: Optional[str] = None):
+        """Collection for repo_name, or the default repo when none is given."""
+        if repo_name:
+            return self.get_collection(repo_name)
+        if self.current_repo:
+            self._notify_accessed(self.current_repo)
+        return self.collection
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Default repo (backwards compatible single-repo API)
+    # ──────────────────────────────────────────────────────────────────────────
+
     def _auto_reconnect(self) -> None:
         """Try to reload the most recent collection from ChromaDB on startup."""
         try:
-            collections = self.client.list_collections()
+            collections = [c if isinstance(c, str) else c.name for c in self.client.list_collections()]
+            collections = [name for name in collections if not staged_owner(name)]
+            numpy_names = [n for n in NumpyCollection.list_names(self.numpy_index_dir) if not staged_owner(n)]
             if collections:
                 # Get the most recently created collection
-                latest = collections[-1]
-                name = latest if isinstance(latest, str) else latest.name
+                name = collections[-1]
                 self.collection = self.client.get_collection(name=name)
                 self.current_repo = name
+                self._cache_put(name, self.collection)
                 count = self.collection.count()
                 print(f"  [VECTOR] Auto-reconnected to collection '{name}' ({count} docs)", flush=True)
+            elif numpy_names:
+                name = numpy_names[-1]
+                self.collection = NumpyCollection(self.numpy_index_dir, name)
+                self.current_repo = name
+                self._cache_put(name, self.collection)
+                print(f"  [VECTOR] Auto-reconnected to numpy index '{name}' ({self.collection.count()} docs)", flush=True)
             else:
                 print(f"  [VECTOR] No existing collections found — waiting for upload.", flush=True)
         except Exception as e:
@@ -39,45 +422,177 @@ class VectorStore:
             self.collection = None
             self.current_repo = None
 
+    def set_default(self, repo_name: str) -> bool:
+        """Make repo_name the default repo. Returns False (default unchanged) if it does not exist."""
+        collection = self.get_collection(repo_name)
+        if collection is None:
+            return False
+        self.collection = collection
+        self.current_repo = repo_name
+        return True
+
+    def clear_default(self) -> None:
+        """No default repo: requests must name one (and quota eviction stops protecting the old one)."""
+        self.collection = None
+        self.current_repo = None
+
     def try_reconnect(self, repo_name: str) -> bool:
         """Try to reconnect to a specific collection by name. Returns True on success."""
-        try:
-            self.collection = self.client.get_collection(name=repo_name)
-            self.current_repo = repo_name
+        if self.set_default(repo_name):
             print(f"  [VECTOR] Reconnected to collection '{repo_name}'", flush=True)
             return True
-        except Exception as e:
-            print(f"  [VECTOR] Could not reconnect to '{repo_name}': {str(e)}", flush=True)
-            self.collection = None
-            self.current_repo = None
-            return False
 
-    def create_or_get_collection(self, collection_name: str) -> None:
+        print(f"  [VECTOR] Could not reconnect to '{repo_name}': collection does not exist", flush=True)
+        self.collection = None
+        self.current_repo = None
+        return False
+
+    def create_or_get_collection(self,
+                                 collection_name: str,
+                                 backend: Optional[str] = None,
+                                 expected_count: Optional[int] = None,
+                                 hnsw_preset: Optional[str] = None,
+                                 hnsw_params: Optional[Dict[str, int]] = None):
+        """
+        (Re)create a repo's collection. For Chroma, HNSW settings come from
+        hnsw_preset ("auto" = by expected_count) plus any hnsw_params overrides.
+        """
+        backend = (backend or VECTOR_BACKEND).lower()
+        if backend not in SUPPORTED_BACKENDS:
+            raise ValueError(f"Unknown vector backend '{backend}'. Use one of: {', '.join(SUPPORTED_BACKENDS)}")
+        hnsw = resolve_hnsw_params(expected_count, hnsw_preset, hnsw_params) if backend == 'chroma' else None
+
         try:
-            try:
-                self.client.delete_collection(name=collection_name)
-                print(f"  [VECTOR] Deleted existing collection: {collection_name}", flush=True)
-            except Exception:
-                pass
-
-            self.collection = self.client.create_collection(
-                name=collection_name,
-                metadata={"hnsw:space": "cosine"}
-            )
-            self.current_repo = collection_name
-            print(f"  [VECTOR] Created collection: {collection_name}", flush=True)
+            self._delete_existing(collection_name)
+
+            if backend == 'numpy':
+                collection = NumpyCollection(self.numpy_index_dir, collection_name)
+            else:
+                collection = self.client.create_collection(
+                    name=collection_name,
+                    metadata=hnsw_metadata(hnsw)
+                )
+            self._reset_stats(collection_name, backend)
+            self._register(collection_name, collection)
+            print(f"  [VECTOR] Created {backend} collection: {collection_name}"
+                  + (f" (HNSW {hnsw})" if hnsw else ""), flush=True)
+            return collection
         except Exception as e:
             print(f"  [VECTOR] ERROR creating collection: {str(e)}", flush=True)
             traceback.print_exc()
             sys.stdout.flush()
             raise Exception(f"Failed to create collection: {str(e)}")
 
+    def _delete_existing(self, collection_name: str) -> None:
+        """Drop the cached handle and delete the repo's Chroma collection / numpy index."""
+        self._cache_drop(collection_name)
+        with self._collections_lock:
+            self._staged_collections.pop(collection_name, None)
+        try:
+            self.client.delete_collection(name=collection_name)
+            print(f"  [VECTOR] Deleted existing collection: {collection_name}", flush=True)
+        except Exception:
+            pass
+        if NumpyCollection.delete(self.numpy_index_dir, collection_name):
+            print(f"  [VECTOR] Deleted existing numpy index: {collection_name}", flush=True)
+        self._reset_stats(collection_name)
+
+    def _register(self, collection_name: str, collection) -> None:
+        """
+        Cache a freshly built collection's handle. The default repo is left
+        alone (only set_default() changes it), but if this repo is the
+        default its handle is refreshed, since the old one was just deleted.
+        """
+        if staged_owner(collection_name):
+            with self._collections_lock:
+                self._staged_collections[collection_name] = collection
+            return
+        if collection_name == self.current_repo:
+            self.collection = collection
+        self._cache_put(collection_name, collection)
+
+    def publish_staged_collection(self, repo_name: str, staged_name: str) -> Optional[str]:
+        """
+        Rename the collection built under staged_name to repo_name. The live
+        collection it replaces is renamed aside, not deleted, so handles that
+        queries still hold keep working; its new name is returned (None if
+        there was none) for drop_collection() once the caller is done.
+        Sends no evict notifications, so it may run under the retriever's locks.
+        """
+        with self._collections_lock:
+            staged = self._staged_collections.pop(staged_name, None) or self._open(staged_name)
+            if staged is None:
+                raise ValueError(f"No staged collection '{staged_name}'")
+            retired = None
+            if self._open(repo_name) is not None:
+                retired = staging_name(repo_name)
+                self._rename(repo_name, retired)
+            published = self._rename(staged_name, repo_name, staged)
+            if repo_name in self._collections:
+                self._collections[repo_name] = published
+            if repo_name == self.current_repo:
+                self.collection = published
+
+        with self._stats_lock:
+            stats = self._stats.pop(staged_name, None)
+            self._stats.pop(repo_name, None)
+            if stats is not None:
+                self._stats[repo_name] = stats
+        if stats is not None:
+            self._save_stats(repo_name, stats)
+            if os.path.exists(self.stats_path(staged_name)):
+                os.remove(self.stats_path(staged_name))
+        elif os.path.exists(self.stats_path(staged_name)):
+            os.replace(self.stats_path(staged_name), self.stats_path(repo_name))
+        elif os.path.exists(self.stats_path(repo_name)):
+            os.remove(self.stats_path(repo_name))   # rescanned on next use
+        print(f"  [VECTOR] Published collection '{repo_name}' (built as '{staged_name}')", flush=True)
+        return retired
+
+    def drop_collection(self, collection_name: str) -> None:
+        """Delete a staged or replaced collection (see publish_staged_collection)."""
+        self._delete_existing(collection_name)
+        if os.path.exists(self.stats_path(collection_name)):
+            os.remove(self.stats_path(collection_name))
+
+    def _open(self, collection_name: str):
+        """A fresh handle on a collection by name, either backend, or None."""
+        if NumpyCollection.exists(self.numpy_index_dir, collection_name):
+            return NumpyCollection(self.numpy_index_dir, collection_name)
+        try:
+            return self.client.get_collection(name=collection_name)
+        except Exception:
+            return None
+
+    def _rename(self, old_name: str, new_name: str, collection=None):
+        """Rename a collection on disk; returns a handle under the new name."""
+        collection = collection or self._open(old_name)
+        if getattr(collection, "backend", "chroma") == "numpy":
+            collection.flush()
+            os.makedirs(collection.index_dir, exist_ok=True)   # nothing written yet if empty
+            os.replace(collection.index_dir, os.path.join(self.numpy_index_dir, new_name))
+            return NumpyCollection(self.numpy_index_dir, new_name)
+        collection.modify(name=new_name)
+        return collection
+
     def add_documents(self,
                      documents: List[str],
                      metadatas: List[Dict[str, Any]],
                      ids: List[str] = None,
-                     progress_callback=None) -> None:
-        if not self.collection:
+                     progress_callback=None,
+                     repo_name: Optional[str] = None,
+                     store_batch_size: int = STORE_BATCH_SIZE,
+                     embed_batch_size: int = EMBED_BATCH_SIZE,
+                     pipelined: bool = INGEST_PIPELINED) -> Dict[str, Any]:
+        """
+        Embed and store documents in batches of store_batch_size.
+
+        pipelined=True runs a writer thread that persists batch N while the
+        encoder computes batch N+1 (bounded queue, double-buffered).
+        Returns an ingestion summary incl. how much embed/store time overlapped.
+        """
+        collection = self._resolve_collection(repo_name)
+        if not collection:
             raise ValueError("No collection initialized. Call create_or_get_collection() first.")
 
         if len(documents) != len(metadatas):
@@ -90,119 +605,403 @@ class VectorStore:
         if len(set(ids)) != len(ids):
             ids = [f"doc_{i}" for i in range(len(documents))]
 
-        # Larger batches = fewer round-trips = significantly faster
-        batch_size = 100
-        total_batches = (len(documents) + batch_size - 1) // batch_size
-        successful_docs = 0
-        failed_batches = 0
+        store_batch_size = max(1, store_batch_size)
+        total_batches = (len(documents) + store_batch_size - 1) // store_batch_size
+        stats = {
+            "total_docs": len(documents),
+            "successful_docs": 0,
+            "failed_docs": 0,
+            "failed_batches": 0,
+            "total_batches": total_batches,
+            "embed_seconds": 0.0,
+            "store_seconds": 0.0,
+        }
 
-        print(f"  [VECTOR] Adding {len(documents)} docs in {total_batches} batches (size={batch_size})", flush=True)
+        mode = "pipelined" if pipelined and total_batches > 1 else "sequential"
+        print(f"  [VECTOR] Adding {len(documents)} docs in {total_batches} batches "
+              f"(store={store_batch_size}, embed={embed_batch_size}, {mode})", flush=True)
 
+        wall_start = time.perf_counter()
         try:
-            for batch_num in range(total_batches):
-                start = batch_num * batch_size
-                end = min(start + batch_size, len(documents))
-
-                batch_docs = documents[start:end]
-                batch_metas = metadatas[start:end]
-                batch_ids = ids[start:end]
-
-                # FIXED: filter out empty documents that would cause embedding errors
-                valid_indices = [i for i, d in enumerate(batch_docs) if d and d.strip()]
-                if not valid_indices:
-                    print(f"  [VECTOR] Batch {batch_num + 1}/{total_batches}: all empty, skipping", flush=True)
-                    continue
-
-                batch_docs = [batch_docs[i] for i in valid_indices]
-                batch_metas = [batch_metas[i] for i in valid_indices]
-                batch_ids = [batch_ids[i] for i in valid_indices]
-
-                try:
-                    print(f"  [VECTOR] Batch {batch_num + 1}/{total_batches}: embedding {len(batch_docs)} docs...", flush=True)
-                    batch_embeddings = self.embedding_engine.embed_texts(batch_docs)
-
-                    print(f"  [VECTOR] Batch {batch_num + 1}/{total_batches}: storing...", flush=True)
-                    self.collection.add(
-                        ids=batch_ids,
-                        documents=batch_docs,
-                        metadatas=batch_metas,
-                        embeddings=batch_embeddings
-                    )
-
-                    successful_docs += len(batch_docs)
-                    print(f"  [VECTOR] Batch {batch_num + 1}/{total_batches}: ✓ ({successful_docs}/{len(documents)} done)", flush=True)
-
-                    # Fire progress callback: maps 80% -> 98% during embedding phase
-                    if progress_callback and total_batches > 0:
-                        pct = 80 + int(((batch_num + 1) / total_batches) * 18)
-                        progress_callback(
-                            f'Embedding & storing: {successful_docs}/{len(documents)} chunks done...',
-                            pct
-                        )
-
-                except Exception as e:
-                    failed_batches += 1
-                    print(f"  [VECTOR] ERROR batch {batch_num + 1}: {str(e)}", flush=True)
-                    traceback.print_exc()
-                    sys.stdout.flush()
-                    continue
+            batches = self._iter_batches(documents, metadatas, ids, store_batch_size)
+            if mode == "pipelined":
+                self._add_pipelined(collection, batches, embed_batch_size, stats, progress_callback)
+            else:
+                for batch in batches:
+                    embedded = self._embed_batch(batch, embed_batch_size, stats)
+                    if embedded is not None:
+                        self._store_batch(collection, embedded, stats, progress_callback)
+            wall = time.perf_counter() - wall_start
 
-            if successful_docs == 0:
+            if stats["successful_docs"] == 0:
                 raise Exception(f"All {total_batches} batches failed. No documents were stored.")
 
+            # Backends that buffer writes (numpy) persist once at the end
+            if hasattr(collection, "flush"):
+                collection.flush()
+            self._persist_stats(collection.name)
+
             # Single GC at the end
             gc.collect()
-            print(f"  [VECTOR] ✓ Stored {successful_docs}/{len(documents)} docs ({failed_batches} batches failed)", flush=True)
-
         except Exception as e:
             print(f"  [VECTOR] CRITICAL ERROR: {str(e)}", flush=True)
             traceback.print_exc()
             sys.stdout.flush()
             raise Exception(f"Failed to add documents: {str(e)}")
 
+        # Overlap = stage time that ran concurrently; ratio is relative to the
+        # shorter stage (1.0 means it was completely hidden behind the other)
+        overlap = max(0.0, stats["embed_seconds"] + stats["store_seconds"] - wall)
+        shorter = min(stats["embed_seconds"], stats["store_seconds"])
+        stats.update({
+            "mode": mode,
+            "store_batch_size": store_batch_size,
+            "embed_batch_size": embed_batch_size,
+            "wall_seconds": round(wall, 2),
+            "embed_seconds": round(stats["embed_seconds"], 2),
+            "store_seconds": round(stats["store_seconds"], 2),
+            "overlap_seconds": round(overlap, 2),
+            "overlap_ratio": round(overlap / shorter, 3) if shorter > 0 else 0.0,
+        })
+        print(f"  [VECTOR] ✓ Stored {stats['successful_docs']}/{len(documents)} docs "
+              f"({stats['failed_batches']} batches failed) | embed {stats['embed_seconds']}s, "
+              f"store {stats['store_seconds']}s, wall {stats['wall_seconds']}s, "
+              f"overlap {stats['overlap_seconds']}s ({stats['overlap_ratio']:.0%})", flush=True)
+        return stats
+
+    def _iter_batches(self, documents, metadatas, ids, batch_size):
+        """Yield (batch_num, total_batches, docs, metas, ids) with empty docs dropped."""
+        total_batches = (len(documents) + batch_size - 1) // batch_size
+        for batch_num in range(total_batches):
+            start = batch_num * batch_size
+            end = min(start + batch_size, len(documents))
+
+            # FIXED: filter out empty documents that would cause embedding errors
+            valid_indices = [i for i in range(start, end) if documents[i] and documents[i].strip()]
+            if not valid_indices:
+                print(f"  [VECTOR] Batch {batch_num + 1}/{total_batches}: all empty, skipping", flush=True)
+                continue
+
+            yield (
+                batch_num, total_batches,
+                [documents[i] for i in valid_indices],
+                [metadatas[i] for i in valid_indices],
+                [ids[i] for i in valid_indices],
+            )
+
+    def _embed_batch(self, batch, embed_batch_size: int, stats: Dict[str, Any]):
+        """Encode one batch. Returns the batch plus embeddings, or None on failure."""
+        batch_num, total_batches, batch_docs, batch_metas, batch_ids = batch
+        t0 = time.perf_counter()
+        try:
+            print(f"  [VECTOR] Batch {batch_num + 1}/{total_batches}: embedding {len(batch_docs)} docs...", flush=True)
+            batch_embeddings = self.embedding_engine.embed_texts(batch_docs, batch_size=embed_batch_size)
+            return batch + (batch_embeddings,)
+        except Exception as e:
+            stats["failed_batches"] += 1
+            stats["failed_docs"] += len(batch_docs)
+            print(f"  [VECTOR] ERROR embedding batch {batch_num + 1}: {str(e)}", flush=True)
+            traceback.print_exc()
+            sys.stdout.flush()
+            return None
+        finally:
+            stats["embed_seconds"] += time.perf_counter() - t0
+
+    def _store_batch(self, collection, embedded, stats: Dict[str, Any], progress_callback=None) -> None:
+        batch_num, total_batches, batch_docs, batch_metas, batch_ids, batch_embeddings = embedded
+        t0 = time.perf_counter()
+        try:
+            print(f"  [VECTOR] Batch {batch_num + 1}/{total_batches}: storing...", flush=True)
+            collection.add(
+                ids=batch_ids,
+                documents=batch_docs,
+                metadatas=batch_metas,
+                embeddings=batch_embeddings
+            )
+            stats["successful_docs"] += len(batch_docs)
+            self._record_write(collection.name, batch_metas, len(batch_embeddings[0]))
+            print(f"  [VECTOR] Batch {batch_num + 1}/{total_batches}: ✓ ({stats['successful_docs']}/{stats['total_docs']} done)", flush=True)
+        except Exception as e:
+            stats["failed_batches"] += 1
+            stats["failed_docs"] += len(batch_docs)
+            print(f"  [VECTOR] ERROR storing batch {batch_num + 1}: {str(e)}", flush=True)
+            traceback.print_exc()
+            sys.stdout.flush()
+            return
+        finally:
+            stats["store_seconds"] += time.perf_counter() - t0
+
+        # Fire progress callback: maps 80% -> 98% during embedding phase
+        if progress_callback and total_batches > 0:
+            pct = 80 + int(((batch_num + 1) / total_batches) * 18)
+            progress_callback(
+                f'Embedding & storing: {stats["successful_docs"]}/{stats["total_docs"]} chunks done...',
+                pct
+            )
+
+    def _add_pipelined(self, collection, batches, embed_batch_size: int,
+                       stats: Dict[str, Any], progress_callback=None) -> None:
+        """
+        Double-buffered ingest: this thread embeds, a writer thread stores.
+        The queue holds at most INGEST_QUEUE_DEPTH embedded batches, so the
+        encoder can run at most that far ahead of the writer.
+        """
+        pending: "queue.Queue" = queue.Queue(maxsize=INGEST_QUEUE_DEPTH)
+        # Writer-side counters live in their own dict (no shared writes) and are merged after join
+        writer_stats = {"successful_docs": 0, "failed_docs": 0, "failed_batches": 0,
+                        "store_seconds": 0.0, "total_docs": stats["total_docs"]}
+
+        def writer():
+            while True:
+                embedded = pending.get()
+                if embedded is None:
+                    return
+                try:
+                    self._store_batch(collection, embedded, writer_stats, progress_callback)
+                except Exception as e:
+                    # Never let the writer die — the encoder would block on a full queue
+                    print(f"  [VECTOR] Writer error on batch {embedded[0] + 1}: {str(e)}", flush=True)
+
+        writer_thread = threading.Thread(target=writer, name="vector-store-writer", daemon=True)
+        writer_thread.start()
+        try:
+            for batch in batches:
+                embedded = self._embed_batch(batch, embed_batch_size, stats)
+                if embedded is not None:
+                    pending.put(embedded)
+        finally:
+            pending.put(None)
+            writer_thread.join()
+            for key in ("successful_docs", "failed_docs", "failed_batches", "store_seconds"):
+                stats[key] += writer_stats[key]
+
     def query(self,
              query_text: str,
-             n_results: int = 5) -> Dict[str, Any]:
-        if not self.collection:
+             n_results: int = 5,
+             repo_name: Optional[str] = None,
+             where: Optional[Dict[str, Any]] = None,
+             query_embedding: Optional[List[float]] = None) -> Dict[str, Any]:
+        """
+        Nearest child chunks for query_text. `where` is a Chroma metadata
+        filter (see rag.metadata_filter.build_where); it is applied inside the
+        index, so only matching chunks are scanned. Pass query_embedding to
+        reuse an embedding across repeated queries (adaptive over-fetch).
+        """
+        # Embed with the same model used at ingest (not Chroma's default function)
+        if query_embedding is None:
+            query_embedding = self.embedding_engine.embed_text(query_text)
+        return self.query_many([query_embedding], n_results=n_results, repo_name=repo_name, where=where)[0]
+
+    def query_many(self,
+                   query_embeddings: List[List[float]],
+                   n_results: int = 5,
+                   repo_name: Optional[str] = None,
+                   where: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Nearest child chunks for several pre-embedded queries in one index
+        call. Returns one {'ids', 'documents', 'metadatas', 'distances'} per query.
+        """
+        collection = self._resolve_collection(repo_name)
+        if not collection:
+            if repo_name:
+                raise ValueError(f"Repository '{repo_name}' not found. Please upload it first.")
             raise ValueError("No collection initialized. Please upload a repository first.")
 
         try:
             # FIXED: Clamp n_results to the actual collection count to avoid ChromaDB errors
-            count = self.collection.count()
-            if count == 0:
-                return {
-                    'ids': [],
-                    'documents': [],
-                    'metadatas': [],
-                    'distances': []
-                }
+            count = self._cached_count(repo_name, collection)
+            if count == 0 or not query_embeddings:
+                return [
+                    {'ids': [], 'documents': [], 'metadatas': [], 'distances': []}
+                    for _ in query_embeddings
+                ]
             n_results = min(n_results, count)
 
-            results = self.collection.query(
-                query_texts=[query_text],
+            query_kwargs = {}
+            if where:
+                query_kwargs["where"] = where
+            results = collection.query(
+                query_embeddings=list(query_embeddings),
                 n_results=n_results,
-                include=['documents', 'metadatas', 'distances']
+                include=['documents', 'metadatas', 'distances'],
+                **query_kwargs
             )
 
-            return {
-                'ids': results['ids'][0] if results['ids'] else [],
-                'documents': results['documents'][0] if results['documents'] else [],
-                'metadatas': results['metadatas'][0] if results['metadatas'] else [],
-                'distances': results['distances'][0] if results['distances'] else []
-            }
+            fields = ('ids', 'documents', 'metadatas', 'distances')
+            return [
+                {field: results[field][row] if results.get(field) else [] for field in fields}
+                for row in range(len(query_embeddings))
+            ]
         except Exception as e:
             raise Exception(f"Query failed: {str(e)}")
 
-    def get_collection_info(self) -> Dict[str, Any]:
-        if not self.collection:
+    def get_children(self,
+                     repo_name: Optional[str],
+                     ids: List[str],
+                     include: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Stored fields ("documents", "embeddings", "metadatas") of the given
+        child ids, fetched in one call and keyed by id. Unknown ids are absent.
+        """
+        collection = self._resolve_collection(repo_name)
+        if not collection or not ids:
+            return {}
+        result = collection.get(ids=list(ids), include=list(include))
+        fields = [field for field in include if result.get(field) is not None]
+        return {
+            child_id: {field: result[field][row] for field in fields}
+            for row, child_id in enumerate(result["ids"])
+        }
+
+    # ──────────────────────────────────────────────────────────────────────────
+    # Snapshot export / import (vectors + ids/documents/metadatas)
+    # ──────────────────────────────────────────────────────────────────────────
+
+    def export_vectors(self, repo_name: str, dest_dir: str, page_size: int = EXPORT_PAGE_SIZE) -> Dict[str, Any]:
+        """
+        Write a repo's collection to dest_dir as vectors.npy (float32, N x dim)
+        plus sidecar.json — the NumpyCollection on-disk format, whatever the
+        live backend. Returns {"backend", "count", "dimension", "hnsw"}.
+        """
+        collection = self.get_collection(repo_name)
+        if collection is None:
+            raise ValueError(f"Repository '{repo_name}' not found")
+
+        os.makedirs(dest_dir, exist_ok=True)
+        vectors_path = os.path.join(dest_dir, "vectors.npy")
+        sidecar_path = os.path.join(dest_dir, "sidecar.json")
+        backend = getattr(collection, "backend", "chroma")
+
+        if backend == "numpy":
+            # Already in snapshot format once merged into one file — copy them as they are
+            collection.compact()
+            paths = collection.file_paths()
+            shutil.copyfile(paths["vectors"], vectors_path)
+            shutil.copyfile(paths["sidecar"], sidecar_path)
+            with open(sidecar_path, encoding="utf-8") as f:
+                sidecar = json.load(f)
+            return {"backend": backend, "count": sidecar["count"], "dimension": sidecar["dimension"], "hnsw": None}
+
+        count = collection.count()
+        dimension = self.embedding_engine.embedding_dim
+        vectors = np.lib.format.open_memmap(vectors_path, mode="w+", dtype=np.float32, shape=(count, dimension))
+        ids: List[str] = []
+        documents: List[str] = []
+        metadatas: List[Dict[str, Any]] = []
+        for offset in range(0, count, page_size):
+            page = collection.get(include=["embeddings", "documents", "metadatas"], limit=page_size, offset=offset)
+            rows = len(page["ids"])
+            vectors[offset:offset + rows] = np.asarray(page["embeddings"], dtype=np.float32)
+            ids.extend(page["ids"])
+            documents.extend(page["documents"])
+            metadatas.extend(page["metadatas"])
+        vectors.flush()
+        del vectors
+
+        with open(sidecar_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "version":   1,
+                "count":     len(ids),
+                "dimension": dimension,
+                "ids":       ids,
+                "documents": documents,
+                "metadatas": metadatas,
+            }, f, ensure_ascii=False)
+
+        metadata = collection.metadata or {}
+        hnsw = {key: metadata[f"hnsw:{key}"] for key in HNSW_PARAM_KEYS if f"hnsw:{key}" in metadata}
+        return {"backend": backend, "count": len(ids), "dimension": dimension, "hnsw": hnsw or None}
+
+    def import_vectors(self,
+                       repo_name: str,
+                       src_dir: str,
+                       backend: Optional[str] = None,
+                       hnsw_params: Optional[Dict[str, int]] = None,
+                       batch_size: int = IMPORT_BATCH_SIZE) -> int:
+        """
+        Load vectors.npy + sidecar.json from src_dir as repo_name's collection,
+        replacing any existing one. No re-embedding: the numpy backend adopts
+        the files as-is (moved, then memory-mapped); Chroma bulk-loads the
+        stored vectors. src_dir should be on the same filesystem as the store.
+        Returns the number of vectors loaded.
+        """
+        backend = (backend or VECTOR_BACKEND).lower()
+        if backend not in SUPPORTED_BACKENDS:
+            raise ValueError(f"Unknown vector backend '{backend}'. Use one of: {', '.join(SUPPORTED_BACKENDS)}")
+
+        vectors_path = os.path.join(src_dir, "vectors.npy")
+        sidecar_path = os.path.join(src_dir, "sidecar.json")
+        vectors = np.load(vectors_path, mmap_mode="r")
+        if vectors.ndim != 2 or vectors.shape[1] != self.embedding_engine.embedding_dim:
+            raise ValueError(f"Snapshot vectors have shape {vectors.shape}, "
+                             f"expected dimension {self.embedding_engine.embedding_dim}")
+
+        if backend == "numpy":
+            del vectors
+            self._delete_existing(repo_name)
+            index_dir = os.path.join(self.numpy_index_dir, repo_name)
+            os.makedirs(index_dir, exist_ok=True)
+            os.replace(vectors_path, os.path.join(index_dir, "vectors.npy"))
+            os.replace(sidecar_path, os.path.join(index_dir, "sidecar.json"))
+            collection = NumpyCollection(self.numpy_index_dir, repo_name)
+            stats = self._scan_stats(collection)
+            with self._stats_lock:
+                self._stats[repo_name] = stats
+            self._save_stats(repo_name, stats)
+            self._register(repo_name, collection)
+            count = collection.count()
+            print(f"  [VECTOR] Imported numpy index '{repo_name}' ({count} docs, memory-mapped)", flush=True)
+            return count
+
+        with open(sidecar_path, encoding="utf-8") as f:
+            sidecar = json.load(f)
+        ids, documents, metadatas = sidecar["ids"], sidecar["documents"], sidecar["metadatas"]
+        if len(ids) != len(vectors):
+            raise ValueError(f"Snapshot has {len(ids)} ids but {len(vectors)} vectors")
+
+        collection = self.create_or_get_collection(
+            repo_name, backend="chroma", expected_count=len(ids), hnsw_params=hnsw_params
+        )
+        try:
+            batch_size = min(batch_size, self.client.get_max_batch_size())
+        except Exception:
+            pass
+        for start in range(0, len(ids), batch_size):
+            end = start + batch_size
+            collection.add(
+                ids=ids[start:end],
+                documents=documents[start:end],
+                metadatas=metadatas[start:end],
+                embeddings=np.asarray(vectors[start:end])
+            )
+            self._record_write(repo_name, metadatas[start:end], vectors.shape[1])
+        self._persist_stats(repo_name)
+        print(f"  [VECTOR] Imported {len(ids)} vectors into Chroma collection '{repo_name}'", flush=True)
+        return len(ids)
+
+    def get_collection_info(self, repo_name: Optional[str] = None) -> Dict[str, Any]:
+        collection = self._resolve_collection(repo_name)
+        if not collection:
             return {"status": "No collection loaded"}
 
         try:
-            count = self.collection.count()
-            return {
-                "collection": self.current_repo,
-                "document_count": count
+            stats = self.collection_stats(repo_name) or self._scan_stats(collection)
+            with self._collections_lock:
+                open_collections = list(self._collections.keys())
+            info = {
+                "collection": repo_name or self.current_repo,
+                "backend": getattr(collection, "backend", "chroma"),
+                "document_count": stats["count"],
+                "dimension": stats["dimension"],
+                "file_count": len(stats["files"]),
+                "last_modified": stats["last_modified"],
+                "open_collections": open_collections
             }
+            metadata = getattr(collection, "metadata", None) or {}
+            hnsw = {key: metadata[f"hnsw:{key}"] for key in HNSW_PARAM_KEYS if f"hnsw:{key}" in metadata}
+            if hnsw:
+                info["hnsw"] = hnsw
+            return info
         except Exception as e:
             return {"error": str(e)}
 
@@ -214,6 +1013,15 @@ class VectorStore:
                     self.client.delete_collection(name=collection)
                 else:
                     self.client.delete_collection(name=collection.name)
+            for name in NumpyCollection.list_names(self.numpy_index_dir):
+                NumpyCollection.delete(self.numpy_index_dir, name)
+            with self._stats_lock:
+                self._stats.clear()
+            shutil.rmtree(self.stats_dir, ignore_errors=True)
+            with self._collections_lock:
+                dropped = list(self._collections.keys())
+                self._collections.clear()
+            self._notify_evicted(dropped)
             self.collection = None
             self.current_repo = None
             print("Vector store reset successfully", flush=True)
@@ -123,7 +123,7 @@ export const ChatPage = () => {
 
               processingInterval = setInterval(async () => {
                 try {
-                  const prog = await axios.get(`${API_BASE}/progress`, { timeout: 5000 })
+                  const prog = await axios.get(`${API_BASE}/progress`, { params: { repo: fileName }, timeout: 5000 })
                   const { status, message, progress } = prog.data
                   console.log(`[Upload] Backend progress: ${progress}% — ${message}`)
 
@@ -157,7 +157,7 @@ export const ChatPage = () => {
       if (response.data.status === 'success') {
         console.log(`[Upload] ✓ Success! ${response.data.file_count} files, ${response.data.chunk_count} chunks`)
 
-        setRepoName(fileName)
+        setRepoName(response.data.repo_name || fileName)
         setRepoInfo({
           info: {
             file_count: response.data.file_count,
@@ -228,32 +228,67 @@ export const ChatPage = () => {
     setMessages((prev) => [...prev, { text: userMessage, isUser: true }])
     setIsLoading(true)
 
+    // Streamed answer: the message appears with the sources and grows token by token
+    const updateAnswer = (patch) => setMessages((prev) => {
+      const next = [...prev]
+      const last = next[next.length - 1]
+      next[next.length - 1] = { ...last, ...patch(last) }
+      return next
+    })
+
+    let started = false
     try {
-      const response = await axios.post(`${API_BASE}/chat`, { query: userMessage })
+      const response = await fetch(`${API_BASE}/chat/stream`, {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ query: userMessage, repo: repoName })
+      })
 
-      if (response.data.status === 'success') {
-        setMessages((prev) => [...prev, {
-          text: response.data.answer,
-          isUser: false,
-          model: response.data.model,
-          model_name: response.data.model_name,
-          sources: response.data.sources
-        }])
-      } else {
-        setMessages((prev) => [...prev, {
-          text: response.data.error || 'Sorry, an error occurred',
-          isUser: false,
-          model: 'Error'
-        }])
+      if (!response.ok) {
+        const data = await response.json().catch(() => ({}))
+        throw new Error(data.error || `Request failed (${response.status})`)
+      }
+
+      const reader = response.body.getReader()
+      const decoder = new TextDecoder()
+      let buffer = ''
+
+      while (true) {
+        const { done, value } = await reader.read()
+        if (done) break
+        buffer += decoder.decode(value, { stream: true })
+
+        const events = buffer.split('\n\n')
+        buffer = events.pop()
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1]
+          const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] || '{}')
+
+          if (event === 'sources') {
+            started = true
+            setMessages((prev) => [...prev, { text: '', isUser: false, sources: data.sources, streaming: true }])
+          } else if (event === 'model') {
+            updateAnswer(() => ({ model: data.model, model_name: data.model_name }))
+          } else if (event === 'token') {
+            updateAnswer((last) => ({ text: last.text + data.text }))
+          } else if (event === 'error') {
+            if (started) {
+              updateAnswer((last) => ({ text: `${last.text}\n\n${data.error}` }))
+            } else {
+              setMessages((prev) => [...prev, { text: data.error || 'Sorry, an error occurred', isUser: false, model: 'Error' }])
+            }
+          }
+        }
       }
     } catch (error) {
       console.error('Chat error:', error)
       setMessages((prev) => [...prev, {
-        text: error.response?.data?.error || 'Failed to connect to backend. Make sure it is running.',
+        text: error.message || 'Failed to connect to backend. Make sure it is running.',
         isUser: false,
         model: 'Error'
       }])
     } finally {
+      if (started) updateAnswer(() => ({ streaming: false }))
       setIsLoading(false)
     }
   }
@@ -404,7 +439,7 @@ export const ChatPage = () => {
                     <ChatMessage key={idx} message={msg} isUser={msg.isUser} />
                   ))}
                   <AnimatePresence>
-                    {isLoading && <TypingIndicator />}
+                    {isLoading && !messages[messages.length - 1]?.streaming && <TypingIndicator />}
                   </AnimatePresence>
                   <div ref={chatEndRef} />
                 </div>
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Deterministic local stand-in for Groq and Ollama, for load tests without
+spending Groq quota.
+
+Speaks the subset of both HTTP APIs the backend uses:
+  Groq (OpenAI-compatible)  POST /openai/v1/chat/completions  (stream or not)
+                            GET  /openai/v1/models            (health probe)
+  Ollama                    POST /api/generate                (stream or not)
+                            GET  /api/tags                    (health probe)
+
+Answers are derived from a hash of the prompt, so the same question always
+gets the same text. Latency, token rate and failures are configurable.
+
+Usage:
+  python scripts/fake_llm.py --port 11500 --latency-ms 400 --tokens-per-sec 80
+
+Then start the backend against it:
+  GROQ_API_KEY=fake GROQ_BASE_URL=http://127.0.0.1:11500 \\
+  OLLAMA_BASE_URL=http://127.0.0.1:11500 python app.py
+
+Options:
+  --latency-ms 300        time to first token
+  --jitter-ms 100         +/- uniform jitter on the latency
+  --tokens-per-sec 50     streaming rate after the first token (0 = no delay)
+  --tokens 60             answer length in tokens
+  --error-rate 0.0        fraction of requests answered with --error-status
+  --error-status 500      HTTP status of injected errors (429 for rate limits)
+  --stream-error-rate 0.0 fraction of streams cut off after a few tokens
+  --seed 0                seeds latency jitter and error injection
+"""
+
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+WORDS = ("the function reads the config and returns a parsed value while the "
+         "handler validates input before the store writes each record to disk "
+         "so callers receive the result from the cache when it is warm").split()
+
+
+class FakeLLM:
+    """Behaviour shared by all handler threads: timing, answers, failures and counters."""
+
+    def __init__(self, latency_ms=300.0, jitter_ms=100.0, tokens_per_sec=50.0, tokens=60,
+                 error_rate=0.0, error_status=500, stream_error_rate=0.0, seed=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.tokens_per_sec = tokens_per_sec
+        self.tokens = tokens
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.stream_error_rate = stream_error_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.counts = {"requests": 0, "errors": 0, "stream_errors": 0, "aborted": 0}
+
+    def _roll(self) -> float:
+        with self._lock:
+            return self._random.random()
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.counts[key] += 1
+
+    def first_token_delay(self) -> float:
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter_ms, self.jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+    def token_delay(self) -> float:
+        return 1 / self.tokens_per_sec if self.tokens_per_sec > 0 else 0.0
+
+    def inject_error(self) -> bool:
+        return self.error_rate > 0 and self._roll() < self.error_rate
+
+    def cut_stream(self) -> bool:
+        return self.stream_error_rate > 0 and self._roll() < self.stream_error_rate
+
+    def answer_tokens(self, prompt: str):
+        """Same prompt, same answer: words picked by a hash chain over the prompt."""
+        digest = hashlib.sha256(prompt.encode("utf-8")).digest()
+        pieces = []
+        for i in range(self.tokens):
+            if i % 32 == 0 and i:
+                digest = hashlib.sha256(digest).digest()
+            pieces.append(WORDS[digest[i % 32] % len(WORDS)] + " ")
+        return pieces
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    llm: FakeLLM = None
+
+    def log_message(self, *args):
+        pass
+
+    # ── plumbing ─────────────────────────────────────────────────────────────
+
+    def _json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+        self.wfile.flush()
+
+    def _end_chunks(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _read_body(self) -> dict:
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _stream(self, content_type: str, pieces, frame, final: bytes) -> None:
+        """Send pieces as chunked frames at the configured rate; may cut off early."""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        cut_at = len(pieces) // 3 if self.llm.cut_stream() else None
+        try:
+            for i, piece in enumerate(pieces):
+                if cut_at is not None and i == cut_at:
+                    self.llm.count("stream_errors")
+                    self.close_connection = True
+                    return
+                self._chunk(frame(piece))
+                time.sleep(self.llm.token_delay())
+            self._chunk(final)
+            self._end_chunks()
+        except (BrokenPipeError, ConnectionResetError):
+            self.llm.count("aborted")
+            self.close_connection = True
+
+    # ── routes ───────────────────────────────────────────────────────────────
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/api/tags":
+            return self._json(200, {"models": [{"name": "fake"}]})
+        if self.path.rstrip("/") == "/openai/v1/models":
+            return self._json(200, {"object": "list", "data": [{"id": "fake", "object": "model"}]})
+        if self.path.rstrip("/") == "/stats":
+            return self._json(200, dict(self.llm.counts))
+        self._json(404, {"error": "not found"})
+
+    def do_POST(self):
+        body = self._read_body()
+        self.llm.count("requests")
+        if self.path.rstrip("/") == "/openai/v1/chat/completions":
+            handler = self._chat_completions
+        elif self.path.rstrip("/") == "/api/generate":
+            handler = self._generate
+        else:
+            return self._json(404, {"error": "not found"})
+
+        time.sleep(self.llm.first_token_delay())
+        if self.llm.inject_error():
+            self.llm.count("errors")
+            return self._json(self.llm.error_status, {"error": {"message": "injected error", "type": "fake_llm"}})
+        handler(body)
+
+    def _chat_completions(self, body: dict) -> None:
+        model = body.get("model", "fake")
+        prompt = "\n".join(m.get("content", "") for m in body.get("messages", []))
+        pieces = self.llm.answer_tokens(prompt)[:body.get("max_tokens") or None]
+        created = int(time.time())
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(pieces),
+                 "total_tokens": len(prompt) // 4 + len(pieces)}
+        if not body.get("stream"):
+            return self._json(200, {
+                "id": "chatcmpl-fake", "object": "chat.completion", "created": created, "model": model,
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "".join(pieces)}}],
+                "usage": usage,
+            })
+
+        def frame(piece):
+            chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                     "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+            return f"data: {json.dumps(chunk)}\n\n".encode()
+
+        last = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "x_groq": {"usage": usage}}
+        self._stream("text/event-stream", pieces, frame,
+                     f"data: {json.dumps(last)}\n\ndata: [DONE]\n\n".encode())
+
+    def _generate(self, body: dict) -> None:
+        model = body.get("model", "fake")
+        pieces = self.llm.answer_tokens(body.get("prompt", ""))
+        if not body.get("stream", True):
+            return self._json(200, {"model": model, "response": "".join(pieces), "done": True})
+
+        def frame(piece):
+            return (json.dumps({"model": model, "response": piece, "done": False}) + "\n").encode()
+
+        self._stream("application/x-ndjson", pieces, frame,
+                     (json.dumps({"model": model, "response": "", "done": True}) + "\n").encode())
+
+
+def serve(port: int = 11500, host: str = "127.0.0.1", **options) -> ThreadingHTTPServer:
+    """Start the fake in a daemon thread and return the server (for use from other scripts)."""
+    handler = type("FakeLLMHandler", (Handler,), {"llm": FakeLLM(**options)})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Groq/Ollama server for load tests")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--tokens-per-sec", type=float, default=50)
+    parser.add_argument("--tokens", type=int, default=60)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=500)
+    parser.add_argument("--stream-error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    server = serve(args.port, args.host,
+                   latency_ms=args.latency_ms, jitter_ms=args.jitter_ms,
+                   tokens_per_sec=args.tokens_per_sec, tokens=args.tokens,
+                   error_rate=args.error_rate, error_status=args.error_status,
+                   stream_error_rate=args.stream_error_rate, seed=args.seed)
+    print(f"Fake LLM on http://{args.host}:{args.port} "
+          f"(latency {args.latency_ms}±{args.jitter_ms} ms, {args.tokens_per_sec} tok/s, "
+          f"error rate {args.error_rate})")
+    print(f"  GROQ_API_KEY=fake GROQ_BASE_URL=http://{args.host}:{args.port} "
+          f"OLLAMA_BASE_URL=http://{args.host}:{args.port}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Load-test driver for a running CodeGenius backend.
+
+Replays a query set against /api/chat/stream (default), /api/chat or
+/api/retrieve at a target concurrency, and reports throughput and
+p50/p95/p99 per stage. Stages on the streaming endpoint:
+  retrieval     request sent -> "sources" event (guard, HyDE, retrieval)
+  provider      "sources" -> "model" event (provider chosen, first token in hand)
+  first_token   request sent -> first "token" event
+  total         request sent -> "done" event
+/api/chat and /api/retrieve only report "total" (and "first_result" for
+/api/retrieve). Uploads can run in the background during the replay to
+measure contention between ingest and queries.
+
+Start the backend against the fake LLM (scripts/fake_llm.py) so no Groq
+quota is spent:
+  python scripts/fake_llm.py --port 11500 &
+  cd backend && GROQ_API_KEY=fake GROQ_BASE_URL=http://127.0.0.1:11500 \\
+      OLLAMA_BASE_URL=http://127.0.0.1:11500 python app.py
+
+Usage:
+  python scripts/load_test.py --repo CodeGenius \\
+      --queries backend/evaluation/datasets/CodeGenius.json --concurrency 16 --requests 400
+  options: --endpoint stream|chat|retrieve  --duration 60  --no-cache  --hedge
+           --upload repo.zip --upload-every 20  --out results.json
+"""
+
+import os
+import sys
+import json
+import math
+import time
+import argparse
+import threading
+from collections import Counter, defaultdict
+
+import requests
+
+
+BASE_URL = os.getenv("CODEGENIUS_URL", "http://localhost:5000")
+DEFAULT_QUERIES = [
+    "Which file serves as the main Python entry point for this app?",
+    "Where is the ChromaDB connection initialized?",
+    "How are uploaded ZIP files extracted?",
+    "How is the answer generated when Groq is unavailable?",
+    "How are chat answers streamed to the browser?",
+]
+
+
+def load_queries(path: str) -> list:
+    """A JSON list of strings, or of objects with a "query" key (evaluation datasets)."""
+    if not path:
+        return list(DEFAULT_QUERIES)
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    queries = [item if isinstance(item, str) else item.get("query") for item in data]
+    queries = [q for q in queries if q]
+    if not queries:
+        print(f"  ERROR: no queries in {path}")
+        sys.exit(1)
+    return queries
+
+
+def percentile(values: list, pct: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    # Nearest rank
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+
+class Recorder:
+    """Per-stage latencies (ms), outcome counters and response tags, shared by the workers."""
+
+    def __init__(self):
+        self.stages = defaultdict(list)
+        self.outcomes = Counter()
+        self.tags = Counter()
+        self._lock = threading.Lock()
+
+    def add(self, stages: dict, outcome: str, tags=()) -> None:
+        with self._lock:
+            for stage, ms in stages.items():
+                self.stages[stage].append(ms)
+            self.outcomes[outcome] += 1
+            self.tags.update(tags)
+
+    def summary(self, elapsed: float) -> dict:
+        with self._lock:
+            done = sum(self.outcomes.values())
+            return {
+                "requests":       done,
+                "elapsed_s":      round(elapsed, 2),
+                "throughput_rps": round(self.outcomes["ok"] / elapsed, 2) if elapsed else 0.0,
+                "outcomes":       dict(self.outcomes),
+                "tags":           dict(self.tags),
+                "stages": {
+                    stage: {
+                        "count": len(values),
+                        "p50":   round(percentile(values, 50), 1),
+                        "p95":   round(percentile(values, 95), 1),
+                        "p99":   round(percentile(values, 99), 1),
+                        "max":   round(max(values), 1),
+                    }
+                    for stage, values in self.stages.items()
+                },
+            }
+
+
+def _ms(since: float) -> float:
+    return (time.perf_counter() - since) * 1000
+
+
+def _sse_events(response):
+    """(event, data) pairs of a text/event-stream response."""
+    event, data = None, []
+    for line in response.iter_lines(decode_unicode=True):
+        if line.startswith("event:"):
+            event = line[6:].strip()
+        elif line.startswith("data:"):
+            data.append(line[5:].strip())
+        elif not line and event:
+            yield event, json.loads("\n".join(data)) if data else {}
+            event, data = None, []
+
+
+def run_stream(session, body: dict, recorder: Recorder) -> None:
+    started = time.perf_counter()
+    stages, tags = {}, []
+    with session.post(f"{BASE_URL}/api/chat/stream", json=body, stream=True, timeout=(5, 300)) as response:
+        if response.status_code != 200:
+            return recorder.add({}, f"http_{response.status_code}")
+        for event, data in _sse_events(response):
+            if event == "sources":
+                stages["retrieval"] = _ms(started)
+                sources_at = time.perf_counter()
+            elif event == "model":
+                stages["provider"] = _ms(sources_at) if "retrieval" in stages else _ms(started)
+                tags.append(f"model:{data.get('model')}")
+                if (data.get("hedge") or {}).get("hedged"):
+                    tags.append("hedged")
+            elif event == "token" and "first_token" not in stages:
+                stages["first_token"] = _ms(started)
+            elif event == "done":
+                stages["total"] = _ms(started)
+                if (data.get("cache") or {}).get("hit"):
+                    tags.append("cache_hit")
+                if data.get("coalesced"):
+                    tags.append("coalesced")
+                return recorder.add(stages, "ok", tags)
+            elif event == "error":
+                return recorder.add(stages, "error", tags + [f"error:{str(data.get('error'))[:60]}"])
+    recorder.add(stages, "truncated", tags)
+
+
+def run_chat(session, body: dict, recorder: Recorder) -> None:
+    started = time.perf_counter()
+    response = session.post(f"{BASE_URL}/api/chat", json=body, timeout=(5, 300))
+    if response.status_code != 200:
+        return recorder.add({}, f"http_{response.status_code}")
+    data = response.json()
+    tags = [f"model:{data.get('model')}"]
+    if (data.get("cache") or {}).get("hit"):
+        tags.append("cache_hit")
+    if data.get("coalesced"):
+        tags.append("coalesced")
+    if (data.get("hedge") or {}).get("hedged"):
+        tags.append("hedged")
+    recorder.add({"total": _ms(started)}, "ok", tags)
+
+
+def run_retrieve(session, body: dict, recorder: Recorder) -> None:
+    started = time.perf_counter()
+    stages = {}
+    with session.post(f"{BASE_URL}/api/retrieve", json=body, stream=True, timeout=(5, 300)) as response:
+        if response.status_code != 200:
+            return recorder.add({}, f"http_{response.status_code}")
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            kind = data.get("type")
+            if kind == "result" and "first_result" not in stages:
+                stages["first_result"] = _ms(started)
+            elif kind == "error":
+                return recorder.add(stages, "error", [f"error:{str(data.get('error'))[:60]}"])
+    stages["total"] = _ms(started)
+    recorder.add(stages, "ok")
+
+
+RUNNERS = {"stream": run_stream, "chat": run_chat, "retrieve": run_retrieve}
+
+
+def upload_loop(zip_path: str, every: float, stop: threading.Event, recorder: Recorder) -> None:
+    """Upload zip_path as its own repo every `every` seconds until stopped (first one at once)."""
+    repo_name = "loadtest-" + os.path.splitext(os.path.basename(zip_path))[0]
+    session = requests.Session()
+    while not stop.is_set():
+        started = time.perf_counter()
+        try:
+            with open(zip_path, "rb") as f:
+                response = session.post(f"{BASE_URL}/api/upload",
+                                        files={"file": (os.path.basename(zip_path), f, "application/zip")},
+                                        data={"repo_name": repo_name}, timeout=(5, 1800))
+            outcome = "ok" if response.status_code == 200 else f"http_{response.status_code}"
+        except requests.RequestException:
+            outcome = "exception"
+        recorder.add({"upload": _ms(started)}, outcome)
+        stop.wait(every)
+
+
+def run_load(queries: list, repo: str, endpoint: str, concurrency: int, total_requests: int,
+             duration: float, cache: bool, hedge: bool, upload: str = None, upload_every: float = 30.0) -> dict:
+    runner = RUNNERS[endpoint]
+    queries_recorder, uploads_recorder = Recorder(), Recorder()
+    next_index = [0]
+    index_lock = threading.Lock()
+    stop = threading.Event()
+    deadline = time.perf_counter() + duration if duration else None
+
+    def next_body():
+        with index_lock:
+            i = next_index[0]
+            if (total_requests and i >= total_requests) or (deadline and time.perf_counter() >= deadline):
+                return None
+            next_index[0] += 1
+        body = {"query": queries[i % len(queries)]}
+        if repo:
+            body["repo"] = repo
+        if endpoint != "retrieve":
+            body["cache"] = cache
+            if hedge:
+                body["hedge"] = True
+        return body
+
+    def worker():
+        session = requests.Session()
+        while True:
+            body = next_body()
+            if body is None:
+                return
+            try:
+                runner(session, body, queries_recorder)
+            except requests.RequestException as e:
+                queries_recorder.add({}, type(e).__name__)
+
+    uploader = None
+    if upload:
+        uploader = threading.Thread(target=upload_loop, args=(upload, upload_every, stop, uploads_recorder), daemon=True)
+        uploader.start()
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+
+    report = {"endpoint": endpoint, "concurrency": concurrency, "queries": len(queries),
+              **queries_recorder.summary(elapsed)}
+    if uploader:
+        uploader.join(timeout=1)
+        report["uploads"] = uploads_recorder.summary(elapsed)
+    try:
+        health = requests.get(f"{BASE_URL}/api/health", timeout=5).json()
+        report["server"] = {key: health.get(key) for key in ("answer_cache", "single_flight", "hedging", "retrieval_paths")}
+    except (requests.RequestException, ValueError):
+        pass
+    return report
+
+
+def print_report(report: dict) -> None:
+    print(f"\n  {report['endpoint']}  x{report['concurrency']}  "
+          f"{report['requests']} requests in {report['elapsed_s']} s  "
+          f"→ {report['throughput_rps']} ok/s")
+    print(f"  outcomes: {report['outcomes']}")
+    if report["tags"]:
+        print(f"  tags:     {report['tags']}")
+    rows = list(report["stages"].items()) + list((report.get("uploads") or {}).get("stages", {}).items())
+    print(f"\n  {'stage':<14}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for stage, s in rows:
+        print(f"  {stage:<14}{s['count']:>7}{s['p50']:>10}{s['p95']:>10}{s['p99']:>10}{s['max']:>10}")
+
+
+def main():
+    global BASE_URL
+    parser = argparse.ArgumentParser(description="Replay queries against CodeGenius at a target concurrency")
+    parser.add_argument("--url", default=BASE_URL)
+    parser.add_argument("--repo", default=None, help="repository to query (default: server's current repo)")
+    parser.add_argument("--queries", default=None, help="JSON list of queries or an evaluation dataset")
+    parser.add_argument("--endpoint", choices=sorted(RUNNERS), default="stream")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=200, help="total requests (0 = until --duration)")
+    parser.add_argument("--duration", type=float, default=0, help="seconds to run (0 = until --requests)")
+    parser.add_argument("--no-cache", action="store_true", help="send \"cache\": false")
+    parser.add_argument("--hedge", action="store_true", help="send \"hedge\": true")
+    parser.add_argument("--upload", default=None, help="ZIP to upload repeatedly during the run")
+    parser.add_argument("--upload-every", type=float, default=30.0, help="seconds between uploads")
+    parser.add_argument("--out", default=None, help="write the report as JSON")
+    args = parser.parse_args()
+
+    if not args.requests and not args.duration:
+        parser.error("set --requests or --duration")
+    BASE_URL = args.url.rstrip("/")
+    report = run_load(load_queries(args.queries), args.repo, args.endpoint, args.concurrency,
+                      args.requests, args.duration, cache=not args.no_cache, hedge=args.hedge,
+                      upload=args.upload, upload_every=args.upload_every)
+    print_report(report)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n  Report written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()